@@ -0,0 +1,343 @@
+"""
+Student analysis view: Plotly charts and the clinical summary for the staff `analysis` mode.
+
+Kept out of app.py and imported on first use so that the landing page and logging forms
+never pay for importing plotly.express and pandas.
+"""
+import base64
+from datetime import datetime
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+# Define Plotly Theme for Dark Mode Consistency
+PLOTLY_THEME = 'plotly_dark'
+MAX_CHART_CATEGORIES = 10  # Categorical charts show the top N plus an "Other" bar
+TIME_TICK_FORMATS = {'Day': "%b %d", 'Week': "%b %d", 'Month': "%b %Y"}
+COMPARISON_PANEL_COLUMNS = 4  # Small multiples per row
+COMPARISON_ROW_HEIGHT = 220
+
+
+def get_download_link(file_content, filename):
+    """Generates a downloadable file link for Streamlit."""
+    b64 = base64.b64encode(file_content.encode()).decode()
+    # Create the download link in Markdown
+    return f'<a href="data:file/txt;base64,{b64}" download="{filename}">⬇ Download Full Behaviour Profile Plan (.txt)</a>'
+
+
+def cap_categories(counts, limit=MAX_CHART_CATEGORIES):
+    """Keeps the `limit` largest counts of a value_counts() Series and folds the rest into 'Other'."""
+    if len(counts) <= limit:
+        return counts
+    capped = counts.iloc[:limit].copy()
+    capped['Other'] = counts.iloc[limit:].sum()
+    return capped
+
+
+def render_heatmap(matrix, days, slot_labels, title):
+    """Renders a weekday × time-slot count matrix (from the incident store) as a plain heatmap trace."""
+    active_slots = np.flatnonzero(matrix.sum(axis=0))
+    if active_slots.size == 0:
+        st.info("No weekday incidents to map yet.")
+        return
+    # Only the span of slots that saw incidents is sent to the browser
+    first, last = active_slots[0], active_slots[-1] + 1
+    fig_heatmap = go.Figure(go.Heatmap(
+        z=matrix[:, first:last],
+        x=slot_labels[first:last],
+        y=days,
+        colorscale="Plasma",
+        colorbar=dict(title='Incident Count'),
+        hovertemplate="%{y} %{x}: %{z} incidents<extra></extra>",
+    ))
+    fig_heatmap.update_layout(
+        title=title,
+        template=PLOTLY_THEME,
+        xaxis_title='Time Slot',
+        yaxis=dict(title='Day of Week', autorange='reversed'),
+    )
+    st.plotly_chart(fig_heatmap, use_container_width=True)
+
+
+def render_pivot(pivot, title):
+    """Renders a 2-D incident count pivot (from the incident cube) as a heatmap with its table."""
+    if pivot.empty:
+        st.info("No incidents match this selection.")
+        return
+    fig_pivot = go.Figure(go.Heatmap(
+        z=pivot.to_numpy(),
+        x=list(pivot.columns),
+        y=list(pivot.index),
+        colorscale="Viridis",
+        colorbar=dict(title='Incident Count'),
+        hovertemplate="%{y} / %{x}: %{z} incidents<extra></extra>",
+    ))
+    fig_pivot.update_layout(
+        title=title,
+        template=PLOTLY_THEME,
+        xaxis_title=pivot.columns.name,
+        yaxis=dict(title=pivot.index.name, autorange='reversed'),
+    )
+    st.plotly_chart(fig_pivot, use_container_width=True)
+    st.dataframe(pivot, use_container_width=True)
+
+
+def render_student_comparison(comparison, student_names, share=False):
+    """
+    Renders a student comparison (see bst_core.views.get_student_comparison) as small multiples:
+    one figure per distribution, one panel per student, every panel on the same axes. With
+    share=True each student's bars are fractions of their own incidents instead of counts.
+    """
+    totals = comparison['risk_level'].sum(axis=1)
+    students = [student_names.get(student_id, student_id) for student_id in totals.index]
+    value_name = 'Share of Incidents' if share else 'Incidents'
+    rows = -(-len(students) // COMPARISON_PANEL_COLUMNS)
+    for counts in comparison.values():
+        dimension = counts.columns.name
+        values = counts.div(totals.where(totals > 0, 1), axis=0) if share else counts
+        if values.columns.empty:
+            continue
+        long = values.set_axis(students, axis=0).rename_axis('Student').reset_index().melt(
+            id_vars='Student', var_name=dimension, value_name=value_name
+        )
+        long[dimension] = long[dimension].astype(str)
+        fig = px.bar(
+            long, x=dimension, y=value_name, facet_col='Student', facet_col_wrap=COMPARISON_PANEL_COLUMNS,
+            category_orders={'Student': students, dimension: [str(column) for column in counts.columns]},
+            facet_row_spacing=min(0.08, 0.5 / rows), template=PLOTLY_THEME,
+        )
+        fig.for_each_annotation(lambda a: a.update(text=a.text.split('=', 1)[-1]))
+        fig.update_xaxes(title_text='', tickangle=-45 if len(counts.columns) > 5 else 0)
+        fig.update_layout(title=f"Incidents by {dimension}", height=120 + COMPARISON_ROW_HEIGHT * rows)
+        if share:
+            fig.update_yaxes(tickformat='.0%')
+        st.plotly_chart(fig, use_container_width=True)
+
+
+# --- Plotly Graph Enhancement ---
+
+def render_data_analysis(student, df, time_series, resolution, heatmap, heatmap_days, heatmap_slot_labels,
+                         summary, report_content):
+    """
+    Renders the comprehensive data analysis and clinical summary section with enhanced Plotly charts.
+    
+    df is the cached per-student frame (read-only, ABCH label already derived);
+    time_series holds the incident counts already bucketed at `resolution` ('Day', 'Week' or
+    'Month') and capped by the caller; heatmap is the student's weekday × slot count matrix,
+    labelled by heatmap_days and heatmap_slot_labels; summary is the student's cached
+    StudentSummary (the same statistics the BPP report is built from) and report_content the
+    cached BPP report text.
+    """
+    st.subheader(f"📊 Comprehensive Data Analysis for: **{student['name']}**")
+    
+    if summary is None:
+        st.info("No incident data available for this student yet.")
+        return
+
+    latest_plan_incident = summary.latest_plan_incident
+
+    # --- BPP Review and Download ---
+    st.markdown("### 📄 Behaviour Profile Plan (BPP) Status")
+    
+    col_bpp1, col_bpp2 = st.columns([3, 2])
+    
+    with col_bpp1:
+        st.markdown(f"**Latest BPP-Update Incident:** {latest_plan_incident['date']}")
+        st.markdown(f"**Primary Antecedent:** {latest_plan_incident['antecedent']}")
+        st.markdown(f"**Primary Function:** {latest_plan_incident['func_hypothesis']}")
+
+    with col_bpp2:
+        if report_content:
+            filename = f"BPP_Report_{student['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.txt"
+            st.markdown(get_download_link(report_content, filename), unsafe_allow_html=True)
+            
+    st.markdown("---")
+    
+    # --- Row 1: Frequency, Severity, Location ---
+    col_graph1, col_graph2, col_graph3 = st.columns(3)
+    
+    # 1. FREQUENCY GRAPH (Incidents over time)
+    with col_graph1:
+        st.markdown("##### 📈 Incidents Over Time")
+        df_time = time_series.rename_axis('date').reset_index()
+        
+        fig_time = px.line(
+            df_time, 
+            x='date', 
+            y='Count', 
+            title=f'Incidents Per {resolution}', 
+            template=PLOTLY_THEME, 
+            markers=True
+        )
+        fig_time.update_xaxes(tickformat=TIME_TICK_FORMATS[resolution])
+        fig_time.update_traces(line=dict(color='#3498DB', width=3))
+        st.plotly_chart(fig_time, use_container_width=True)
+
+    # 2. SEVERITY GRAPH (Risk Level Distribution)
+    with col_graph2:
+        st.markdown("##### 🔥 Severity and ABCH Activation")
+        df_severity = df.groupby(['risk_level', 'is_abch_completed_label'])['id'].count().reset_index(name='Count')
+        
+        fig_severity = px.bar(
+            df_severity, 
+            x='risk_level', 
+            y='Count', 
+            color='is_abch_completed_label',
+            title='Risk Level Distribution vs. ABCH Activation',
+            template=PLOTLY_THEME,
+            labels={'risk_level': 'Risk Level (1=Low, 5=Extreme)', 'Count': 'Incident Count', 'is_abch_completed_label': 'ABCH Activation'},
+            category_orders={"risk_level": sorted(df['risk_level'].unique())},
+            color_discrete_map={'Critical Incident (ABCH) - Activated': '#FF5733', 'Basic Log': '#5B5E63'}, # Orange/Red for Critical
+            barmode='stack'
+        )
+        fig_severity.update_xaxes(dtick=1)
+        fig_severity.update_traces(marker_line_width=1, marker_line_color='gray')
+        st.plotly_chart(fig_severity, use_container_width=True)
+    
+    # 3. LOCATION GRAPH (NEW Requirement)
+    with col_graph3:
+        st.markdown("##### 📍 Incidents by Setting (Location)")
+        location_counts = cap_categories(df['setting'].value_counts()).reset_index(name='Count')
+        location_counts.columns = ['Setting', 'Count']
+        fig_location = px.bar(
+            location_counts, 
+            x='Setting', 
+            y='Count', 
+            title='Incident Frequency by Location',
+            template=PLOTLY_THEME,
+            labels={'Setting': 'Setting', 'Count': 'Incident Count'},
+            color_discrete_sequence=['#2ECC71'] # Green
+        )
+        fig_location.update_traces(marker_line_width=1, marker_line_color='gray')
+        fig_location.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
+        st.plotly_chart(fig_location, use_container_width=True)
+        
+    st.markdown("---")
+    
+    # --- Row 2: Time/Session, Behaviour, Function ---
+    col_graph4, col_graph5, col_graph6 = st.columns(3)
+    
+    # 4. TIME OF DAY GRAPH (Heatmap)
+    with col_graph4:
+        st.markdown("##### ⏰ Time and Day Heatmap")
+        render_heatmap(heatmap, heatmap_days, heatmap_slot_labels, 'Incident Heatmap by Time Slot and Weekday (All Terms)')
+        weekend_count = int((~df['day'].isin(heatmap_days)).sum())
+        if weekend_count:
+            st.caption(f"{weekend_count} weekend incident(s) not shown.")
+        
+    # 5. BEHAVIOUR GRAPH (Pareto/Bar Chart)
+    with col_graph5:
+        st.markdown("##### 💥 Behaviour Frequency (Top 5)")
+        behaviour_counts = df['behaviour'].value_counts().head(5).reset_index(name='Count')
+        behaviour_counts.columns = ['Behaviour', 'Count']
+        
+        fig_behaviour = px.bar(
+            behaviour_counts, 
+            x='Behaviour', 
+            y='Count', 
+            title='Most Frequent Behaviours',
+            template=PLOTLY_THEME,
+            color='Count',
+            color_continuous_scale='Mint',
+            labels={'Count': 'Incident Count'}
+        )
+        fig_behaviour.update_traces(marker_line_width=1, marker_line_color='gray')
+        fig_behaviour.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
+        st.plotly_chart(fig_behaviour, use_container_width=True)
+        
+    # 6. FUNCTION GRAPH (Hypothesis Distribution)
+    with col_graph6:
+        st.markdown("##### 💡 Hypothesized Function")
+        func_counts = cap_categories(df['func_hypothesis'].value_counts()).reset_index(name='Count')
+        func_counts.columns = ['Function', 'Count']
+        
+        fig_func = px.pie(
+            func_counts, 
+            names='Function', 
+            values='Count', 
+            title='Function of Behaviour Distribution',
+            template=PLOTLY_THEME,
+            hole=.3,
+            color_discrete_sequence=px.colors.sequential.Agsunset
+        )
+        fig_func.update_traces(textposition='inside', textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
+        st.plotly_chart(fig_func, use_container_width=True)
+        
+    st.markdown("---")
+    
+    # --- Clinical Deep Dive: Outcomes ---
+    df_outcomes = df[df['is_abch_completed'] == True].copy()
+    if not df_outcomes.empty:
+        st.markdown("### ⚠️ Clinical Deep Dive: Critical Incident Outcomes")
+        
+        col_out1, col_out2 = st.columns(2)
+        
+        # Outcomes by Count
+        outcome_columns = [col for col in df_outcomes.columns if col.startswith('outcome_')]
+        outcome_counts = df_outcomes[outcome_columns].sum().reset_index(name='Count')
+        outcome_counts.columns = ['Outcome', 'Count']
+        # Clean up column names for display
+        outcome_counts['Outcome'] = outcome_counts['Outcome'].str.replace('outcome_', '').str.replace('_', ' ').str.title()
+        
+        with col_out1:
+            st.markdown("##### Total Count of Severe Outcomes (ABCH Logs Only)")
+            fig_outcomes = px.bar(
+                outcome_counts.sort_values('Count', ascending=False),
+                x='Outcome', 
+                y='Count', 
+                title='Frequency of Incident Outcomes',
+                template=PLOTLY_THEME,
+                color_discrete_sequence=['#E74C3C'] # Red
+            )
+            fig_outcomes.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
+            st.plotly_chart(fig_outcomes, use_container_width=True)
+
+        # Behaviours leading to assault
+        with col_out2:
+            assault_by_behaviour = cap_categories(df_outcomes.loc[df_outcomes['outcome_assault'] == True, 'behaviour'].value_counts()).reset_index(name='Assault Count')
+            
+            if not assault_by_behaviour.empty:
+                st.markdown("##### 🚩 Behaviours that Escalated to Documented Assault (ABCH Logs Only)")
+                fig_assault = px.bar(
+                    assault_by_behaviour, 
+                    x='behaviour', 
+                    y='Assault Count', 
+                    title='Assault Outcomes by Behaviour Type',
+                    template=PLOTLY_THEME,
+                    labels={'behaviour': 'Observed Behaviour', 'Assault Count': 'Count of Assault Outcomes'},
+                    color_discrete_sequence=['#F39C12']
+                )
+                fig_assault.update_traces(marker_line_width=1, marker_line_color='gray')
+                fig_assault.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
+                st.plotly_chart(fig_assault, use_container_width=True)
+            else:
+                st.info("No incidents logged with documented assault outcomes.")
+
+    st.markdown("---")
+    
+    # --- Clinical Interpretation Section ---
+    st.markdown("### 🧠 Clinical Interpretation & Next Steps")
+    
+    # 1. Summary of Findings
+    st.markdown("#### 1. Summary of Data Findings")
+    st.markdown(f"""
+- **Primary Concern:** **{summary.most_freq_behaviour}** is the most frequent behaviour, suggesting a targeted intervention is needed.
+- **Timing:** Incidents peak on **{summary.peak_day}** during the **{summary.peak_session}**.
+- **Context:** The highest concentration of risk incidents occurs in the **{summary.high_risk_setting or 'N/A'}** setting.
+- **Function:** The most hypothesized function is **{latest_plan_incident['func_hypothesis']}**, indicating the intervention must teach a replacement behaviour that achieves this function appropriately.
+""")
+
+    # 2. Recommended Proactive Strategy (Replicating BPP)
+    st.markdown("#### 2. Proactive Strategy Focus (Berry Street)")
+    st.markdown("""
+The focus should be on **Relationships** and **Rhythms**. Specifically:
+- **Relational Shift:** Systematically identify and create an area of contribution within the classroom to shift the student's sense of self from 'problem' to 'valued member'.
+""")
+    
+    # 3. CPI Staging and Protocol
+    st.markdown("### 3. Crisis Prevention Institute (CPI) Protocol Staging")
+    
+    st.markdown(f"The student's data indicates a pattern aligning with the **{summary.cpi_stage}** stage.")
+    st.markdown(f"* **Recommended Protocol:** {summary.cpi_response}")
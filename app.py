@@ -1,59 +1,96 @@
+from time import perf_counter
+_SCRIPT_STARTED = perf_counter()
+
 import streamlit as st
-import pandas as pd
-from datetime import datetime, time, timedelta
-import random
+from datetime import date, datetime, time
+import importlib
+import logging
 import uuid
-import plotly.express as px
-import numpy as np
 import base64 
 import os # Added for file path handling
+import sys
+
+from bst_core.util import pd
+from bst_core.constants import (
+    ANTECEDENTS_NEW,
+    BEHAVIORS_BPP,
+    CONSEQUENCES,
+    DAYS,
+    FUNCTIONAL_HYPOTHESIS,
+    HOW_TO_RESPOND_DEFAULT,
+    INTERVENTION_EFFECTIVENESS,
+    MOCK_STAFF,
+    MOCK_STUDENTS,
+    OUTCOME_FIELDS,
+    OUTCOME_LABELS,
+    RISK_LEVELS,
+    SESSIONS,
+    SETTINGS,
+    SITE,
+    SUPPORT_TYPES,
+    WINDOW_OF_TOLERANCE,
+)
+from bst_core.records import (
+    Incident,
+    compile_abch_context,
+    complete_incident_data,
+    get_session_from_time,
+    incidents_to_frame,
+)
+from bst_core.indexes import (
+    CUBE_AXES,
+    CUBE_DIMENSIONS,
+    CUBE_PIVOT_SCOPES,
+    HEATMAP_SLOT_MINUTES,
+    SIMILARITY_MAX_SCORE,
+    get_heatmap_slot_labels,
+)
+from bst_core.store import (
+    DEFAULT_HISTORY_WINDOW,
+    HISTORY_WINDOWS,
+    IncidentNotFound,
+    commit_incidents,
+    get_incident_store,
+    history_start,
+    update_incident,
+)
+from bst_core.alerts import alert_log_path, get_alert_dispatcher
+from bst_core.metrics import get_metrics_registry, start_metrics_export
+from session_memory import LARGE_VALUE_BYTES, SESSION_DRAFT_TTL, get_session_registry
+from bst_core.forecast import FORECAST_WINDOW_DAYS, WATCH_LIST_THRESHOLD, get_forecast_worker
+from bst_core.precompute import PRECOMPUTE_HOUR, get_precompute_worker
+from bst_core.rollup import materialize_site_rollup, regional_rollup
+from bst_core.views import (
+    MAX_CHART_POINTS,
+    cache_stats,
+    cube_values,
+    get_area_rollup,
+    get_bpp_report,
+    get_cpi_roster,
+    get_incident_pivot,
+    get_school_behaviour_counts,
+    get_staff_weekly_exposure,
+    get_staff_workload,
+    get_student_comparison,
+    get_student_frame,
+    get_student_summary,
+    get_student_time_series,
+    get_watch_list,
+    select_time_resolution,
+)
+from bst_core.importer import IMPORT_REQUIRED_COLUMNS, import_incident_frame, read_incident_file
 
-# --- Configuration and Aesthetics (High-Contrast Dark Look) ---
+logger = logging.getLogger(__name__)
 
-st.set_page_config(
-    page_title="Behaviour Support & Data Analysis Tool",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
+# --- Configuration and Aesthetics (High-Contrast Dark Look) ---
 
-# Define Plotly Theme for Dark Mode Consistency
-PLOTLY_THEME = 'plotly_dark'
-
-# --- Behaviour Profile Plan and Data Constants ---
-
-MOCK_STAFF = [
-    {'id': 's1', 'name': 'Emily Jones (JP)', 'role': 'JP', 'active': True, 'special': False},
-    {'id': 's2', 'name': 'Daniel Lee (PY)', 'role': 'PY', 'active': True, 'special': False},
-    {'id': 's3', 'name': 'Sarah Chen (SY)', 'role': 'SY', 'active': True, 'special': False},
-    {'id': 's4', 'name': 'Admin User (ADM)', 'role': 'ADM', 'active': True, 'special': False},
-    # Special roles that require manual name input
-    {'id': 's_trt', 'name': 'TRT', 'role': 'TRT', 'active': True, 'special': True},
-    {'id': 's_sso', 'name': 'External SSO', 'role': 'SSO', 'active': True, 'special': True},
-]
-
-MOCK_STUDENTS = [
-    {'id': 'stu_jp_high', 'name': 'Marcus A.', 'area': 'JP', 'grade': 'R', 'teacher': 'Smith', 'edid': 'JP001A', 'dob': '2019-03-15'},
-    {'id': 'stu_jp_low', 'name': 'Chloe T.', 'area': 'JP', 'grade': 'Y2', 'teacher': 'Davids', 'edid': 'JP002T', 'dob': '2017-11-20'},
-    {'id': 'stu_py_high', 'name': 'Noah K.', 'area': 'PY', 'grade': 'Y5', 'teacher': 'Williams', 'edid': 'PY003K', 'dob': '2014-07-01'},
-    {'id': 'stu_py_low', 'name': 'Leah S.', 'area': 'PY', 'grade': 'Y6', 'teacher': 'Brown', 'edid': 'PY004S', 'dob': '2013-09-10'},
-    {'id': 'stu_sy_high', 'name': 'Ethan B.', 'area': 'SY', 'grade': 'Y9', 'teacher': 'Green', 'edid': 'SY005B', 'dob': '2010-01-25'},
-    {'id': 'stu_sy_low', 'name': 'Mia P.', 'area': 'SY', 'grade': 'Y10', 'teacher': 'Clark', 'edid': 'SY006P', 'dob': '2009-04-05'},
-]
-
-BEHAVIORS_BPP = ['Verbal Refusal', 'Elopement', 'Property Destruction', 'Aggression (Peer)', 'Self-Injurious Behaviour', 'Out of Seat', 'Non-Compliance', 'Physical Aggression (Staff)']
-WINDOW_OF_TOLERANCE = ['Hypo-aroused', 'Hyper-aroused', 'Coping'] 
-SETTINGS = ['Classroom', 'Gate', 'Yard', 'Playground', 'Toilets', 'Admin', 'Spill out', 'Kitchen', 'Library', 'Excursion', 'Swimming', 'Bus/Van', 'Specialist Lesson']
-SUPPORT_TYPES = ['Unstructured', 'Small Group', 'Independent', 'Large Group', 'Peer', '1:1']
-ANTECEDENTS_NEW = ['Peer Interaction', 'Tired', 'Hungry', 'Transition', 'Routine Change', 'Environmental Disturbance', 'Limit Setting', 'Group Work', 'Adult Demand', 'No Medication', 'Task Demand', 'Other']
-FUNCTIONAL_HYPOTHESIS = ['Seek/Get Something', 'Avoid/Escape Something', 'Self Stimulation']
-FUNCTION_PRIMARY = ['Sensory', 'Social', 'Tangible/Activity']
-FUNCTION_SECONDARY = ['Peer', 'Adult', '-'] 
-RISK_LEVELS = [1, 2, 3, 4, 5] # 1=Low, 5=Extreme
-
-CONSEQUENCES = ['Redirection/Prompt', 'Time-Out (Brief)', 'Ignored (Planned)', 'Preferred Activity Access']
-INTERVENTION_EFFECTIVENESS = ['Highly Effective', 'Moderately Effective', 'Ineffective', 'Worsened Behaviour']
-DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-HOW_TO_RESPOND_DEFAULT = "No detailed plan required or specified."
+def configure_page():
+    """Applies the page configuration; called first thing in main()."""
+    st.set_page_config(
+        page_title="Behaviour Support & Data Analysis Tool",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
 
 
 # --- NEW: Background Image Utility Functions ---
@@ -160,218 +197,61 @@ def set_landing_page_background(image_file):
     except Exception as e:
         st.warning(f"⚠️ Error loading background image: {e}")
 
-# --- Utility Functions (Existing) ---
 
-def get_session_from_time(t):
-    """Determines the session based on time of day."""
-    if time(8, 30) <= t <= time(11, 0):
-        return 'Morning (8:30-11:00)'
-    elif time(11, 1) <= t <= time(13, 0):
-        return 'Middle (11:01-1:00)'
-    elif time(13, 1) <= t <= time(15, 0):
-        return 'Afternoon (1:01-3:00)'
-    else:
-        return 'Outside Hours'
-
-def get_random_time():
-    """Generates a random time between 8:30 and 15:00."""
-    start = datetime(2000, 1, 1, 8, 30, 0)
-    end = datetime(2000, 1, 1, 15, 0, 0)
-    random_seconds = random.randint(0, int((end - start).total_seconds()))
-    return (start + timedelta(seconds=random_seconds)).time()
-
-def get_time_slot(t):
-    """Converts time to the nearest half-hour slot for heatmap."""
-    # MODIFIED: Ensure time is a datetime.time object
-    if isinstance(t, str):
-        t = datetime.strptime(t, '%H:%M').time()
-        
-    minutes = t.minute
-    hour = t.hour
-    if minutes < 30:
-        return f"{hour:02d}:00"
-    else:
-        # Note: This means 10:30-10:59 falls into 10:30 slot. 
-        # The next hour's 00:00-00:29 falls into the next hour's :00 slot.
-        return f"{hour:02d}:30"
-
-def generate_mock_abch_outcomes():
-    """Generates random outcomes for critical incidents (for mock data)."""
-    outcomes = {
-        'outcome_send_home': random.choice([True, False]),
-        'outcome_leave_area': random.choice([True, False]),
-        'outcome_assault': random.choice([True, False]),
-        'outcome_property_damage': random.choice([True, False]),
-        'outcome_staff_injury': random.choice([True, False]),
-        'outcome_sapol_callout': random.choice([True, False]),
-        'outcome_ambulance': random.choice([True, False]),
-    }
-    if not any(outcomes.values()):
-        outcomes[random.choice(list(outcomes.keys()))] = True
-    
-    return outcomes
+# --- Metrics ---
+# Registered once per process (reruns get the same metrics back); see bst_core.metrics for export.
+
+RERUNS = get_metrics_registry().counter('bst_reruns_total', "Script reruns by page and staff mode", ['page', 'mode'])
+RERUN_SECONDS = get_metrics_registry().histogram('bst_rerun_seconds', "Whole-script rerun time by page", ['page'])
+RENDER_SECONDS = get_metrics_registry().histogram('bst_render_seconds', "Run time of each render_* function, nested renders included", ['function'])
+
+def timed_render(fn):
+    """Records fn's run time in RENDER_SECONDS under its name."""
+    return RENDER_SECONDS.time(fn.__name__)(fn)
+
+
+# --- Startup Timing ---
 
-# --- FIX: Apply caching to data generation to prevent blank screen errors ---
 @st.cache_resource
-def generate_mock_incidents():
-    """Generates a list of mock incident dictionaries with new BPP fields and outcomes."""
-    incidents = []
-    
-    # 1. High Incident Student (Marcus A. - stu_jp_high) - 15 incidents
-    for i in range(1, 16):
-        incident_date = (datetime.now() - pd.Timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d')
-        incident_time = get_random_time()
-        
-        is_high_risk = random.choice([True, True, False])
-        
-        behaviour = random.choice(['Verbal Refusal', 'Elopement', 'Physical Aggression (Staff)']) if i % 3 == 0 else random.choice(BEHAVIORS_BPP)
-        risk = random.choice([4, 5]) if is_high_risk else random.choice([1, 2, 3])
-        
-        incident_data = {
-            'id': str(uuid.uuid4()),
-            'student_id': 'stu_jp_high',
-            'date': incident_date,
-            'time': incident_time.strftime('%H:%M'),
-            'day': datetime.strptime(incident_date, '%Y-%m-%d').strftime('%A'),
-            'session': get_session_from_time(incident_time),
-            'behaviour': behaviour,
-            'window_of_tolerance': random.choice(['Hyper-aroused']) if is_high_risk else random.choice(WINDOW_OF_TOLERANCE),
-            'setting': random.choice(['Classroom', 'Yard', 'Gate', 'Admin']), # Added more variety
-            'support_type': random.choice(['1:1', 'Small Group']) if is_high_risk else random.choice(SUPPORT_TYPES),
-            'antecedent': random.choice(['Task Demand', 'Limit Setting', 'Adult Demand', 'Peer Interaction', 'Transition']), # Added more variety
-            'func_hypothesis': random.choice(['Avoid/Escape Something', 'Seek/Get Something']),
-            'func_primary': random.choice(FUNCTION_PRIMARY),
-            'func_secondary': random.choice(FUNCTION_SECONDARY),
-            'risk_level': risk,
-            'consequence': random.choice(CONSEQUENCES), 
-            'effectiveness': random.choice(['Ineffective', 'Worsened Behaviour']) if is_high_risk else random.choice(['Highly Effective', 'Moderately Effective']),
-            'logged_by': 's1',
-            'other_staff': ['s_trt:Jane Doe'] if i % 5 == 0 else [],
-            'is_abch_completed': is_high_risk,
-            'context': f"HIGH-DETAIL LOG: {behaviour} during {incident_time.strftime('%H:%M')}. Requires immediate follow-up." if is_high_risk else "Basic log captured. No detailed context entered.",
-            'notes': f"Staff noted lack of sleep prior to incident {i}.",
-            'how_to_respond': "Use a 5-step break card system." if is_high_risk else HOW_TO_RESPOND_DEFAULT
-        }
-        
-        if is_high_risk:
-            incident_data.update(generate_mock_abch_outcomes())
-        else:
-            incident_data.update({
-                'outcome_send_home': False, 'outcome_leave_area': False, 
-                'outcome_assault': False, 'outcome_property_damage': False, 
-                'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
-                'outcome_ambulance': False,
-            })
-            
-        incidents.append(incident_data)
-    
-    # --- START FIX FOR TYPERROR: 'datetime.time' and 'datetime.timedelta' (Approx. line 255) ---
-    # The original code at this line caused a TypeError because 'datetime.time' cannot be 
-    # subtracted by 'timedelta'. The fix is to use datetime.combine() with a date 
-    # (datetime.now().date()) before performing the subtraction.
-    
-    # This block represents the problematic incident from the traceback, now corrected.
-    incident_time_for_fix = get_random_time()
-    incidents.append({
-        'id': str(uuid.uuid4()),
-        'student_id': 'stu_jp_high', # Example student assignment
-        'date': (datetime.now() - pd.Timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d'),
-        # CORRECTED LINE: Use datetime.combine() to allow timedelta subtraction
-        'time': (datetime.combine(datetime.now().date(), incident_time_for_fix) - timedelta(minutes=random.randint(1, 5))).strftime('%H:%M'), 
-        'day': datetime.strptime((datetime.now() - pd.Timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d'), '%Y-%m-%d').strftime('%A'),
-        'session': get_session_from_time(incident_time_for_fix),
-        'behaviour': 'Pacing', 
-        'window_of_tolerance': 'Hypo-aroused',
-        'setting': 'Hallway',
-        'support_type': random.choice(SUPPORT_TYPES),
-        'antecedent': random.choice(ANTECEDENTS_NEW),
-        'func_hypothesis': random.choice(FUNCTIONAL_HYPOTHESIS),
-        'func_primary': random.choice(FUNCTION_PRIMARY),
-        'func_secondary': random.choice(FUNCTION_SECONDARY),
-        'risk_level': random.choice(RISK_LEVELS),
-        'consequence': random.choice(CONSEQUENCES), 
-        'effectiveness': random.choice(INTERVENTION_EFFECTIVENESS),
-        'logged_by': 's1',
-        'other_staff': [],
-        'is_abch_completed': False,
-        'context': "Mock incident created to resolve the TypeError.",
-        'notes': None,
-        'how_to_respond': HOW_TO_RESPOND_DEFAULT,
-        'outcome_send_home': False, 'outcome_leave_area': False, 
-        'outcome_assault': False, 'outcome_property_damage': False, 
-        'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
-        'outcome_ambulance': False,
-    })
-    # --- END FIX BLOCK ---
-
-    # 2. Other students (3 incidents each)
-    for student in MOCK_STUDENTS:
-        if student['id'] == 'stu_jp_high':
-            continue
-
-        for i in range(1, 4):
-            incident_date = (datetime.now() - pd.Timedelta(days=random.randint(1, 60))).strftime('%Y-%m-%d')
-            incident_time = get_random_time()
-            
-            incident_data = {
-                'id': str(uuid.uuid4()),
-                'student_id': student['id'],
-                'date': incident_date,
-                'time': incident_time.strftime('%H:%M'),
-                'day': datetime.strptime(incident_date, '%Y-%m-%d').strftime('%A'),
-                'session': get_session_from_time(incident_time),
-                'behaviour': random.choice(BEHAVIORS_BPP),
-                'window_of_tolerance': random.choice(WINDOW_OF_TOLERANCE),
-                'setting': random.choice(SETTINGS),
-                'support_type': random.choice(SUPPORT_TYPES),
-                'antecedent': random.choice(ANTECEDENTS_NEW),
-                'func_hypothesis': random.choice(FUNCTIONAL_HYPOTHESIS),
-                'func_primary': random.choice(FUNCTION_PRIMARY),
-                'func_secondary': random.choice(FUNCTION_SECONDARY),
-                'risk_level': random.choice(RISK_LEVELS),
-                'consequence': random.choice(CONSEQUENCES), 
-                'effectiveness': random.choice(INTERVENTION_EFFECTIVENESS),
-                'logged_by': random.choice(['s1', 's2', 's3']),
-                'other_staff': [],
-                'is_abch_completed': False,
-                'context': "Basic log captured. No detailed context entered.",
-                'notes': None,
-                'how_to_respond': HOW_TO_RESPOND_DEFAULT
-            }
-            incident_data.update({
-                'outcome_send_home': False, 'outcome_leave_area': False, 
-                'outcome_assault': False, 'outcome_property_damage': False, 
-                'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
-                'outcome_ambulance': False,
-            })
-            incidents.append(incident_data)
-            
-    return incidents
+def get_startup_timings():
+    """Process-wide record of cold-start timings (first script run and first lazy imports)."""
+    return {}
+
+def record_startup_timing(name, seconds):
+    """Records a startup timing once per process and logs it."""
+    timings = get_startup_timings()
+    if name not in timings:
+        timings[name] = round(seconds, 3)
+        logger.info("Startup timing %s: %.3fs", name, seconds)
 
 
 # --- Session State Initialization ---
 
-if 'current_page' not in st.session_state:
-    st.session_state.current_page = 'landing'
-if 'current_role' not in st.session_state:
-    st.session_state.current_role = None 
-if 'students' not in st.session_state:
-    st.session_state.students = MOCK_STUDENTS
-if 'incidents' not in st.session_state:
-    # Use the cached function to initialize the data only once
-    st.session_state.incidents = generate_mock_incidents() 
-if 'staff' not in st.session_state:
-    st.session_state.staff = MOCK_STAFF
-if 'selected_student_id' not in st.session_state:
-    st.session_state.selected_student_id = None
-if 'mode' not in st.session_state:
-    st.session_state.mode = 'home'
-if 'temp_log_area' not in st.session_state:
-    st.session_state.temp_log_area = None
-if 'temp_incident_data' not in st.session_state:
-    st.session_state.temp_incident_data = None
-if 'abch_chronology' not in st.session_state:
-    st.session_state.abch_chronology = []
+def init_session_state():
+    """Initializes per-session state on the first run of each session."""
+    if 'current_page' not in st.session_state:
+        st.session_state.current_page = 'landing'
+    if 'current_role' not in st.session_state:
+        st.session_state.current_role = None 
+    if 'students' not in st.session_state:
+        st.session_state.students = MOCK_STUDENTS
+    if 'incidents' not in st.session_state:
+        # Every session holds a reference to the process-wide list kept current by the shared store
+        st.session_state.incidents = get_incident_store().incidents
+    if 'staff' not in st.session_state:
+        st.session_state.staff = MOCK_STAFF
+    if 'selected_student_id' not in st.session_state:
+        st.session_state.selected_student_id = None
+    if 'mode' not in st.session_state:
+        st.session_state.mode = 'home'
+    if 'temp_log_area' not in st.session_state:
+        st.session_state.temp_log_area = None
+    if 'temp_incident_data' not in st.session_state:
+        st.session_state.temp_incident_data = None
+    if 'abch_chronology' not in st.session_state:
+        st.session_state.abch_chronology = []
+    if 'temp_group_incidents' not in st.session_state:
+        st.session_state.temp_group_incidents = None
 
 
 # --- Utility Functions ---
@@ -386,6 +266,10 @@ def navigate_to(page_name, role=None, mode='home', student_id=None):
     st.session_state.temp_log_area = None
     st.rerun()
 
+def shared_state_ids():
+    """Ids of the process-wide objects every session references, counted once rather than per session."""
+    return {id(get_incident_store().incidents), id(MOCK_STUDENTS), id(MOCK_STAFF)}
+
 def get_students_by_area(area):
     """Filters the student list by area (JP, PY, SY)."""
     return [s for s in st.session_state.students if s['area'] == area]
@@ -394,14 +278,50 @@ def get_student_by_id(student_id):
     """Retrieves a single student dictionary by ID."""
     return next((s for s in st.session_state.students if s['id'] == student_id), None)
 
-def get_incidents_by_student(student_id):
-    """Filters incidents for a specific student."""
-    # Convert to DataFrame for easy filtering and sorting
-    df = pd.DataFrame(st.session_state.incidents)
-    df_student = df[df['student_id'] == student_id].sort_values(by=['date', 'time'], ascending=False)
-    # Convert back to list of dictionaries for use in the app
-    return df_student.to_dict('records')
+@timed_render
+def render_watch_list(student_ids):
+    """The next school day's watch list, or a note while the forecast is being computed."""
+    day, watch_list = get_watch_list(student_ids)
+    st.markdown(f"#### 👀 Watch List for {day.strftime('%A %d %b')}")
+    if watch_list is None:
+        st.info("The risk forecast is being computed in the background. Refresh in a moment.")
+    elif watch_list.empty:
+        st.success(f"No time slots forecast above {WATCH_LIST_THRESHOLD:.0%} chance of a risk 4+ incident.")
+    else:
+        st.dataframe(watch_list, hide_index=True, use_container_width=True)
+        forecast = get_forecast_worker().forecast
+        st.caption(
+            f"Chance of at least one risk 4+ incident in each {HEATMAP_SLOT_MINUTES}-minute slot, from recency-weighted "
+            f"incidents over the last {FORECAST_WINDOW_DAYS // 7} weeks (computed {forecast.computed_at:%H:%M})."
+        )
 
+@timed_render
+def render_pivot_explorer(scope, key):
+    """Controls for picking any two cube dimensions (plus an optional filter) and the resulting pivot for scope."""
+    def dimension_label(dimension):
+        return CUBE_DIMENSIONS.get(dimension, 'No filter')
+
+    col_rows, col_columns, col_filter, col_values = st.columns(4)
+    rows = col_rows.selectbox("Rows", CUBE_AXES, index=CUBE_AXES.index('antecedent'), format_func=dimension_label, key=f"{key}_rows")
+    column_options = [d for d in CUBE_AXES if d != rows]
+    columns = col_columns.selectbox(
+        "Columns", column_options, index=column_options.index('setting') if 'setting' in column_options else 0,
+        format_func=dimension_label, key=f"{key}_columns"
+    )
+    filter_dimension = col_filter.selectbox(
+        "Filter", [None] + [d for d in CUBE_AXES if d not in (rows, columns)], format_func=dimension_label, key=f"{key}_filter"
+    )
+    filters = ()
+    if filter_dimension:
+        selected = col_values.multiselect("Keep", cube_values(filter_dimension), key=f"{key}_filter_values_{filter_dimension}")
+        if selected:
+            filters = ((filter_dimension, tuple(selected)),)
+
+    get_analysis_view().render_pivot(
+        get_incident_pivot(rows, columns, scope, filters),
+        f"{dimension_label(rows)} × {dimension_label(columns)}"
+    )
+    st.caption("Counts cover all terms, including archived ones.")
 
 def staff_header(role):
     """Renders the standard header for staff areas."""
@@ -411,14 +331,18 @@ def staff_header(role):
 
     # Navigation options grouped by role
     nav_options = {
-        'JP': {"🏠 Home / Student List": 'home'},
-        'PY': {"🏠 Home / Student List": 'home'},
-        'SY': {"🏠 Home / Student List": 'home'},
+        'JP': {"🏠 Home / Student List": 'home', "👥 Group Incident": 'group_log', "⚖️ Compare Students": 'compare'},
+        'PY': {"🏠 Home / Student List": 'home', "👥 Group Incident": 'group_log', "⚖️ Compare Students": 'compare'},
+        'SY': {"🏠 Home / Student List": 'home', "👥 Group Incident": 'group_log', "⚖️ Compare Students": 'compare'},
         'ADM': {
             "🏠 Admin Dashboard": 'home',
+            "👥 Group Incident": 'group_log',
+            "⚖️ Compare Students": 'compare',
             "👥 Staff Management": 'staff_management',
             "➕ Add New Staff": 'add_staff',
-            "📄 All Incidents Log": 'all_incidents'
+            "📄 All Incidents Log": 'all_incidents',
+            "📥 Bulk Import": 'bulk_import',
+            "🌏 Regional Rollup": 'regional'
         }
     }
     
@@ -437,6 +361,7 @@ def staff_header(role):
     st.sidebar.markdown("---")
 
 
+@timed_render
 def render_risk_level_info():
     """Renders the risk level matrix for user guidance."""
     st.markdown("##### 🚨 Behaviour Risk Level Guide")
@@ -456,363 +381,41 @@ def render_risk_level_info():
         st.markdown(f"| **{level}** | **{severity}** | {characteristics} | *{intervention}* |")
     st.markdown("---")
 
-
-# --- Behaviour Profile Plan Content Generation and Download ---
-
-def generate_bpp_report_content(student, latest_plan_incident, df):
-    """
-    Generates the structured text content for the full BPP report, incorporating 
-    Trauma-Informed (Berry Street) and CPI models.
-    """
-    # 1. Gather Key Data Insights for the Summary
-    total_incidents = len(df)
-    abch_count = len(df[df['is_abch_completed'] == True])
-    most_freq_behaviour = df['behaviour'].mode().iloc[0] if not df.empty else 'N/A'
-    peak_risk = df['risk_level'].max() if not df.empty else 'N/A'
-    
-    # 2. Determine CPI Stage based on latest incident/max risk/mode
-    cpi_stage = "Unknown"
-    cpi_response = "N/A"
-    
-    if latest_plan_incident:
-        # Check against latest incident data
-        latest_behaviour = latest_plan_incident['behaviour']
-        
-        if latest_behaviour in ['Physical Aggression (Staff)', 'Self-Injurious Behaviour', 'Property Destruction'] or peak_risk >= 4:
-            cpi_stage = "High-Risk: Acting Out (Danger)"
-            cpi_response = "Nonviolent Physical Crisis Intervention (where appropriate) followed by Therapeutic Rapport to restore the relationship immediately after the crisis."
-        elif latest_behaviour in ['Aggression (Peer)', 'Elopement', 'Verbal Refusal'] or peak_risk == 3:
-            cpi_stage = "Peak Risk: Defensive"
-            cpi_response = "Use Supportive language and Directive strategies (offering choices, clear limits) to guide the student toward an appropriate choice."
-        else:
-            cpi_stage = "Low-Risk: Questioning / Refusal"
-            cpi_response = "Use Information Seeking and Challenging questions as opportunities for connection and teaching appropriate ways to communicate needs."
-            
-    # 3. Format 'How to Respond'
-    how_to_respond_content = latest_plan_incident['how_to_respond'] if latest_plan_incident else HOW_TO_RESPOND_DEFAULT
-    if how_to_respond_content and how_to_respond_content != HOW_TO_RESPOND_DEFAULT:
-        # Format the text area content into a list if possible (assuming line breaks)
-        action_steps = "\n".join([f"* {line.strip()}" for line in how_to_respond_content.split('\n') if line.strip()])
-    else:
-        action_steps = f"*{HOW_TO_RESPOND_DEFAULT}*"
-        
-    # --- Report Content Template ---
-    content = f'''
-# BEHAVIOUR PROFILE PLAN (BPP)
-## Student: {student['name']} (EDID: {student['edid']})
-**Date Generated:** {datetime.now().strftime('%Y-%m-%d')}
-**Review Date:** {datetime.now().date() + pd.Timedelta(days=30)}
-
----
-
-## 1. Summary of Clinical Findings and Data Analysis
-
-| Metric | Detail |
-| :--- | :--- |
-| **Total Incidents Logged** | {total_incidents} |
-| **Critical Incidents (ABCH)** | {abch_count} |
-| **Most Frequent Behaviour** | {most_freq_behaviour} |
-| **Peak Risk Level Observed** | {peak_risk} |
-| **Primary Hypothesized Function** | {latest_plan_incident['func_hypothesis'] if latest_plan_incident else 'N/A'} |
-| **Primary Antecedent (Trigger)** | {latest_plan_incident['antecedent'] if latest_plan_incident else 'N/A'} |
-| **Window of Tolerance State** | {latest_plan_incident['window_of_tolerance'] if latest_plan_incident else 'N/A'} |
-
----
-
-## 2. Comprehensive Action Plan (How to Respond)
-
-This section outlines the immediate and strategic responses derived from the last critical incident analysis.
-
-### Primary De-escalation Strategy (The 'H' in ABCH)
-**Last Updated:** {latest_plan_incident['date'] if latest_plan_incident else 'N/A'}
-{action_steps}
-
-### Crisis Prevention Institute (CPI) Protocol
-The student is currently demonstrating behaviours aligning with the **{cpi_stage}** stage of the CPI Verbal Escalation Continuum.
-* **Recommended Staff Response:** {cpi_response}
-* **Goal:** Maintain safety and use *Supportive* and *Directive* nonverbal strategies to prevent escalation.
-
----
-
-## 3. Trauma-Informed (Berry Street) Strategy
-The core strategy focuses on **De-escalation and Rhythms** (calming the nervous system) and **Relationships** (re-establishing safety).
-* **Focus during escalation:** Ensure a calm, predictable presence. Use neutral body language and provide choices to restore a sense of control.
-* **Focus post-incident:** Prioritize therapeutic rapport. This involves a planned, brief check-in to repair the relationship and process the event, reinforcing that the student is safe and valued.
-* **Focus for Proactive Teaching:** Identify and create an area of contribution within the classroom to shift the student's sense of self from 'problem' to 'valued member'.
-
----
-
-## 4. Chronological Incident Context (Last Detailed Log)
-
-### Incident Date: {latest_plan_incident['date'] if latest_plan_incident else 'N/A'}
-### Final Summary: {latest_plan_incident['context'] if latest_plan_incident else 'N/A'}
-
-*This Behaviour Profile Plan is a dynamic document and must be reviewed after any further critical incident or after 30 calendar days.*
-'''
-    return content
-
-def get_download_link(file_content, filename):
-    """Generates a downloadable file link for Streamlit."""
-    b64 = base64.b64encode(file_content.encode()).decode()
-    # Create the download link in Markdown
-    return f'<a href="data:file/txt;base64,{b64}" download="{filename}">⬇ Download Full Behaviour Profile Plan (.txt)</a>'
-
-
-# --- Plotly Graph Enhancement ---
-
-def render_data_analysis(student, df):
-    """ Renders the comprehensive data analysis and clinical summary section with enhanced Plotly charts. """
-    st.subheader(f"📊 Comprehensive Data Analysis for: **{student['name']}**")
-    
-    # --- Data Preprocessing for Analysis ---
-    df['time_obj'] = pd.to_datetime(df['time'], format='%H:%M').dt.time # NEW: Time object
-    df['time_slot'] = df['time_obj'].apply(get_time_slot) # NEW: Half-hour slot
-    df['is_abch_completed_label'] = df['is_abch_completed'].apply(lambda x: 'Critical Incident (ABCH) - Activated' if x else 'Basic Log')
-    
-    # Get the latest plan incident for BPP review
-    latest_plan_incident = next((i for i in df.to_dict('records') if i.get('is_abch_completed') == True), df.to_dict('records')[0] if not df.empty else None)
-    
-    if df.empty:
-        st.info("No incident data available for this student yet.")
-        return
-
-    # --- BPP Review and Download ---
-    st.markdown("### 📄 Behaviour Profile Plan (BPP) Status")
-    
-    col_bpp1, col_bpp2 = st.columns([3, 2])
-    
-    with col_bpp1:
-        st.markdown(f"**Latest BPP-Update Incident:** {latest_plan_incident['date'] if latest_plan_incident else 'N/A'}")
-        st.markdown(f"**Primary Antecedent:** {latest_plan_incident['antecedent'] if latest_plan_incident else 'N/A'}")
-        st.markdown(f"**Primary Function:** {latest_plan_incident['func_hypothesis'] if latest_plan_incident else 'N/A'}")
-
-    with col_bpp2:
-        if latest_plan_incident:
-            report_content = generate_bpp_report_content(student, latest_plan_incident, df)
-            filename = f"BPP_Report_{student['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.txt"
-            st.markdown(get_download_link(report_content, filename), unsafe_allow_html=True)
-            
-    st.markdown("---")
-    
-    # --- Row 1: Frequency, Severity, Location ---
-    col_graph1, col_graph2, col_graph3 = st.columns(3)
-    
-    # 1. FREQUENCY GRAPH (Incidents over time)
-    with col_graph1:
-        st.markdown("##### 📈 Incidents Over Time")
-        df_time = df.groupby('date')['id'].count().reset_index(name='Count')
-        df_time['date'] = pd.to_datetime(df_time['date'])
-        
-        fig_time = px.line(
-            df_time, 
-            x='date', 
-            y='Count', 
-            title='Incidents Per Day', 
-            template=PLOTLY_THEME, 
-            markers=True
-        )
-        fig_time.update_xaxes(dtick="M1", tickformat="%b %d")
-        fig_time.update_traces(line=dict(color='#3498DB', width=3))
-        st.plotly_chart(fig_time, use_container_width=True)
-
-    # 2. SEVERITY GRAPH (Risk Level Distribution)
-    with col_graph2:
-        st.markdown("##### 🔥 Severity and ABCH Activation")
-        df_severity = df.groupby(['risk_level', 'is_abch_completed_label'])['id'].count().reset_index(name='Count')
-        
-        fig_severity = px.bar(
-            df_severity, 
-            x='risk_level', 
-            y='Count', 
-            color='is_abch_completed_label',
-            title='Risk Level Distribution vs. ABCH Activation',
-            template=PLOTLY_THEME,
-            labels={'risk_level': 'Risk Level (1=Low, 5=Extreme)', 'Count': 'Incident Count', 'is_abch_completed_label': 'ABCH Activation'},
-            category_orders={"risk_level": sorted(df['risk_level'].unique())},
-            color_discrete_map={'Critical Incident (ABCH) - Activated': '#FF5733', 'Basic Log': '#5B5E63'}, # Orange/Red for Critical
-            barmode='stack'
-        )
-        fig_severity.update_xaxes(dtick=1)
-        fig_severity.update_traces(marker_line_width=1, marker_line_color='gray')
-        st.plotly_chart(fig_severity, use_container_width=True)
-    
-    # 3. LOCATION GRAPH (NEW Requirement)
-    with col_graph3:
-        st.markdown("##### 📍 Incidents by Setting (Location)")
-        location_counts = df['setting'].value_counts().reset_index(name='Count')
-        location_counts.columns = ['Setting', 'Count']
-        fig_location = px.bar(
-            location_counts, 
-            x='Setting', 
-            y='Count', 
-            title='Incident Frequency by Location',
-            template=PLOTLY_THEME,
-            labels={'Setting': 'Setting', 'Count': 'Incident Count'},
-            color_discrete_sequence=['#2ECC71'] # Green
-        )
-        fig_location.update_traces(marker_line_width=1, marker_line_color='gray')
-        fig_location.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
-        st.plotly_chart(fig_location, use_container_width=True)
-        
-    st.markdown("---")
-    
-    # --- Row 2: Time/Session, Behaviour, Function ---
-    col_graph4, col_graph5, col_graph6 = st.columns(3)
-    
-    # 4. TIME OF DAY GRAPH (Heatmap)
-    with col_graph4:
-        st.markdown("##### ⏰ Time and Day Heatmap")
-        df_heatmap = df.groupby(['day', 'time_slot'])['id'].count().reset_index(name='Count')
-        
-        # Order days for display
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        df_heatmap['day'] = pd.Categorical(df_heatmap['day'], categories=day_order, ordered=True)
-        df_heatmap = df_heatmap.sort_values('day')
-        
-        fig_heatmap = px.density_heatmap(
-            df_heatmap,
-            x='time_slot', 
-            y='day', 
-            z='Count', 
-            title='Incident Heatmap by Time Slot and Day',
-            template=PLOTLY_THEME,
-            color_continuous_scale="Plasma",
-            labels={'time_slot': 'Time Slot', 'day': 'Day of Week', 'z': 'Incident Count'}
-        )
-        st.plotly_chart(fig_heatmap, use_container_width=True)
-        
-    # 5. BEHAVIOUR GRAPH (Pareto/Bar Chart)
-    with col_graph5:
-        st.markdown("##### 💥 Behaviour Frequency (Top 5)")
-        behaviour_counts = df['behaviour'].value_counts().head(5).reset_index(name='Count')
-        behaviour_counts.columns = ['Behaviour', 'Count']
-        
-        fig_behaviour = px.bar(
-            behaviour_counts, 
-            x='Behaviour', 
-            y='Count', 
-            title='Most Frequent Behaviours',
-            template=PLOTLY_THEME,
-            color='Count',
-            color_continuous_scale='Mint',
-            labels={'Count': 'Incident Count'}
-        )
-        fig_behaviour.update_traces(marker_line_width=1, marker_line_color='gray')
-        fig_behaviour.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
-        st.plotly_chart(fig_behaviour, use_container_width=True)
-        
-    # 6. FUNCTION GRAPH (Hypothesis Distribution)
-    with col_graph6:
-        st.markdown("##### 💡 Hypothesized Function")
-        func_counts = df['func_hypothesis'].value_counts().reset_index(name='Count')
-        func_counts.columns = ['Function', 'Count']
-        
-        fig_func = px.pie(
-            func_counts, 
-            names='Function', 
-            values='Count', 
-            title='Function of Behaviour Distribution',
-            template=PLOTLY_THEME,
-            hole=.3,
-            color_discrete_sequence=px.colors.sequential.Agsunset
-        )
-        fig_func.update_traces(textposition='inside', textinfo='percent+label', marker=dict(line=dict(color='#000000', width=1)))
-        st.plotly_chart(fig_func, use_container_width=True)
-        
-    st.markdown("---")
-    
-    # --- Clinical Deep Dive: Outcomes ---
-    df_outcomes = df[df['is_abch_completed'] == True].copy()
-    if not df_outcomes.empty:
-        st.markdown("### ⚠️ Clinical Deep Dive: Critical Incident Outcomes")
-        
-        col_out1, col_out2 = st.columns(2)
-        
-        # Outcomes by Count
-        outcome_columns = [col for col in df_outcomes.columns if col.startswith('outcome_')]
-        outcome_counts = df_outcomes[outcome_columns].sum().reset_index(name='Count')
-        outcome_counts.columns = ['Outcome', 'Count']
-        # Clean up column names for display
-        outcome_counts['Outcome'] = outcome_counts['Outcome'].str.replace('outcome_', '').str.replace('_', ' ').str.title()
-        
-        with col_out1:
-            st.markdown("##### Total Count of Severe Outcomes (ABCH Logs Only)")
-            fig_outcomes = px.bar(
-                outcome_counts.sort_values('Count', ascending=False),
-                x='Outcome', 
-                y='Count', 
-                title='Frequency of Incident Outcomes',
-                template=PLOTLY_THEME,
-                color_discrete_sequence=['#E74C3C'] # Red
-            )
-            fig_outcomes.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
-            st.plotly_chart(fig_outcomes, use_container_width=True)
-
-        # Behaviours leading to assault
-        with col_out2:
-            assault_by_behaviour = df_outcomes[df_outcomes['outcome_assault'] == True].groupby('behaviour')['id'].count().reset_index(name='Assault Count')
-            
-            if not assault_by_behaviour.empty:
-                st.markdown("##### 🚩 Behaviours that Escalated to Documented Assault (ABCH Logs Only)")
-                fig_assault = px.bar(
-                    assault_by_behaviour, 
-                    x='behaviour', 
-                    y='Assault Count', 
-                    title='Assault Outcomes by Behaviour Type',
-                    template=PLOTLY_THEME,
-                    labels={'behaviour': 'Observed Behaviour', 'Assault Count': 'Count of Assault Outcomes'},
-                    color_discrete_sequence=['#F39C12']
-                )
-                fig_assault.update_traces(marker_line_width=1, marker_line_color='gray')
-                fig_assault.update_layout(xaxis={'categoryorder':'total descending', 'tickangle': -45})
-                st.plotly_chart(fig_assault, use_container_width=True)
-            else:
-                st.info("No incidents logged with documented assault outcomes.")
-
-    st.markdown("---")
-    
-    # --- Clinical Interpretation Section ---
-    st.markdown("### 🧠 Clinical Interpretation & Next Steps")
-    
-    # 1. Summary of Findings
-    st.markdown("#### 1. Summary of Data Findings")
-    st.markdown(f"""
-- **Primary Concern:** **{most_freq_behaviour}** is the most frequent behaviour, suggesting a targeted intervention is needed.
-- **Timing:** Incidents peak on **{df['day'].mode().iloc[0] if not df.empty else 'N/A'}** during the **{df['session'].mode().iloc[0] if not df.empty else 'N/A'}**.
-- **Context:** The highest concentration of risk incidents occurs in the **{df[df['risk_level'] >= 4]['setting'].mode().iloc[0] if not df[df['risk_level'] >= 4].empty else 'N/A'}** setting.
-- **Function:** The most hypothesized function is **{latest_plan_incident['func_hypothesis'] if latest_plan_incident else 'N/A'}**, indicating the intervention must teach a replacement behaviour that achieves this function appropriately.
-""")
-
-    # 2. Recommended Proactive Strategy (Replicating BPP)
-    st.markdown("#### 2. Proactive Strategy Focus (Berry Street)")
-    st.markdown("""
-The focus should be on **Relationships** and **Rhythms**. Specifically:
-- **Relational Shift:** Systematically identify and create an area of contribution within the classroom to shift the student's sense of self from 'problem' to 'valued member'.
-""")
-    
-    # 3. CPI Staging and Protocol
-    st.markdown("### 3. Crisis Prevention Institute (CPI) Protocol Staging")
-    
-    # Replicate CPI logic for consistency
-    if latest_plan_incident:
-        if most_freq_behaviour in ['Physical Aggression (Staff)', 'Self-Injurious Behaviour', 'Property Destruction'] or peak_risk >= 4:
-            cpi_stage = "High-Risk: Acting Out (Danger)"
-            cpi_response = "Nonviolent Physical Crisis Intervention (where appropriate) followed by Therapeutic Rapport to restore the relationship immediately after the crisis."
-        elif most_freq_behaviour in ['Aggression (Peer)', 'Elopement', 'Verbal Refusal'] or peak_risk == 3:
-            cpi_stage = "Peak Risk: Defensive"
-            cpi_response = "Use Supportive language and Directive strategies (offering choices, clear limits) to guide the student toward an appropriate choice."
-        else:
-            cpi_stage = "Low-Risk: Questioning / Refusal"
-            cpi_response = "Use Information Seeking and Challenging questions as opportunities for connection and teaching appropriate ways to communicate needs."
-            
-        st.markdown(f"The student's data indicates a pattern aligning with the **{cpi_stage}** stage.")
-        st.markdown(f"* **Recommended Protocol:** {cpi_response}")
-    else:
-        st.info("No data available to determine CPI Staging.")
+def get_analysis_view():
+    """Imports the charting module on first use (timed once per process)."""
+    first_import = 'analysis_view' not in sys.modules
+    import_started = perf_counter()
+    # import_module (rather than a sys.modules lookup) waits if another session is mid-import
+    analysis_view = importlib.import_module('analysis_view')
+    if first_import:
+        record_startup_timing('analysis_view_import_s', perf_counter() - import_started)
+    return analysis_view
+
+@timed_render
+def render_student_analysis(student, history_window):
+    """Imports the charting module on first use and renders the student's analysis view over a HISTORY_WINDOWS window."""
+    analysis_view = get_analysis_view()
+    since_ordinal = history_start(history_window)
+    df = get_student_frame(student['id'], since_ordinal)
+    time_series = get_student_time_series(student['id'], since_ordinal)
+    resolution = select_time_resolution(time_series) if time_series else None
+    analysis_view.render_data_analysis(
+        student,
+        df,
+        # Monthly buckets still beyond the cap keep only the most recent MAX_CHART_POINTS
+        time_series[resolution].tail(MAX_CHART_POINTS) if time_series else None,
+        resolution,
+        get_incident_store().student_heatmap(student['id']),
+        DAYS,
+        get_heatmap_slot_labels(),
+        get_student_summary(student['id'], since_ordinal),
+        get_bpp_report(student['id'], datetime.now().date(), history_window)
+    )
 
 
 # --- Form Rendering Functions (Quick Log, ABCH, General Log) ---
 
+@timed_render
 def render_abch_chronology_form():
     """Renders the form for logging the sequential A-B-C steps for a critical incident."""
     st.markdown("##### 📝 Chronological Incident Log (A-B-C Steps)")
@@ -860,31 +463,10 @@ def render_abch_chronology_form():
 def save_new_incident(incident_data, student, is_abch=False, return_role='direct'):
     """Appends a new incident to the session state and navigates appropriately."""
     
-    # 1. Generate core metadata
-    incident_data.update({
-        'id': str(uuid.uuid4()),
-        'student_id': student['id'],
-        'day': datetime.strptime(incident_data['date'], '%Y-%m-%d').strftime('%A'),
-        'session': get_session_from_time(datetime.strptime(incident_data['time'], '%H:%M').time()),
-        'is_abch_completed': is_abch,
-        'notes': None # Placeholder for now, can be updated later
-    })
-    
-    # 2. Ensure all outcome fields are present (defaulting to False if not an ABCH log)
-    if not is_abch:
-        incident_data.update({
-            'outcome_send_home': False, 'outcome_leave_area': False, 
-            'outcome_assault': False, 'outcome_property_damage': False, 
-            'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
-            'outcome_ambulance': False,
-            'how_to_respond': incident_data.get('how_to_respond', HOW_TO_RESPOND_DEFAULT),
-            'context': incident_data.get('context', "Basic log captured. No detailed context entered.")
-        })
+    # 1. Fill in metadata and defaults, then commit
+    commit_incidents([Incident.from_dict(complete_incident_data(incident_data, student['id'], is_abch))])
     
-    # 3. Append to incidents list
-    st.session_state.incidents.append(incident_data)
-    
-    # 4. Success message and navigation
+    # 2. Success message and navigation
     st.success(f"Incident Logged Successfully for {student['name']}!")
     
     # Navigate to student analysis page if staff area, or landing page if direct log
@@ -894,6 +476,7 @@ def save_new_incident(incident_data, student, is_abch=False, return_role='direct
         navigate_to('landing')
 
 
+@timed_render
 def render_abch_follow_up_form(student):
     """Renders the A-B-C-H Follow-up form (Step 2) for critical incidents."""
     
@@ -904,13 +487,15 @@ def render_abch_follow_up_form(student):
     return_role = st.session_state.current_role
     return_mode = 'analysis' if return_role in ['JP', 'PY', 'SY', 'ADM'] else 'landing'
     
+    existing_incident_id = None
     if not prelim_data:
-        # Fallback: Find the most recent, non-completed incident for the student
-        incidents = get_incidents_by_student(student['id'])
-        target_incident = next((i for i in reversed(incidents) if i['is_abch_completed'] == False and i['risk_level'] >= 3), None)
+        # Fallback: the most recent, non-completed high-risk incident for the student (indexed by the store)
+        target_incident = get_incident_store().latest_open_abch(student['id'])
         
         if target_incident:
-            prelim_data = target_incident
+            # Completing it upgrades the stored row in place rather than saving a second copy
+            prelim_data = target_incident.to_dict()
+            existing_incident_id = target_incident.id
             st.warning("No live incident data found. Loading the most recent high-risk incident for ABCH completion.")
         else:
             st.error("Cannot find a preliminary incident log to complete the ABCH follow-up.")
@@ -923,6 +508,9 @@ def render_abch_follow_up_form(student):
     st.markdown(f"**Initial Behaviour:** {prelim_data['behaviour']} | **Initial Risk:** Level {prelim_data['risk_level']}")
     st.markdown("---")
 
+    with st.expander("🔎 What Worked Before: Similar Past Incidents With a Written Plan", expanded=True):
+        render_similar_incidents(prelim_data, student['id'], require_plan=True)
+
     # --- CHRONOLOGY INPUT ---
     render_abch_chronology_form()
     st.markdown("---")
@@ -978,7 +566,7 @@ def render_abch_follow_up_form(student):
         with col_right_table:
             st.markdown("##### Follow-up Required (Management Only)")
             st.text_area("Future Risk Plan: To be developed / reviewed:", key="safety_risk_plan", height=80, placeholder="Specify the next steps for RMP update.")
-            st.text_area("Other outcomes to be pursued by Cowandilla Learning Centre Management:", key="cowandilla_management_outcomes", height=80)
+            st.text_area(f"Other outcomes to be pursued by {SITE['name']} Management:", key="cowandilla_management_outcomes", height=80)
             
         final_submitted = st.form_submit_button("Finalize and Save ABCH Log (Updates BPP)", type="primary")
 
@@ -991,15 +579,7 @@ def render_abch_follow_up_form(student):
                 return
 
             # 1. Compile chronological and clinical summary into final context
-            final_context = "Chronological Log:\n"
-            for i, entry in enumerate(st.session_state.abch_chronology):
-                # Only include layers with at least one data point
-                if entry['location'] or entry['context'] or entry['behaviour'] or entry['consequence']:
-                    final_context += f"Layer {i+1} ({entry['time']}): L: {entry['location'] or 'N/A'}; A: {entry['antecedent'] or 'N/A'}; B: {entry['behaviour'] or 'N/A'}; C: {entry['consequence'] or 'N/A'}\n"
-                    if entry['context']:
-                        final_context += f"   - Context: {entry['context']}\n"
-            
-            final_context += f"\n---\nFinal Clinical Summary:\n{final_summary}"
+            final_context = compile_abch_context(st.session_state.abch_chronology, final_summary)
 
             # 2. Compile final incident data
             final_incident_data = prelim_data.copy()
@@ -1022,8 +602,22 @@ def render_abch_follow_up_form(student):
                 'notes': f"Safety Risk Plan: {st.session_state.safety_risk_plan}\nManagement Outcomes: {st.session_state.cowandilla_management_outcomes}"
             })
 
-            # 3. Save the new, completed incident
-            save_new_incident(final_incident_data, student, is_abch=True, return_role=return_role)
+            # 3. Save the new, completed incident (or upgrade the stored preliminary log)
+            if existing_incident_id:
+                final_incident_data['is_abch_completed'] = True
+                try:
+                    update_incident(final_incident_data)
+                except IncidentNotFound:
+                    st.error("Submission blocked: This preliminary log is no longer in the store (it may have been archived or removed). Start a new ABCH log instead.")
+                    return
+                st.session_state.abch_chronology = []
+                st.success(f"ABCH Follow-up Saved for {student['name']}!")
+                if return_role in ['JP', 'PY', 'SY', 'ADM']:
+                    navigate_to('staff_area', role=return_role, mode='analysis', student_id=student['id'])
+                else:
+                    navigate_to('landing')
+            else:
+                save_new_incident(final_incident_data, student, is_abch=True, return_role=return_role)
             
             # 4. Clear temporary state
             st.session_state.temp_incident_data = None
@@ -1032,6 +626,96 @@ def render_abch_follow_up_form(student):
             # st.rerun() is called inside save_new_incident
 
 
+@timed_render
+def render_staff_logging_fields(key_prefix=''):
+    """Renders the Logged By / Other Staff inputs. Returns (logged_by_id, other_staff_ids, name_missing)."""
+    staff_options = {s['id']: s['name'] for s in st.session_state.staff}
+
+    col_staff1, col_staff2 = st.columns(2)
+
+    with col_staff1:
+        logged_by_name = st.selectbox(
+            "Logged By (Your Name/Role)", 
+            options=list(staff_options.values()), 
+            key=f"{key_prefix}logged_by_name"
+        )
+
+        # Get the ID of the selected staff member
+        logged_by_id = next((k for k, v in staff_options.items() if v == logged_by_name), None)
+        staff_details = next((s for s in st.session_state.staff if s['id'] == logged_by_id), {})
+        is_special_logged = staff_details.get('special', False)
+        logged_by_name_override = None
+
+        if is_special_logged:
+            logged_by_name_override = st.text_input(
+                f"Enter your name for **{logged_by_name}**", 
+                key=f"{key_prefix}logged_by_name_override", 
+                placeholder=f"E.g., Jane Doe (Logged as '{logged_by_id}: Jane Doe')"
+            )
+            if not logged_by_name_override:
+                st.error(f"Name required for special role: {logged_by_name}")
+
+    with col_staff2:
+        st.markdown("Other Staff Involved (Check all that apply)")
+        other_staff_ids = []
+        for staff_id, name in staff_options.items():
+            if staff_id == logged_by_id: # Skip the person logging
+                continue
+
+            staff_details = next((s for s in st.session_state.staff if s['id'] == staff_id), {})
+
+            if st.checkbox(name, key=f"{key_prefix}other_staff_{staff_id}"):
+                if staff_details.get('special'):
+                    special_name_input = st.text_input(
+                        f"Enter name for **{name}**", 
+                        key=f"{key_prefix}other_staff_special_name_input_{staff_id}",
+                        placeholder=f"E.g., Jane Doe (Logged as '{name}: Jane Doe')"
+                    )
+                    if special_name_input:
+                        other_staff_ids.append(f"{staff_id}:{special_name_input}")
+                else:
+                    other_staff_ids.append(staff_id)
+
+    # --- Final logged_by ID construction ---
+    final_logged_by_id = logged_by_id
+    if is_special_logged and logged_by_name_override:
+        final_logged_by_id = f"{logged_by_id}:{logged_by_name_override}"
+    # Callers must block submission while a special role has no name entered
+    name_missing = is_special_logged and not logged_by_name_override
+    return final_logged_by_id, other_staff_ids, name_missing
+
+
+@timed_render
+def render_similar_incidents(incident_data, student_id, require_plan=False):
+    """Lists the past incidents (school-wide) most similar to a draft, with how staff responded and how well it worked."""
+    draft = Incident.from_dict({**incident_data, 'student_id': student_id})
+    matches = get_incident_store().similar_incidents(draft, require_plan=require_plan)
+    if not matches:
+        st.info("No similar past incidents on record yet.")
+        return
+    student_names = {s['id']: s['name'] for s in MOCK_STUDENTS}
+    st.dataframe(
+        [
+            {
+                'Match': f"{score:.1f} / {SIMILARITY_MAX_SCORE}",
+                'Date': incident['date'],
+                'Student': student_names.get(incident.student_id, incident.student_id),
+                'Behaviour': incident['behaviour'],
+                'Antecedent': incident['antecedent'],
+                'Setting': incident['setting'],
+                'Risk': incident.risk_level,
+                'Consequence': incident['consequence'],
+                'Effectiveness': incident['effectiveness'],
+                'How to Respond': incident['how_to_respond'],
+            }
+            for score, incident in matches if incident is not None
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
+
+
+@timed_render
 def render_incident_log_form(student, is_abch_step=False, role='direct'):
     """Renders the general incident log form (Step 1 or Quick Log)."""
     
@@ -1046,7 +730,7 @@ def render_incident_log_form(student, is_abch_step=False, role='direct'):
             time_val = st.time_input("Time of Incident", datetime.now().time(), key="inc_time")
 
         auto_session = get_session_from_time(time_val)
-        session_options = ['Morning (8:30-11:00)', 'Middle (11:01-1:00)', 'Afternoon (1:01-3:00)', 'Outside Hours']
+        session_options = list(SESSIONS)
         if auto_session not in session_options:
             session_options.append(auto_session)
 
@@ -1075,60 +759,7 @@ def render_incident_log_form(student, is_abch_step=False, role='direct'):
         st.markdown("---")
         st.markdown("#### Staff Logging")
         
-        staff_options = {s['id']: s['name'] for s in st.session_state.staff}
-        
-        col_staff1, col_staff2 = st.columns(2)
-        
-        with col_staff1:
-            logged_by_name = st.selectbox(
-                "Logged By (Your Name/Role)", 
-                options=list(staff_options.values()), 
-                key="logged_by_name"
-            )
-            
-            # Get the ID of the selected staff member
-            logged_by_id = next((k for k, v in staff_options.items() if v == logged_by_name), None)
-            staff_details = next((s for s in st.session_state.staff if s['id'] == logged_by_id), {})
-            is_special_logged = staff_details.get('special', False)
-            logged_by_name_override = None
-            
-            if is_special_logged:
-                logged_by_name_override = st.text_input(
-                    f"Enter your name for **{logged_by_name}**", 
-                    key="logged_by_name_override", 
-                    placeholder=f"E.g., Jane Doe (Logged as '{logged_by_id}: Jane Doe')"
-                )
-                if not logged_by_name_override:
-                    st.error(f"Name required for special role: {logged_by_name}")
-                    
-        with col_staff2:
-            st.markdown("Other Staff Involved (Check all that apply)")
-            other_staff_ids = []
-            for staff_id, name in staff_options.items():
-                if staff_id == logged_by_id: # Skip the person logging
-                    continue
-                
-                staff_details = next((s for s in st.session_state.staff if s['id'] == staff_id), {})
-                
-                if st.checkbox(name, key=f"other_staff_{staff_id}"):
-                    if staff_details.get('special'):
-                        special_name_input = st.text_input(
-                            f"Enter name for **{name}**", 
-                            key=f"other_staff_special_name_input_{staff_id}",
-                            placeholder=f"E.g., Jane Doe (Logged as '{name}: Jane Doe')"
-                        )
-                        if special_name_input:
-                            other_staff_ids.append(f"{staff_id}:{special_name_input}")
-                    else:
-                        other_staff_ids.append(staff_id)
-        
-        # --- Final logged_by ID construction ---
-        final_logged_by_id = logged_by_id
-        if is_special_logged and logged_by_name_override:
-            final_logged_by_id = f"{logged_by_id}:{logged_by_name_override}"
-        elif is_special_logged and not logged_by_name_override:
-            # This case must be handled to block submission if the required field is empty
-            pass
+        final_logged_by_id, other_staff_ids, logged_by_name_missing = render_staff_logging_fields()
 
         # --- Risk and Follow-up ---
         st.markdown("---")
@@ -1162,13 +793,25 @@ def render_incident_log_form(student, is_abch_step=False, role='direct'):
         if risk_level >= 3 and not is_abch_step:
             submit_label = "Save Log & Proceed to ABCH Follow-up (Mandatory)"
 
-        submitted = st.form_submit_button(submit_label, type="primary")
+        col_submit, col_similar = st.columns([3, 2])
+        with col_submit:
+            submitted = st.form_submit_button(submit_label, type="primary")
+        with col_similar:
+            show_similar = st.form_submit_button("🔎 Find Similar Past Incidents")
+
+        if show_similar and not submitted:
+            st.markdown("##### Similar Past Incidents (What Was Tried Before)")
+            render_similar_incidents({
+                'date': date_val.strftime('%Y-%m-%d'), 'time': time_val.strftime('%H:%M'),
+                'behaviour': behaviour, 'antecedent': antecedent, 'setting': setting, 'risk_level': risk_level,
+                'func_hypothesis': func_hypothesis, 'window_of_tolerance': wot,
+            }, student['id'])
 
         if submitted:
             # Form submission logic
             
             # Block submission for special roles if name override is empty
-            if is_special_logged and not logged_by_name_override:
+            if logged_by_name_missing:
                 # Error already displayed above
                 return 
 
@@ -1200,6 +843,80 @@ def render_incident_log_form(student, is_abch_step=False, role='direct'):
                 save_new_incident(initial_incident_data, student, is_abch=False, return_role=role)
 
 
+@timed_render
+def render_incident_edit_form(student, role, since_ordinal=None):
+    """Lets staff correct a logged incident; the stored row is updated in place (same id)."""
+    df = get_student_frame(student['id'], since_ordinal)
+    if df.empty:
+        st.info("No incidents logged for this student yet.")
+        return
+
+    labels = dict(zip(df['id'], df['date'] + ' ' + df['time'] + ' | ' + df['behaviour'] + ' (Level ' + df['risk_level'].astype(str) + ')'))
+    incident_id = st.selectbox("Incident to Edit", options=list(labels), format_func=labels.get, key=f"edit_incident_select_{student['id']}")
+    incident = get_incident_store().get_incident(incident_id)
+    if incident is None:
+        st.info("This incident belongs to an archived term and is read-only.")
+        return
+
+    def option_index(options, value):
+        return options.index(value) if value in options else 0
+
+    with st.form(f"edit_incident_form_{incident_id}"):
+        col_date, col_time = st.columns(2)
+        with col_date:
+            date_val = st.date_input("Date of Incident", date.fromordinal(incident.date_ordinal))
+        with col_time:
+            time_val = st.time_input("Time of Incident", time(incident.minute // 60, incident.minute % 60))
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            behaviour = st.selectbox("Observed Behaviour", options=BEHAVIORS_BPP, index=option_index(BEHAVIORS_BPP, incident['behaviour']))
+            risk_level = st.selectbox("Risk Level (1=Low, 5=Extreme)", options=RISK_LEVELS, index=option_index(RISK_LEVELS, incident.risk_level))
+        with col2:
+            antecedent = st.selectbox("A: Antecedent (Trigger)", options=ANTECEDENTS_NEW, index=option_index(ANTECEDENTS_NEW, incident['antecedent']))
+            consequence = st.selectbox("C: Consequence/Staff Response", options=CONSEQUENCES, index=option_index(CONSEQUENCES, incident['consequence']))
+        with col3:
+            setting = st.selectbox("Location (Setting)", options=SETTINGS, index=option_index(SETTINGS, incident['setting']))
+            support_type = st.selectbox("Support Type", options=SUPPORT_TYPES, index=option_index(SUPPORT_TYPES, incident['support_type']))
+
+        col4, col5, col6 = st.columns(3)
+        with col4:
+            func_hypothesis = st.selectbox("Primary Functional Hypothesis", options=FUNCTIONAL_HYPOTHESIS, index=option_index(FUNCTIONAL_HYPOTHESIS, incident['func_hypothesis']))
+        with col5:
+            wot = st.selectbox("Window of Tolerance State", options=WINDOW_OF_TOLERANCE, index=option_index(WINDOW_OF_TOLERANCE, incident['window_of_tolerance']))
+        with col6:
+            effectiveness = st.selectbox("Intervention Effectiveness", options=INTERVENTION_EFFECTIVENESS, index=option_index(INTERVENTION_EFFECTIVENESS, incident['effectiveness']))
+
+        context = st.text_area("Context/Detailed Observation", value=incident['context'] or '', height=150)
+        how_to_respond = st.text_area("How to Respond (Action Plan)", value=incident['how_to_respond'] or '', height=100)
+
+        if st.form_submit_button("Save Changes", type="primary"):
+            incident_data = incident.to_dict()
+            incident_data.update({
+                'date': date_val.strftime('%Y-%m-%d'),
+                'time': time_val.strftime('%H:%M'),
+                'behaviour': behaviour,
+                'antecedent': antecedent,
+                'setting': setting,
+                'support_type': support_type,
+                'risk_level': risk_level,
+                'consequence': consequence,
+                'func_hypothesis': func_hypothesis,
+                'window_of_tolerance': wot,
+                'effectiveness': effectiveness,
+                'context': context,
+                'how_to_respond': how_to_respond or HOW_TO_RESPOND_DEFAULT,
+            })
+            try:
+                update_incident(incident_data)
+            except IncidentNotFound:
+                st.error("Submission blocked: This incident is no longer in the store (it may have been archived or removed by another user).")
+                return
+            st.success("Incident updated.")
+            navigate_to('staff_area', role=role, mode='analysis', student_id=student['id'])
+
+
+@timed_render
 def render_direct_log_form():
     """Renders the incident log form directly after selection from the landing page."""
     student = get_student_by_id(st.session_state.selected_student_id)
@@ -1223,8 +940,242 @@ def render_direct_log_form():
         st.error("No student selected.")
         navigate_to('landing')
 
+# --- Group Incident Logging ---
+# One incident involving several students (e.g. a yard conflict) is logged in a single form:
+# the shared details are captured once and behaviour/risk per student. Every student's record
+# carries the same group_id, and the whole group is committed as one batch. If any student is
+# at risk level 3 or above, the group goes through a joint ABCH follow-up before it is saved.
+
+def save_group_incidents(drafts, return_role):
+    """Commits every student's record of a group incident in one transaction and navigates back."""
+    commit_incidents([Incident.from_dict(draft) for draft in drafts])
+    st.session_state.temp_group_incidents = None
+    st.session_state.abch_chronology = []
+    st.success(f"Group Incident Logged Successfully for {len(drafts)} students!")
+
+    if return_role in ['JP', 'PY', 'SY', 'ADM']:
+        navigate_to('staff_area', role=return_role, mode='home')
+    else:
+        navigate_to('landing')
+
+
+@timed_render
+def render_group_log_form():
+    """Renders the group incident form (Step 1): shared details once, behaviour and risk per student."""
+    return_role = st.session_state.current_role
+    
+    col_title, col_back = st.columns([4, 1])
+    with col_title:
+        st.markdown("## 👥 Group Incident Log (Step 1)")
+    with col_back:
+        if st.button("⬅ Back", key="back_from_group_log"):
+            st.session_state.temp_group_incidents = None
+            if return_role in ['JP', 'PY', 'SY', 'ADM']:
+                navigate_to('staff_area', role=return_role, mode='home')
+            else:
+                navigate_to('landing')
+    st.markdown("---")
+
+    # Selected outside the form so the per-student rows update as students are added
+    students_by_name = {s['name']: s for s in st.session_state.students}
+    selected_names = st.multiselect("Students Involved", options=sorted(students_by_name), key="group_students")
+    if len(selected_names) < 2:
+        st.info("Select at least two students to log a group incident.")
+        return
+    students = [students_by_name[name] for name in selected_names]
+
+    with st.form("group_incident_form"):
+        st.markdown("#### Shared Details")
+        col_date, col_time = st.columns(2)
+        with col_date:
+            date_val = st.date_input("Date of Incident", datetime.now().date(), key="group_date")
+        with col_time:
+            time_val = st.time_input("Time of Incident", datetime.now().time(), key="group_time")
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            setting = st.selectbox("Location (Setting)", options=SETTINGS, key="group_setting")
+        with col2:
+            antecedent = st.selectbox("A: Antecedent (Trigger)", options=ANTECEDENTS_NEW, key="group_antecedent")
+        with col3:
+            support_type = st.selectbox("Support Type", options=SUPPORT_TYPES, key="group_support_type")
+
+        col4, col5 = st.columns(2)
+        with col4:
+            consequence = st.selectbox("C: Consequence/Staff Response", options=CONSEQUENCES, key="group_consequence")
+        with col5:
+            effectiveness = st.selectbox("Intervention Effectiveness", options=INTERVENTION_EFFECTIVENESS, key="group_effectiveness")
+
+        col_func1, col_func2 = st.columns(2)
+        with col_func1:
+            func_hypothesis = st.selectbox("Primary Functional Hypothesis", options=FUNCTIONAL_HYPOTHESIS, key="group_func_hypothesis")
+        with col_func2:
+            wot = st.selectbox("Window of Tolerance State", options=WINDOW_OF_TOLERANCE, key="group_wot")
+
+        # --- Per-student Behaviour and Risk ---
+        st.markdown("---")
+        st.markdown("#### Behaviour and Risk per Student")
+        per_student = {}
+        for student in students:
+            col_name, col_behaviour, col_risk = st.columns([2, 3, 2])
+            with col_name:
+                st.markdown(f"**{student['name']}** ({student['area']})")
+            with col_behaviour:
+                behaviour = st.selectbox("Observed Behaviour", options=BEHAVIORS_BPP, key=f"group_behaviour_{student['id']}")
+            with col_risk:
+                risk_level = st.selectbox("Risk Level (1=Low, 5=Extreme)", options=RISK_LEVELS, key=f"group_risk_{student['id']}")
+            per_student[student['id']] = (behaviour, risk_level)
+
+        # --- Logged By Staff Selection ---
+        st.markdown("---")
+        st.markdown("#### Staff Logging")
+        final_logged_by_id, other_staff_ids, logged_by_name_missing = render_staff_logging_fields('group_')
+
+        st.markdown("---")
+        render_risk_level_info()
+        context = st.text_area("Context/Detailed Observation (Optional)", key="group_context", height=150, placeholder="E.g., Conflict over a ball in the yard escalated between three students.")
+
+        # Fixed label: students at risk level 3+ are routed to the joint ABCH follow-up on submit
+        submitted = st.form_submit_button("Save Group Incident Log", type="primary")
+
+        if submitted:
+            if logged_by_name_missing:
+                # Error already displayed above
+                return
+
+            group_id = str(uuid.uuid4())
+            drafts = []
+            for student in students:
+                behaviour, risk_level = per_student[student['id']]
+                drafts.append(complete_incident_data({
+                    'date': date_val.strftime('%Y-%m-%d'),
+                    'time': time_val.strftime('%H:%M'),
+                    'behaviour': behaviour,
+                    'antecedent': antecedent,
+                    'setting': setting,
+                    'support_type': support_type,
+                    'risk_level': risk_level,
+                    'consequence': consequence,
+                    'func_hypothesis': func_hypothesis,
+                    'window_of_tolerance': wot,
+                    'effectiveness': effectiveness,
+                    'logged_by': final_logged_by_id,
+                    'other_staff': other_staff_ids,
+                    'context': context or "Basic log captured. No detailed context entered.",
+                    'group_id': group_id,
+                }, student['id']))
+
+            if any(draft['risk_level'] >= 3 for draft in drafts):
+                # High Risk: hold the whole group until the joint ABCH follow-up is complete
+                st.session_state.temp_group_incidents = drafts
+                st.session_state.abch_chronology = []
+                navigate_to('group_abch_follow_up', role=return_role)
+            else:
+                save_group_incidents(drafts, return_role)
+
+
+@timed_render
+def render_group_abch_follow_up_form():
+    """Renders the joint ABCH follow-up (Step 2) for the high-risk students of a group incident."""
+    drafts = st.session_state.temp_group_incidents
+    return_role = st.session_state.current_role
+
+    if not drafts:
+        st.error("Cannot find a group incident log to complete the ABCH follow-up.")
+        if st.button("⬅ Back to Home"):
+            navigate_to('landing')
+        return
+
+    high_risk_drafts = [draft for draft in drafts if draft['risk_level'] >= 3]
+    first = drafts[0]
+    st.markdown("## 📝 Joint Critical Incident ABCH Follow-up (Step 2 of 2)")
+    st.markdown(f"**Date:** {first['date']} | **Time:** {first['time']} | **Location:** {first['setting']} | **Antecedent:** {first['antecedent']}")
+    for draft in high_risk_drafts:
+        student = get_student_by_id(draft['student_id'])
+        st.markdown(f"- **{student['name']}**: {draft['behaviour']} (Level {draft['risk_level']})")
+    low_risk_count = len(drafts) - len(high_risk_drafts)
+    if low_risk_count:
+        st.caption(f"{low_risk_count} lower-risk student log(s) in this group will be saved together with these.")
+    st.markdown("---")
+
+    # --- CHRONOLOGY INPUT (shared by the group) ---
+    render_abch_chronology_form()
+    st.markdown("---")
+
+    with st.form("group_abch_final_form"):
+        st.markdown("#### Final BPP Refinement and Action Plan (H) per Student")
+        refinements = {}
+        for draft in high_risk_drafts:
+            student_id = draft['student_id']
+            student = get_student_by_id(student_id)
+            with st.expander(f"{student['name']} — {draft['behaviour']} (Level {draft['risk_level']})", expanded=True):
+                col_h1, col_h2 = st.columns(2)
+                with col_h1:
+                    refined_wot = st.selectbox(
+                        "Window of Tolerance State (Student state during escalation)",
+                        options=WINDOW_OF_TOLERANCE,
+                        key=f"group_abch_wot_{student_id}",
+                        index=WINDOW_OF_TOLERANCE.index(draft['window_of_tolerance'])
+                    )
+                with col_h2:
+                    func_hypothesis = st.selectbox(
+                        "Primary Function (H: Hypothesized/Confirmed Function)",
+                        options=FUNCTIONAL_HYPOTHESIS,
+                        key=f"group_abch_func_hypothesis_{student_id}",
+                        index=FUNCTIONAL_HYPOTHESIS.index(draft['func_hypothesis'])
+                    )
+                how_to_respond = st.text_area(
+                    "H: HOW TO RESPOND (New/Updated Action Plan for staff - Mandatory)",
+                    height=120,
+                    key=f"group_abch_how_to_respond_{student_id}"
+                )
+                outcomes = st.multiselect(
+                    "Intended Outcomes",
+                    options=OUTCOME_FIELDS,
+                    format_func=OUTCOME_LABELS.get,
+                    key=f"group_abch_outcomes_{student_id}"
+                )
+            refinements[student_id] = (refined_wot, func_hypothesis, how_to_respond, outcomes)
+
+        st.markdown("---")
+        final_summary = st.text_area("Final Clinical Summary / Root Cause Analysis (Mandatory)", key="group_abch_final_notes", height=150)
+        col_m1, col_m2 = st.columns(2)
+        with col_m1:
+            safety_risk_plan = st.text_area("Future Risk Plan: To be developed / reviewed:", key="group_safety_risk_plan", height=80)
+        with col_m2:
+            management_outcomes = st.text_area(f"Other outcomes to be pursued by {SITE['name']} Management:", key="group_management_outcomes", height=80)
+
+        final_submitted = st.form_submit_button("Finalize and Save Group ABCH Log (Updates BPP)", type="primary")
+
+        if final_submitted:
+            missing_plans = [get_student_by_id(sid)['name'] for sid, refinement in refinements.items() if not refinement[2]]
+            if missing_plans:
+                st.error(f"Submission blocked: Please complete the **H: HOW TO RESPOND** field for {', '.join(missing_plans)}.")
+                return
+            if not final_summary:
+                st.error("Submission blocked: Please complete the **Final Clinical Summary / Root Cause Analysis** field.")
+                return
+
+            final_context = compile_abch_context(st.session_state.abch_chronology, final_summary)
+            notes = f"Safety Risk Plan: {safety_risk_plan}\nManagement Outcomes: {management_outcomes}"
+            for draft in high_risk_drafts:
+                refined_wot, func_hypothesis, how_to_respond, outcomes = refinements[draft['student_id']]
+                draft.update({
+                    'func_hypothesis': func_hypothesis,
+                    'window_of_tolerance': refined_wot,
+                    'how_to_respond': how_to_respond,
+                    'context': final_context,
+                    'is_abch_completed': True,
+                    'notes': notes,
+                    **{field: field in outcomes for field in OUTCOME_FIELDS},
+                })
+
+            save_group_incidents(drafts, return_role)
+
+
 # --- Page Rendering Functions ---
 
+@timed_render
 def render_landing_page():
     """Renders the initial welcome and role selection page."""
     
@@ -1233,6 +1184,7 @@ def render_landing_page():
     
     st.markdown("<div id='landing-page-content'>", unsafe_allow_html=True)
     st.markdown("## Behaviour Support & Data Analysis Tool", unsafe_allow_html=True)
+    st.markdown(f"#### {SITE['name']}")
     st.markdown("### Please select your area or a student to log an incident.")
     st.markdown("---")
 
@@ -1279,15 +1231,165 @@ def render_landing_page():
                 else:
                     st.error("Student not found.")
 
+        if st.button("👥 Log Group Incident (Several Students)", use_container_width=True, key="start_group_log"):
+            st.session_state.current_role = None
+            navigate_to('group_log')
+
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+@timed_render
+def render_student_comparison_page(role):
+    """Renders several students' incident distributions side by side, from one grouped count over their records."""
+    st.subheader("⚖️ Compare Students")
+    students = st.session_state.students if role == 'ADM' else get_students_by_area(role)
+    groups = {"Choose students": None}
+    for area in sorted({s['area'] for s in students}):
+        groups[f"Whole {area} area"] = [s['id'] for s in students if s['area'] == area]
+    for teacher in sorted({s['teacher'] for s in students}):
+        groups[f"{teacher}'s class"] = [s['id'] for s in students if s['teacher'] == teacher]
+
+    col_group, col_window, col_scale = st.columns([2, 1, 1])
+    with col_group:
+        group = st.selectbox("Compare", options=list(groups), index=0 if role == 'ADM' else 1, key=f"compare_group_{role}")
+    with col_window:
+        history_window = st.selectbox(
+            "History Window", options=list(HISTORY_WINDOWS), index=list(HISTORY_WINDOWS).index(DEFAULT_HISTORY_WINDOW),
+            key=f"compare_window_{role}"
+        )
+    with col_scale:
+        scale = st.radio("Bars Show", ["Counts", "Share of Each Student's Incidents"], key=f"compare_scale_{role}")
+    chosen = groups[group]
+    if chosen is None:
+        chosen = st.multiselect(
+            "Students", options=[s['id'] for s in students], format_func=lambda sid: get_student_by_id(sid)['name'],
+            key=f"compare_students_{role}"
+        )
+    # Roster order, so the same selection made in any order shares one cached comparison
+    student_ids = tuple(s['id'] for s in students if s['id'] in set(chosen))
+    if len(student_ids) < 2:
+        st.info("Select at least two students to compare.")
+        return
+
+    comparison = get_student_comparison(student_ids, history_start(history_window))
+    names = {s['id']: s['name'] for s in students}
+    risk = comparison['risk_level']
+    totals = risk.sum(axis=1)
+
+    def top(dimension):
+        counts = comparison[dimension]
+        return [counts.columns[row.argmax()] if row.any() else '—' for row in counts.to_numpy()]
+    st.dataframe(
+        pd.DataFrame({
+            'Student': [names.get(sid, sid) for sid in student_ids],
+            'Incidents': totals.to_numpy(),
+            'Risk 4+': risk[[level for level in risk.columns if level >= 4]].sum(axis=1).to_numpy(),
+            'Most Frequent Behaviour': top('behaviour'),
+            'Most Frequent Setting': top('setting'),
+            'Busiest Time': top('time_slot'),
+        }),
+        hide_index=True, use_container_width=True
+    )
+    if not totals.any():
+        st.info("None of these students has incidents in this window.")
+        return
+    get_analysis_view().render_student_comparison(comparison, names, share=scale != "Counts")
+
+
+@timed_render
+def render_regional_rollup_page():
+    """Renders the ADM regional dashboard, merged from the rollup each site stores."""
+    st.subheader("🌏 Regional Rollup (All Sites)")
+    st.caption(
+        f"Each site stores its rollup with its overnight precompute ({PRECOMPUTE_HOUR:02d}:00). "
+        "This page reads only those rollups, never another site's incidents."
+    )
+    if st.button(f"Refresh {SITE['name']} Rollup Now", key="refresh_site_rollup"):
+        materialize_site_rollup(get_incident_store(), SITE)
+
+    rollup = regional_rollup()
+    sites = pd.DataFrame(rollup['sites'])
+    totals = rollup['totals']
+    if totals:
+        col_s, col_i, col_a, col_e = st.columns(4)
+        col_s.metric("Sites Reporting", f"{(sites['status'] == 'ok').sum()} of {len(sites)}")
+        col_i.metric("Incidents", f"{totals['incidents']:,}")
+        col_a.metric("ABCH Logs", f"{totals['abch']:,}")
+        col_e.metric("Students at an Escalation Threshold", f"{totals['escalating_students']} of {totals['students']}")
+
+    st.dataframe(
+        sites.rename(columns={
+            'name': 'Site', 'status': 'Rollup', 'as_of': 'As Of', 'students': 'Students', 'incidents': 'Incidents',
+            'abch': 'ABCH', 'escalating_students': 'Escalating',
+        }).drop(columns=['site']),
+        hide_index=True, use_container_width=True
+    )
+    if not totals:
+        st.info("No site has stored a rollup yet.")
+        return
+
+    col_b, col_c = st.columns([3, 2])
+    with col_b:
+        st.markdown("##### Incidents by Behaviour and Risk Level")
+        behaviour_risk = pd.DataFrame(totals['behaviour_risk']).T.fillna(0).astype(int)
+        st.bar_chart(behaviour_risk[sorted(behaviour_risk.columns)], use_container_width=True)
+    with col_c:
+        st.markdown("##### Students by CPI Stage")
+        st.bar_chart(pd.Series(totals['cpi_stages'], name='Students'), use_container_width=True)
+        st.markdown("##### Incidents by Area")
+        st.bar_chart(pd.Series(totals['by_area'], name='Incidents'), use_container_width=True)
+
+
+@timed_render
+def render_bulk_import_page():
+    """Renders the ADM bulk import page for historical incident spreadsheets (CSV/Parquet)."""
+    st.subheader("📥 Bulk Import of Historical Incidents")
+    st.markdown(
+        "Upload a CSV or Parquet export with one incident per row. Required columns: "
+        + ", ".join(f"`{col}`" for col in IMPORT_REQUIRED_COLUMNS)
+        + ". Optional columns use the same names as the incident log form (e.g. `consequence`, `effectiveness`, `outcome_assault`); "
+        "`day` and `session` are derived from `date` and `time`. An `id` column (as in an export) keeps each incident's id, "
+        "and rows whose id is already stored are rejected, so re-importing an export adds nothing twice."
+    )
+
+    uploaded_file = st.file_uploader("Incident spreadsheet", type=['csv', 'parquet'], key="bulk_import_file")
+    if uploaded_file is None:
+        return
+
+    if st.button("Validate and Import", type="primary", key="bulk_import_submit"):
+        try:
+            df_import = read_incident_file(uploaded_file)
+        except Exception as e:
+            st.error(f"Could not read '{uploaded_file.name}': {e}")
+            return
+
+        with st.spinner(f"Importing {len(df_import):,} rows..."):
+            imported_count, rejected = import_incident_frame(df_import, [s['id'] for s in st.session_state.students])
+
+        col_i1, col_i2 = st.columns(2)
+        col_i1.metric("Incidents Imported", f"{imported_count:,}")
+        col_i2.metric("Rows Rejected", f"{len(rejected):,}")
+
+        if not rejected.empty:
+            st.markdown("##### Rejected Rows")
+            st.dataframe(rejected[['row', 'reason'] + [c for c in rejected.columns if c not in ('row', 'reason')]], hide_index=True, use_container_width=True)
+            st.download_button(
+                "⬇ Download Rejected Rows (.csv)",
+                data=rejected.to_csv(index=False),
+                file_name=f"rejected_{uploaded_file.name.rsplit('.', 1)[0]}.csv",
+                mime="text/csv"
+            )
+
+
+@timed_render
 def render_staff_area():
     """Renders the main staff dashboard, handling all modes."""
     role = st.session_state.current_role
     student_id = st.session_state.selected_student_id
     mode = st.session_state.mode
     staff_header(role)
+    # Schedules the nightly cache warm-up in this server process
+    get_precompute_worker()
     
     # -----------------------------------------------------
     # MODE: Home/Student List (for JP, PY, SY)
@@ -1300,21 +1402,29 @@ def render_staff_area():
             st.warning("No students assigned to this area.")
             return
 
+        area_rollup = get_area_rollup(role)
         cols = st.columns(len(area_students))
         for idx, student in enumerate(area_students):
-            student_incidents = get_incidents_by_student(student['id'])
-            incident_count = len(student_incidents)
+            student_rollup = area_rollup.get(student['id'], {})
             
             with cols[idx]:
                 container = st.container(border=True)
                 container.markdown(f"**{student['name']}**")
                 container.write(f"Grade: **{student['grade']}**")
                 container.write(f"Teacher: **{student['teacher']}**")
-                container.write(f"Incidents: **{incident_count}**")
+                container.write(f"Incidents: **{student_rollup.get('incidents', 0)}** (ABCH: {student_rollup.get('abch', 0)})")
+                container.write(f"Last Incident: **{student_rollup.get('last_incident', 'N/A')}**")
+                student_summary = get_student_summary(student['id'], history_start(DEFAULT_HISTORY_WINDOW))
+                container.write(f"CPI Stage: **{student_summary.cpi_stage if student_summary else 'N/A'}**")
                 
                 if container.button("View Analysis & Log", key=f"view_analysis_{student['id']}", use_container_width=True):
                     navigate_to('staff_area', role=role, mode='analysis', student_id=student['id'])
 
+        render_watch_list([s['id'] for s in area_students])
+
+        with st.expander(f"🧮 Pivot Explorer ({role} Area)"):
+            render_pivot_explorer(role, key=f"area_pivot_{role}")
+
 
     # -----------------------------------------------------
     # MODE: Admin Dashboard (for ADM)
@@ -1322,8 +1432,8 @@ def render_staff_area():
     elif mode == 'home' and role == 'ADM':
         st.subheader("System Administration Dashboard")
         
-        total_incidents = len(st.session_state.incidents)
-        detailed_logs = len([i for i in st.session_state.incidents if i['is_abch_completed']])
+        total_incidents = get_incident_store().total_incidents
+        detailed_logs = get_incident_store().abch_count
         total_staff = len(st.session_state.staff)
         
         col_t1, col_t2, col_t3 = st.columns(3)
@@ -1333,15 +1443,132 @@ def render_staff_area():
         
         st.markdown("---")
         st.markdown("#### Top 5 Most Frequent Behaviours (All Students)")
-        df_all = pd.DataFrame(st.session_state.incidents)
+        school_behaviour_counts = get_school_behaviour_counts()
         
-        if not df_all.empty:
-            behaviour_counts = df_all['behaviour'].value_counts().head(5).reset_index()
+        if not school_behaviour_counts.empty:
+            behaviour_counts = school_behaviour_counts.head(5).reset_index()
             behaviour_counts.columns = ['Behaviour', 'Count']
             st.bar_chart(behaviour_counts, x='Behaviour', y='Count', use_container_width=True)
         else:
             st.info("No incident data available.")
 
+        st.markdown("#### 🚦 CPI Roster (All Students)")
+        cpi_roster = get_cpi_roster(history_start(DEFAULT_HISTORY_WINDOW))
+        if not cpi_roster.empty:
+            col_r1, col_r2 = st.columns([2, 3])
+            with col_r1:
+                st.caption("Students per CPI stage and area")
+                st.dataframe(pd.crosstab(cpi_roster['cpi_stage'], cpi_roster['area'], margins=True, margins_name='Total'), use_container_width=True)
+            with col_r2:
+                st.caption(f"Most severe first; staged on each student's most frequent behaviour and peak risk ({DEFAULT_HISTORY_WINDOW.lower()})")
+                st.dataframe(
+                    cpi_roster.drop(columns=['student_id']).rename(columns={
+                        'name': 'Student', 'area': 'Area', 'cpi_stage': 'CPI Stage', 'most_freq_behaviour': 'Most Frequent Behaviour',
+                        'peak_risk': 'Peak Risk', 'incidents': 'Incidents', 'abch': 'ABCH'
+                    }),
+                    hide_index=True,
+                    use_container_width=True
+                )
+        else:
+            st.info("No incident data available.")
+
+        render_watch_list([s['id'] for s in st.session_state.students])
+
+        st.markdown("#### School-wide Time and Day Heatmap")
+        get_analysis_view().render_heatmap(
+            get_incident_store().heatmap([s['id'] for s in st.session_state.students]),
+            DAYS,
+            get_heatmap_slot_labels(),
+            'School-wide Incidents by Time Slot and Weekday'
+        )
+
+        st.markdown("#### 🧮 Incident Pivot Explorer")
+        pivot_scope = st.selectbox("Scope", CUBE_PIVOT_SCOPES, key="pivot_scope")
+        render_pivot_explorer(pivot_scope, key="school_pivot")
+
+        with st.expander("🗄️ Archived Terms"):
+            store = get_incident_store()
+            st.caption(f"Terms before the current one are compacted to Parquet (zstd) in `{store.archive_dir}`; {len(store.incidents):,} active-term incidents are held in memory.")
+            if store.archive_files:
+                st.dataframe(pd.DataFrame([
+                    {'Term': partition, 'From': date.fromordinal(first_ordinal).isoformat(), 'To': date.fromordinal(last_ordinal).isoformat(),
+                     'Incidents': row_count, 'File': os.path.basename(path)}
+                    for path, partition, first_ordinal, last_ordinal, row_count, _ in store.archive_files
+                ]), hide_index=True, use_container_width=True)
+            if st.button("Archive Closed Terms Now", key="archive_closed_terms"):
+                archived = store.archive_closed_terms()
+                st.success(f"Archived: {', '.join(archived)}" if archived else "No closed terms left to archive.")
+
+        with st.expander("🚨 Escalation Alerts"):
+            store = get_incident_store()
+            alerts = store.recent_alerts()
+            if alerts:
+                student_names = {s['id']: s['name'] for s in st.session_state.students}
+                st.dataframe(pd.DataFrame([
+                    {'Student': student_names.get(student_id, student_id), 'Alert': message, 'Incident Date': date.fromordinal(date_ordinal).isoformat(),
+                     'Raised': created_at, 'Delivered': dispatched_at or f"Pending ({attempts} attempts)"}
+                    for student_id, rule, date_ordinal, message, created_at, attempts, dispatched_at in alerts
+                ]), hide_index=True, use_container_width=True)
+            else:
+                st.info("No escalation alerts raised yet.")
+            dispatcher = get_alert_dispatcher()
+            st.caption(f"Delivered to `{alert_log_path(store)}`; {dispatcher.dispatched} sent by this server process.")
+            if dispatcher.last_error:
+                st.warning(f"Last delivery failed: {dispatcher.last_error}")
+
+        with st.expander("🌙 Overnight Precompute (This Server Process)"):
+            precompute_worker = get_precompute_worker()
+            st.caption(
+                f"Runs daily at {PRECOMPUTE_HOUR:02d}:00: warms this process's caches and stores each student's BPP "
+                "report, skipping students with no new incidents. Archiving, text compression and stored reports are "
+                "left to the first server process to start its run. `python -m bst_core precompute` does the same from cron."
+            )
+            if precompute_worker.last_run:
+                st.json(precompute_worker.last_run)
+            if st.button("Run Precompute Now", key="run_precompute"):
+                precompute_worker.request()
+                st.info("Precompute started in the background.")
+
+        with st.expander("📈 Metrics (This Server Process)"):
+            exporting = start_metrics_export()
+            st.caption(
+                f"Prometheus text format, exported to {', '.join(f'`{target}`' for target in exporting)}." if exporting
+                else "Set BST_METRICS_PORT and/or BST_METRICS_FILE to export these to Prometheus."
+            )
+            st.code(get_metrics_registry().exposition(), language='text')
+
+        with st.expander("🧠 Session Memory (This Server Process)"):
+            st.caption(
+                f"Estimated from each session's state; the shared incident list and rosters are not counted per session. "
+                f"Sessions idle for {SESSION_DRAFT_TTL // 60} minutes lose unsaved drafts and values over "
+                f"{LARGE_VALUE_BYTES // 1024} KB."
+            )
+            now = datetime.now().timestamp()
+            usage = get_session_registry().usage(shared_state_ids())
+            st.dataframe(pd.DataFrame([
+                {
+                    'Session': session_id[:8],
+                    'Page': record.state['current_page'] if 'current_page' in record.state else None,
+                    'Idle (min)': round((now - record.last_active) / 60, 1),
+                    'Reruns': record.reruns,
+                    'Keys': len(by_key),
+                    'Estimated KB': round(total / 1024, 1),
+                    'Largest Keys': ', '.join(
+                        f"{key} ({size / 1024:.0f} KB)" for key, size in sorted(by_key.items(), key=lambda item: -item[1])[:3]
+                    ),
+                }
+                for session_id, record, total, by_key in usage
+            ]), hide_index=True, use_container_width=True)
+            st.metric("Total Session State", f"{sum(row[2] for row in usage) / 1024:,.0f} KB")
+
+        with st.expander("⏱️ Startup Timings (This Server Process)"):
+            st.caption("Measured on the first script run of this process; lazy imports are timed when first used.")
+            st.json(get_startup_timings())
+
+        with st.expander("⚙️ Derived-View Cache Statistics"):
+            st.caption(f"Store version: {get_incident_store().version}. Cached views are reused until the data they depend on changes.")
+            st.dataframe(pd.DataFrame(cache_stats()), hide_index=True, use_container_width=True)
+
 
     # -----------------------------------------------------
     # MODE: Student Analysis (for JP, PY, SY, ADM)
@@ -1362,10 +1589,22 @@ def render_staff_area():
 
             st.markdown("---")
             
+            history_window = st.selectbox(
+                "History Window", options=list(HISTORY_WINDOWS), index=list(HISTORY_WINDOWS).index(DEFAULT_HISTORY_WINDOW),
+                key=f"history_window_{student['id']}",
+                help="Archived terms are only loaded when the window reaches back into them."
+            )
+            since_ordinal = history_start(history_window)
+
             # Render the analysis charts
-            student_incidents = get_incidents_by_student(student_id)
-            df_student = pd.DataFrame(student_incidents)
-            render_data_analysis(student, df_student)
+            render_student_analysis(student, history_window)
+
+            st.markdown("---")
+            with st.expander("🧮 Pivot Explorer"):
+                render_pivot_explorer(student['id'], key=f"student_pivot_{student['id']}")
+
+            with st.expander("✏️ Edit a Logged Incident"):
+                render_incident_edit_form(student, role, since_ordinal)
             
 
     # -----------------------------------------------------
@@ -1394,6 +1633,12 @@ def render_staff_area():
             st.error("Student not found for ABCH follow-up.")
             navigate_to('landing')
             
+    # -----------------------------------------------------
+    # MODE: Group Incident Log (for JP, PY, SY, ADM)
+    # -----------------------------------------------------
+    elif mode == 'group_log':
+        render_group_log_form()
+
     # -----------------------------------------------------
     # MODE: Staff Management / Add Staff (ADM Only - Placeholder)
     # -----------------------------------------------------
@@ -1404,6 +1649,28 @@ def render_staff_area():
         st.dataframe(df_staff, hide_index=True)
         st.info("Staff management UI functionality to be implemented here.")
 
+        st.markdown("---")
+        st.markdown("#### 🧑‍🏫 Staff Workload and Injury Analytics")
+        staff_window = st.selectbox(
+            "History Window", options=list(HISTORY_WINDOWS), index=list(HISTORY_WINDOWS).index(DEFAULT_HISTORY_WINDOW),
+            key="staff_history_window"
+        )
+        staff_since = history_start(staff_window)
+        workload = get_staff_workload(staff_since)
+        if workload.empty:
+            st.info("No staff involvement recorded in this window.")
+        else:
+            st.caption("Incidents each staff member logged or attended. TRT and external SSO staff are listed under the name entered.")
+            st.dataframe(workload.drop(columns=['staff_id']), hide_index=True, use_container_width=True)
+
+            exposure = get_staff_weekly_exposure(staff_since)
+            exposure_metric = st.radio(
+                "Weekly measure", ['High Risk (3+)', 'Incidents', 'Staff Injuries'], horizontal=True, key="staff_exposure_metric"
+            )
+            weekly = exposure.pivot_table(index='Week', columns='Staff', values=exposure_metric, aggfunc='sum', fill_value=0)
+            st.markdown(f"##### {exposure_metric} per Week")
+            st.line_chart(weekly.resample('W-MON').sum(), use_container_width=True)
+
     elif mode == 'add_staff' and role == 'ADM':
         st.subheader("Add New Staff Account (Placeholder)")
         st.info("Form to add new staff members will go here.")
@@ -1412,42 +1679,84 @@ def render_staff_area():
     # MODE: All Incidents Log (ADM Only)
     # -----------------------------------------------------
     elif mode == 'all_incidents' and role == 'ADM':
-        st.subheader("📄 Full Incident Log (All Students)")
-        df_all = pd.DataFrame(st.session_state.incidents)
+        st.subheader("📄 Full Incident Log (All Students, Current Term)")
+        df_all = incidents_to_frame(st.session_state.incidents, text=False)
         
         # Merge student names into the log
         df_students = pd.DataFrame(MOCK_STUDENTS)[['id', 'name']]
         df_all = df_all.merge(df_students, left_on='student_id', right_on='id', how='left').drop(columns=['id_x', 'id_y'])
         
         # Select and reorder columns for display
-        display_columns = ['date', 'time', 'name', 'risk_level', 'behaviour', 'antecedent', 'consequence', 'is_abch_completed', 'logged_by', 'setting']
+        display_columns = ['date', 'time', 'name', 'risk_level', 'behaviour', 'antecedent', 'consequence', 'is_abch_completed', 'logged_by', 'setting', 'group_id']
+        df_all['group_id'] = df_all['group_id'].str.slice(0, 8)  # Short form is enough to spot rows of one group
         
         st.dataframe(
-            df_all[display_columns].rename(columns={'name': 'Student', 'is_abch_completed': 'ABCH'}), 
+            df_all[display_columns].rename(columns={'name': 'Student', 'is_abch_completed': 'ABCH', 'group_id': 'Group'}), 
             hide_index=True, 
             use_container_width=True
         )
 
+    # -----------------------------------------------------
+    # MODE: Bulk Import (ADM Only)
+    # -----------------------------------------------------
+    elif mode == 'bulk_import' and role == 'ADM':
+        render_bulk_import_page()
+
+    # -----------------------------------------------------
+    # MODE: Regional Rollup (ADM Only)
+    # -----------------------------------------------------
+    elif mode == 'regional' and role == 'ADM':
+        render_regional_rollup_page()
+
+    # -----------------------------------------------------
+    # MODE: Student Comparison (for JP, PY, SY, ADM)
+    # -----------------------------------------------------
+    elif mode == 'compare':
+        render_student_comparison_page(role)
+
 
 # --- Main App Execution ---
 def main():
     """The main function to drive the Streamlit application logic."""
+    configure_page()
+    init_session_state()
+    record_startup_timing('script_load_s', perf_counter() - _SCRIPT_STARTED)
     
-    # Main routing logic
-    if st.session_state.current_page == 'landing':
-        render_landing_page()
-    elif st.session_state.current_page == 'staff_area':
-        render_staff_area()
-    elif st.session_state.current_page == 'quick_log':
-        render_direct_log_form()
-    elif st.session_state.current_page == 'abch_follow_up':
-        # This is a specific follow-up mode, which is handled here
-        student = get_student_by_id(st.session_state.selected_student_id)
-        if student:
-            render_abch_follow_up_form(student)
-        else:
-            st.error("Cannot find student for ABCH follow-up.")
-            navigate_to('landing')
+    # Pick up incidents committed by other server processes since the last rerun
+    get_incident_store().refresh()
+    # Escalation alerts queued by saves are delivered in the background
+    get_alert_dispatcher()
+    start_metrics_export()
+    # Also drops the drafts of sessions left idle elsewhere, at most once a minute
+    if get_session_registry().touch(shared_state_ids()):
+        st.info(f"This page was idle for over {SESSION_DRAFT_TTL // 60} minutes, so its unsaved follow-up draft was cleared.")
+
+    page = st.session_state.current_page
+    RERUNS.inc(page, st.session_state.mode if page == 'staff_area' else '')
+    try:
+        # Main routing logic
+        if page == 'landing':
+            render_landing_page()
+            record_startup_timing('landing_page_interactive_s', perf_counter() - _SCRIPT_STARTED)
+            get_startup_timings().setdefault('landing_page_imported_pandas', 'pandas' in sys.modules)
+        elif page == 'staff_area':
+            render_staff_area()
+        elif page == 'quick_log':
+            render_direct_log_form()
+        elif page == 'group_log':
+            render_group_log_form()
+        elif page == 'group_abch_follow_up':
+            render_group_abch_follow_up_form()
+        elif page == 'abch_follow_up':
+            # This is a specific follow-up mode, which is handled here
+            student = get_student_by_id(st.session_state.selected_student_id)
+            if student:
+                render_abch_follow_up_form(student)
+            else:
+                st.error("Cannot find student for ABCH follow-up.")
+                navigate_to('landing')
+    finally:
+        RERUN_SECONDS.observe(perf_counter() - _SCRIPT_STARTED, page)
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
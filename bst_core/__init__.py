@@ -0,0 +1,75 @@
+"""
+Headless core of the Behaviour Support Toolkit: incident records, the shared incident store
+of each site, the cached analysis views, the risk forecast, bulk import and the cross-site
+rollups, with no Streamlit dependency.
+
+The Streamlit app (app.py) and the command line (python -m bst_core) are both built on it.
+"""
+from .sites import current_site, get_sites
+from .constants import MOCK_STAFF, MOCK_STUDENTS, get_student
+from .records import (
+    Incident,
+    complete_incident_data,
+    generate_mock_incidents,
+    get_session_from_time,
+    get_time_slot,
+    incidents_to_frame,
+)
+from .store import (
+    DEFAULT_HISTORY_WINDOW,
+    HISTORY_WINDOWS,
+    IncidentNotFound,
+    IncidentStore,
+    commit_incidents,
+    get_incident_store,
+    history_start,
+    update_incident,
+)
+from .forecast import compute_risk_forecast, get_forecast_worker
+from .precompute import get_precompute_worker, precompute
+from .rollup import materialize_site_rollup, regional_rollup
+from .views import (
+    StudentSummary,
+    determine_cpi_stage,
+    generate_bpp_report_content,
+    get_bpp_report,
+    get_cpi_roster,
+    get_student_summary,
+)
+from .importer import import_incident_frame, read_incident_file
+
+__all__ = [
+    'current_site',
+    'get_sites',
+    'MOCK_STAFF',
+    'MOCK_STUDENTS',
+    'get_student',
+    'Incident',
+    'complete_incident_data',
+    'generate_mock_incidents',
+    'get_session_from_time',
+    'get_time_slot',
+    'incidents_to_frame',
+    'DEFAULT_HISTORY_WINDOW',
+    'HISTORY_WINDOWS',
+    'IncidentNotFound',
+    'IncidentStore',
+    'commit_incidents',
+    'get_incident_store',
+    'history_start',
+    'update_incident',
+    'compute_risk_forecast',
+    'get_forecast_worker',
+    'get_precompute_worker',
+    'precompute',
+    'materialize_site_rollup',
+    'regional_rollup',
+    'StudentSummary',
+    'determine_cpi_stage',
+    'generate_bpp_report_content',
+    'get_bpp_report',
+    'get_cpi_roster',
+    'get_student_summary',
+    'import_incident_frame',
+    'read_incident_file',
+]
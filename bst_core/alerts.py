@@ -0,0 +1,112 @@
+"""Background dispatch of escalation alerts from the store's outbox to a notification sink."""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date, datetime
+
+from .util import process_wide
+from .constants import get_student
+from .store import get_incident_store
+
+logger = logging.getLogger(__name__)
+
+
+# --- Alert Dispatch ---
+# Tripped escalation rules are queued in the store's alert_outbox table (see bst_core.escalation),
+# so saving an incident never waits on a notification. A daemon thread leases pending alerts,
+# hands them to the sink and marks them dispatched; alerts a failed or crashed dispatcher had
+# leased are retried once the lease runs out. The sink here is a local JSON Lines file standing
+# in for e-mail or chat delivery.
+
+ALERT_POLL_INTERVAL = 5.0   # Seconds between the dispatcher's checks of the outbox
+ALERT_BATCH_SIZE = 50
+ALERT_LEASE_SECONDS = 60.0
+
+
+class JsonLinesAlertSink:
+    """Appends each alert as one JSON object per line to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def alert_log_path(store):
+    """The alert sink file: BST_ALERT_LOG, or <store>_alerts.jsonl beside the store."""
+    return os.environ.get('BST_ALERT_LOG', os.path.splitext(store.path)[0] + '_alerts.jsonl')
+
+def format_alert(row):
+    """The payload sent for one outbox row (as returned by IncidentStore.claim_alerts)."""
+    _, student_id, rule, date_ordinal, incident_id, value, message, created_at, attempts = row
+    student = get_student(student_id)
+    name = student['name'] if student else student_id
+    return {
+        'student_id': student_id,
+        'student': name,
+        'area': student['area'] if student else None,
+        'rule': rule,
+        'value': value,
+        'date': date.fromordinal(date_ordinal).isoformat(),
+        # Rows queued by older releases hold the raw 16 bytes
+        'incident_id': incident_id if isinstance(incident_id, str) else str(uuid.UUID(bytes=bytes(incident_id))),
+        'message': f"Escalation: {name}, {message}",
+        'created_at': created_at,
+        'attempt': attempts + 1,
+    }
+
+
+def deliver_pending_alerts(store, sink):
+    """Delivers every pending outbox alert to the sink in batches. Returns the number delivered."""
+    delivered = 0
+    while True:
+        rows = store.claim_alerts(ALERT_BATCH_SIZE, ALERT_LEASE_SECONDS)
+        if not rows:
+            return delivered
+        sink.send([format_alert(row) for row in rows])
+        store.mark_alerts_dispatched([row[0] for row in rows])
+        delivered += len(rows)
+
+
+class AlertDispatcher:
+    """Daemon thread delivering outbox alerts to a sink every ALERT_POLL_INTERVAL seconds, or sooner on request."""
+
+    def __init__(self, store, sink):
+        self.store = store
+        self.sink = sink
+        self.dispatched = 0
+        self.last_error = None
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='alert-dispatch', daemon=True)
+        self._thread.start()
+        # Woken as soon as the store queues an alert, so the poll interval only covers other processes
+        store.on_alerts = self.request
+
+    def request(self):
+        """Asks the dispatcher to check the outbox now; returns immediately."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.dispatched += deliver_pending_alerts(self.store, self.sink)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{datetime.now():%H:%M:%S} {e}"
+                logger.exception("Alert dispatch failed")
+            self._wake.wait(ALERT_POLL_INTERVAL)
+            self._wake.clear()
+
+
+@process_wide
+def get_alert_dispatcher():
+    """The process-wide alert dispatcher (started on first use, e.g. when an incident is saved)."""
+    store = get_incident_store()
+    return AlertDispatcher(store, JsonLinesAlertSink(alert_log_path(store)))
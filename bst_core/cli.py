@@ -0,0 +1,230 @@
+"""
+Command line for bulk jobs against the incident store, without Streamlit.
+
+Usage:
+    python -m bst_core [--store PATH] ingest incidents.jsonl
+    python -m bst_core import export.csv
+    python -m bst_core export incidents.parquet --since 2024-01-01
+    python -m bst_core reports --output reports/ --area JP --window "Current term"
+    python -m bst_core rebuild
+    python -m bst_core precompute        # e.g. from cron: 0 2 * * *
+    python -m bst_core alerts
+    python -m bst_core rollup --materialize
+    python -m bst_core bench
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from .util import pd
+from .constants import MOCK_STUDENTS
+from .records import incidents_to_frame
+from .store import DEFAULT_HISTORY_WINDOW, HISTORY_WINDOWS, get_incident_store, history_start
+from .importer import IMPORT_BATCH_SIZE, import_incident_frame, read_incident_file
+from .views import cache_stats, get_area_rollup, get_bpp_report, get_cpi_roster, get_incident_pivot, get_student_summary
+from .forecast import compute_risk_forecast
+from .precompute import precompute
+from .alerts import JsonLinesAlertSink, alert_log_path, deliver_pending_alerts
+from .rollup import materialize_site_rollup, regional_rollup
+from .sites import current_site
+
+EXPORT_FORMATS = ('csv', 'parquet', 'jsonl')
+
+
+def print_rejected(rejected, limit=10):
+    """Prints the first few rejected rows and their reasons to stderr."""
+    if rejected.empty:
+        return
+    print(f"{len(rejected):,} rows rejected, e.g.:", file=sys.stderr)
+    for row, reason in rejected[['row', 'reason']].head(limit).itertuples(index=False):
+        print(f"  row {row}: {reason}", file=sys.stderr)
+
+
+def cmd_ingest(args):
+    """Streams a JSON Lines file of incidents into the store, validated and committed in batches."""
+    imported, rejected = 0, []
+    with open(args.path, encoding='utf-8') as f:
+        for chunk in pd.read_json(f, lines=True, dtype=False, chunksize=IMPORT_BATCH_SIZE):
+            if 'other_staff' in chunk.columns:
+                # Lists in JSON, ';'-separated in spreadsheets: the importer reads the latter
+                chunk['other_staff'] = chunk['other_staff'].map(lambda s: ';'.join(s) if isinstance(s, list) else s)
+            count, chunk_rejected = import_incident_frame(chunk.astype(object).where(chunk.notna(), None))
+            imported += count
+            rejected.append(chunk_rejected)
+    print(f"Ingested {imported:,} incidents from {args.path}")
+    if rejected:
+        print_rejected(pd.concat(rejected, ignore_index=True))
+    return 0
+
+
+def cmd_import(args):
+    """Imports a CSV or Parquet spreadsheet export, as the Data Import page does."""
+    imported, rejected = import_incident_frame(read_incident_file(args.path))
+    print(f"Imported {imported:,} incidents from {args.path}")
+    print_rejected(rejected)
+    return 0
+
+
+def cmd_export(args):
+    """Writes every incident (active and archived terms) from --since on to CSV, Parquet or JSON Lines."""
+    store = get_incident_store()
+    since = date.fromisoformat(args.since).toordinal() if args.since else None
+    incidents = [i for student_id in sorted(store.counts_by_student) for i in store.student_incidents(student_id, since)]
+    frame = incidents_to_frame(incidents).sort_values(['date', 'time', 'student_id'], kind='stable')
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip('.').lower()
+    if fmt not in EXPORT_FORMATS:
+        print(f"Unknown export format '{fmt}' (use --format {'/'.join(EXPORT_FORMATS)})", file=sys.stderr)
+        return 2
+    if fmt == 'jsonl':
+        frame.to_json(args.path, orient='records', lines=True)
+    else:
+        # The same ';'-separated form the importer reads back
+        frame['other_staff'] = frame['other_staff'].map(';'.join)
+        if fmt == 'csv':
+            frame.to_csv(args.path, index=False)
+        else:
+            frame.to_parquet(args.path, index=False, compression='zstd')
+    print(f"Exported {len(frame):,} incidents to {args.path}")
+    return 0
+
+
+def cmd_reports(args):
+    """Writes a BPP report text file per student with incidents in the window."""
+    today = date.today()
+    os.makedirs(args.output, exist_ok=True)
+    written = 0
+    for student in MOCK_STUDENTS:
+        if args.area and student['area'] != args.area:
+            continue
+        report = get_bpp_report(student['id'], today, args.window)
+        if report is None:
+            continue
+        path = os.path.join(args.output, f"BPP_Report_{student['name'].replace(' ', '_')}_{today.isoformat()}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(report)
+        written += 1
+    print(f"Wrote {written} reports to {args.output}")
+    return 0
+
+
+def cmd_rebuild(args):
+    """Archives closed terms, then recomputes archived aggregates and the staff table from the incident rows."""
+    store = get_incident_store()
+    archived = store.archive_closed_terms()
+    files, staff_rows = store.rebuild_derived()
+    print(f"Archived {len(archived)} closed terms{': ' + ', '.join(archived) if archived else ''}")
+    print(f"Rebuilt aggregates of {files} archive files and {staff_rows:,} incident_staff rows")
+    return 0
+
+
+def cmd_precompute(args):
+    """Materializes today's BPP reports for students whose data changed (the nightly job, for cron)."""
+    stats = precompute(warm=False)
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def cmd_rollup(args):
+    """Prints the regional rollup merged from every site's stored rollup (BST_SITE selects this process's site)."""
+    if args.materialize:
+        materialize_site_rollup(get_incident_store(), current_site())
+    rollup = regional_rollup()
+    if args.json:
+        print(json.dumps(rollup, indent=2))
+        return 0
+    print(pd.DataFrame(rollup['sites']).to_string(index=False, na_rep='-', float_format='{:.0f}'.format))
+    totals = rollup['totals']
+    if totals:
+        print(f"\nRegion: {totals['incidents']:,} incidents, {totals['abch']:,} ABCH, "
+              f"{totals['escalating_students']} of {totals['students']} students at an escalation threshold")
+    return 0
+
+
+def cmd_alerts(args):
+    """Delivers pending escalation alerts to the alert log (for when no server process is running)."""
+    store = get_incident_store()
+    sink = JsonLinesAlertSink(args.output or alert_log_path(store))
+    delivered = deliver_pending_alerts(store, sink)
+    print(f"Delivered {delivered} alerts to {sink.path}")
+    return 0
+
+
+def cmd_bench(args):
+    """Times the main views cold and warm in this process (no Streamlit rerun overhead)."""
+    def timed(label, fn):
+        started = time.perf_counter()
+        fn()
+        print(f"  {label:<28} {(time.perf_counter() - started) * 1000:>9.1f} ms")
+
+    timed('open store', get_incident_store)
+    store = get_incident_store()
+    print(f"{store.total_incidents:,} incidents ({len(store.incidents):,} active, {len(store.archive_files)} archived terms)")
+    since = history_start(DEFAULT_HISTORY_WINDOW)
+    student_ids = [s['id'] for s in MOCK_STUDENTS]
+    for run in ('cold', 'warm'):
+        print(f"{run}:")
+        timed('student summaries', lambda: [get_student_summary(s, since) for s in student_ids])
+        timed('CPI roster', lambda: get_cpi_roster(since))
+        timed('area rollups', lambda: [get_area_rollup(area) for area in sorted({s['area'] for s in MOCK_STUDENTS})])
+        timed('school pivot', lambda: get_incident_pivot('behaviour', 'setting', 'School'))
+    timed('risk forecast', lambda: compute_risk_forecast(store, student_ids, date.today()))
+    if args.json:
+        print(json.dumps(cache_stats(), indent=2, default=str))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m bst_core', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--store', help="SQLite incident store (default: BST_STORE_PATH or incidents.db beside app.py)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help=cmd_ingest.__doc__)
+    ingest.add_argument('path', help="JSON Lines file, one incident object per line")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    import_ = commands.add_parser('import', help=cmd_import.__doc__)
+    import_.add_argument('path', help="CSV or Parquet file")
+    import_.set_defaults(handler=cmd_import)
+
+    export = commands.add_parser('export', help=cmd_export.__doc__)
+    export.add_argument('path')
+    export.add_argument('--format', choices=EXPORT_FORMATS, help="Default: from the file extension")
+    export.add_argument('--since', help="First date to export (YYYY-MM-DD); default all history")
+    export.set_defaults(handler=cmd_export)
+
+    reports = commands.add_parser('reports', help=cmd_reports.__doc__)
+    reports.add_argument('--output', default='reports', help="Directory to write the reports to")
+    reports.add_argument('--area', choices=sorted({s['area'] for s in MOCK_STUDENTS}))
+    reports.add_argument('--window', choices=list(HISTORY_WINDOWS), default=DEFAULT_HISTORY_WINDOW)
+    reports.set_defaults(handler=cmd_reports)
+
+    rebuild = commands.add_parser('rebuild', help=cmd_rebuild.__doc__)
+    rebuild.set_defaults(handler=cmd_rebuild)
+
+    precompute_ = commands.add_parser('precompute', help=cmd_precompute.__doc__)
+    precompute_.set_defaults(handler=cmd_precompute)
+
+    rollup = commands.add_parser('rollup', help=cmd_rollup.__doc__)
+    rollup.add_argument('--materialize', action='store_true', help="Rebuild this site's rollup first (the precompute also does)")
+    rollup.add_argument('--json', action='store_true', help="Print the sites and merged totals as JSON")
+    rollup.set_defaults(handler=cmd_rollup)
+
+    alerts = commands.add_parser('alerts', help=cmd_alerts.__doc__)
+    alerts.add_argument('--output', help="Alert log to append to (default: BST_ALERT_LOG or <store>_alerts.jsonl)")
+    alerts.set_defaults(handler=cmd_alerts)
+
+    bench = commands.add_parser('bench', help=cmd_bench.__doc__)
+    bench.add_argument('--json', action='store_true', help="Also print the view cache hit/miss counters")
+    bench.set_defaults(handler=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.store:
+        # Read when the store is first opened
+        os.environ['BST_STORE_PATH'] = args.store
+    return args.handler(args)
@@ -0,0 +1,62 @@
+"""School data and the vocabularies of the incident form fields."""
+from .sites import current_site, site_roster
+
+
+# --- Behaviour Profile Plan and Data Constants ---
+
+MOCK_STAFF = [
+    {'id': 's1', 'name': 'Emily Jones (JP)', 'role': 'JP', 'active': True, 'special': False},
+    {'id': 's2', 'name': 'Daniel Lee (PY)', 'role': 'PY', 'active': True, 'special': False},
+    {'id': 's3', 'name': 'Sarah Chen (SY)', 'role': 'SY', 'active': True, 'special': False},
+    {'id': 's4', 'name': 'Admin User (ADM)', 'role': 'ADM', 'active': True, 'special': False},
+    # Special roles that require manual name input
+    {'id': 's_trt', 'name': 'TRT', 'role': 'TRT', 'active': True, 'special': True},
+    {'id': 's_sso', 'name': 'External SSO', 'role': 'SSO', 'active': True, 'special': True},
+]
+
+MOCK_STUDENTS = [
+    {'id': 'stu_jp_high', 'name': 'Marcus A.', 'area': 'JP', 'grade': 'R', 'teacher': 'Smith', 'edid': 'JP001A', 'dob': '2019-03-15'},
+    {'id': 'stu_jp_low', 'name': 'Chloe T.', 'area': 'JP', 'grade': 'Y2', 'teacher': 'Davids', 'edid': 'JP002T', 'dob': '2017-11-20'},
+    {'id': 'stu_py_high', 'name': 'Noah K.', 'area': 'PY', 'grade': 'Y5', 'teacher': 'Williams', 'edid': 'PY003K', 'dob': '2014-07-01'},
+    {'id': 'stu_py_low', 'name': 'Leah S.', 'area': 'PY', 'grade': 'Y6', 'teacher': 'Brown', 'edid': 'PY004S', 'dob': '2013-09-10'},
+    {'id': 'stu_sy_high', 'name': 'Ethan B.', 'area': 'SY', 'grade': 'Y9', 'teacher': 'Green', 'edid': 'SY005B', 'dob': '2010-01-25'},
+    {'id': 'stu_sy_low', 'name': 'Mia P.', 'area': 'SY', 'grade': 'Y10', 'teacher': 'Clark', 'edid': 'SY006P', 'dob': '2009-04-05'},
+]
+
+# A site with its own roster files (see bst_core.sites) replaces the mock rosters above
+SITE = current_site()
+MOCK_STAFF = site_roster(SITE, 'staff', MOCK_STAFF)
+MOCK_STUDENTS = site_roster(SITE, 'students', MOCK_STUDENTS)
+
+def get_student(student_id):
+    """The student record for an id, or None (the headless counterpart of the app's session roster lookup)."""
+    return next((s for s in MOCK_STUDENTS if s['id'] == student_id), None)
+
+BEHAVIORS_BPP = ['Verbal Refusal', 'Elopement', 'Property Destruction', 'Aggression (Peer)', 'Self-Injurious Behaviour', 'Out of Seat', 'Non-Compliance', 'Physical Aggression (Staff)']
+WINDOW_OF_TOLERANCE = ['Hypo-aroused', 'Hyper-aroused', 'Coping'] 
+SETTINGS = ['Classroom', 'Gate', 'Yard', 'Playground', 'Toilets', 'Admin', 'Spill out', 'Kitchen', 'Library', 'Excursion', 'Swimming', 'Bus/Van', 'Specialist Lesson']
+SUPPORT_TYPES = ['Unstructured', 'Small Group', 'Independent', 'Large Group', 'Peer', '1:1']
+ANTECEDENTS_NEW = ['Peer Interaction', 'Tired', 'Hungry', 'Transition', 'Routine Change', 'Environmental Disturbance', 'Limit Setting', 'Group Work', 'Adult Demand', 'No Medication', 'Task Demand', 'Other']
+FUNCTIONAL_HYPOTHESIS = ['Seek/Get Something', 'Avoid/Escape Something', 'Self Stimulation']
+FUNCTION_PRIMARY = ['Sensory', 'Social', 'Tangible/Activity']
+FUNCTION_SECONDARY = ['Peer', 'Adult', '-'] 
+RISK_LEVELS = [1, 2, 3, 4, 5] # 1=Low, 5=Extreme
+
+CONSEQUENCES = ['Redirection/Prompt', 'Time-Out (Brief)', 'Ignored (Planned)', 'Preferred Activity Access']
+INTERVENTION_EFFECTIVENESS = ['Highly Effective', 'Moderately Effective', 'Ineffective', 'Worsened Behaviour']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+SESSIONS = ['Morning (8:30-11:00)', 'Middle (11:01-1:00)', 'Afternoon (1:01-3:00)', 'Outside Hours']
+OUTCOME_FIELDS = [
+    'outcome_send_home', 'outcome_leave_area', 'outcome_assault', 'outcome_property_damage',
+    'outcome_staff_injury', 'outcome_sapol_callout', 'outcome_ambulance',
+]
+OUTCOME_LABELS = {
+    'outcome_send_home': "Sent home",
+    'outcome_leave_area': "Required student to leave area (Exclusion)",
+    'outcome_assault': "Physical assault (Student to Staff/Peer)",
+    'outcome_property_damage': "Property damage (Significant)",
+    'outcome_staff_injury': "Staff Injury (Required first aid/medical)",
+    'outcome_sapol_callout': "SAPOL Callout",
+    'outcome_ambulance': "Ambulance Callout",
+}
+HOW_TO_RESPOND_DEFAULT = "No detailed plan required or specified."
@@ -0,0 +1,145 @@
+"""Incremental per-student escalation detection over the incident stream."""
+import copy
+
+from .constants import OUTCOME_FIELDS
+
+
+# --- Escalation Detection ---
+# Every record the store applies (local commits and rows pulled from other processes alike)
+# updates its student's rolling windows in amortized O(1): counts per day over the last 7 and
+# 28 days up to the newest incident seen, and an exponentially weighted moving average of risk.
+# A rule trips when this record pushes its metric from below the threshold to at or above it.
+# The process writing a record previews the rules it trips and queues them in the store's alert
+# outbox in the same transaction (at most one per student, rule and day); processes that later
+# pull the record only update their windows. Terms are not archived until they are older than
+# the longest window, so every process's windows are built from active records alone.
+
+ESCALATION_HIGH_RISK = 4
+ESCALATION_WINDOW_DAYS = 28          # The longest rolling window
+ESCALATION_EWMA_ALPHA = 0.3          # Weight of the newest incident in the risk EWMA
+ESCALATION_EWMA_MIN_INCIDENTS = 3    # The EWMA rule needs this many incidents first
+ESCALATION_ALERT_MAX_AGE_DAYS = 2    # Back-dated records (imports, late logs) update the windows silently
+ESCALATION_ASSAULT_BIT = OUTCOME_FIELDS.index('outcome_assault')
+ESCALATION_STAFF_INJURY_BIT = OUTCOME_FIELDS.index('outcome_staff_injury')
+
+# metric: (threshold, alert message)
+ESCALATION_RULES = {
+    'high_risk_7d': (3, "{value} risk 4+ incident(s) in the last 7 days"),
+    'high_risk_28d': (6, "{value} risk 4+ incident(s) in the last 28 days"),
+    'risk_ewma': (3.5, "average risk trending up to {value:.1f}"),
+    'assault_28d': (2, "{value} incident(s) with assault in the last 28 days"),
+    'staff_injury_28d': (1, "{value} incident(s) with staff injury in the last 28 days"),
+}
+
+
+class RollingDayCounts:
+    """Event count over the `days` days ending at the newest day seen, kept as day buckets plus a running total."""
+    __slots__ = ('days', 'newest', 'total', 'buckets')
+
+    def __init__(self, days):
+        self.days = days
+        self.newest = 0
+        self.total = 0
+        self.buckets = {}
+
+    def add(self, ordinal, sign=1):
+        """Adds (sign=1) or retracts (sign=-1) one event on a day; events before the window are ignored."""
+        if ordinal > self.newest:
+            self.advance(ordinal)
+        if ordinal > self.newest - self.days:
+            self.buckets[ordinal] = self.buckets.get(ordinal, 0) + sign
+            self.total += sign
+
+    def advance(self, ordinal):
+        """Moves the window end forward, dropping the buckets that fall out of it."""
+        if ordinal - self.newest >= self.days:
+            self.buckets.clear()
+            self.total = 0
+        else:
+            for day in range(self.newest - self.days + 1, ordinal - self.days + 1):
+                self.total -= self.buckets.pop(day, 0)
+        self.newest = ordinal
+
+
+class StudentEscalation:
+    """One student's rolling escalation metrics."""
+    __slots__ = ('high_risk_7d', 'high_risk_28d', 'assault_28d', 'staff_injury_28d', 'ewma', 'incidents')
+
+    def __init__(self):
+        self.high_risk_7d = RollingDayCounts(7)
+        self.high_risk_28d = RollingDayCounts(ESCALATION_WINDOW_DAYS)
+        self.assault_28d = RollingDayCounts(ESCALATION_WINDOW_DAYS)
+        self.staff_injury_28d = RollingDayCounts(ESCALATION_WINDOW_DAYS)
+        self.ewma = 0.0
+        self.incidents = 0
+
+    def count(self, incident, sign):
+        ordinal = incident.date_ordinal
+        high_risk = incident.risk_level >= ESCALATION_HIGH_RISK
+        for window, flagged in (
+            (self.high_risk_7d, high_risk),
+            (self.high_risk_28d, high_risk),
+            (self.assault_28d, incident.outcomes >> ESCALATION_ASSAULT_BIT & 1),
+            (self.staff_injury_28d, incident.outcomes >> ESCALATION_STAFF_INJURY_BIT & 1),
+        ):
+            if flagged:
+                window.add(ordinal, sign)
+
+    def metrics(self):
+        return {
+            'high_risk_7d': self.high_risk_7d.total,
+            'high_risk_28d': self.high_risk_28d.total,
+            'assault_28d': self.assault_28d.total,
+            'staff_injury_28d': self.staff_injury_28d.total,
+            'risk_ewma': self.ewma if self.incidents >= ESCALATION_EWMA_MIN_INCIDENTS else 0.0,
+        }
+
+
+class EscalationDetector:
+    """Per-student escalation metrics, updated as the store applies records; returns the rules each record trips."""
+
+    def __init__(self):
+        self.students = {}
+
+    def observe(self, incident, previous=None, today_ordinal=None):
+        """
+        Applies a new record, or an update of `previous` (a copy of the record before the
+        update). Returns [(rule, value, message)] for the rules it trips, or [] for records
+        older than ESCALATION_ALERT_MAX_AGE_DAYS before today_ordinal (None: never alert).
+        """
+        state = self.students.get(incident.student_id)
+        if state is None:
+            state = self.students[incident.student_id] = StudentEscalation()
+        before = state.metrics()
+        if previous is None:
+            if state.incidents:
+                state.ewma += ESCALATION_EWMA_ALPHA * (incident.risk_level - state.ewma)
+            else:
+                state.ewma = float(incident.risk_level)
+            state.incidents += 1
+        else:
+            state.count(previous, -1)
+        state.count(incident, 1)
+        if today_ordinal is None or incident.date_ordinal < today_ordinal - ESCALATION_ALERT_MAX_AGE_DAYS:
+            return []
+        after = state.metrics()
+        tripped = []
+        for rule, (threshold, message) in ESCALATION_RULES.items():
+            if before[rule] < threshold <= after[rule]:
+                tripped.append((rule, after[rule], message.format(value=after[rule])))
+        return tripped
+
+    def preview(self, changes, today_ordinal):
+        """
+        The rules that applying (record, previous or None) changes in order would trip, as
+        [(record, rule, value, message)], leaving every student's metrics unchanged.
+        """
+        trial = EscalationDetector()
+        trial.students = {
+            student_id: copy.deepcopy(self.students[student_id])
+            for student_id in {incident.student_id for incident, _ in changes} if student_id in self.students
+        }
+        return [
+            (incident, *rule) for incident, previous in changes
+            for rule in trial.observe(incident, previous, today_ordinal)
+        ]
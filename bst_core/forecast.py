@@ -0,0 +1,117 @@
+"""Recency-weighted per-slot risk forecasts, recomputed by a background worker."""
+import logging
+import threading
+from datetime import date, datetime
+from time import perf_counter
+
+from .util import np, process_wide
+from .constants import DAYS, MOCK_STUDENTS
+from .indexes import HEATMAP_CELLS, HEATMAP_SLOTS, heatmap_cell
+from .store import get_incident_store
+
+logger = logging.getLogger(__name__)
+
+
+# --- Risk Forecast ---
+# For every student and weekday × heatmap slot, the expected number of incidents next week and
+# the probability of at least one risk 4+ incident. Counts over the last FORECAST_WINDOW_DAYS
+# are weighted by recency (halving every FORECAST_HALF_LIFE_DAYS), shrunk towards the
+# school-wide slot rate and the student's own risk 4+ share, and treated as Poisson rates.
+# A daemon thread recomputes the forecast for all students at once whenever the store changes,
+# so pages only read the latest result.
+
+FORECAST_WINDOW_DAYS = 182
+FORECAST_HALF_LIFE_DAYS = 28
+FORECAST_PRIOR_WEEKS = 2.0      # Weight of the school-wide slot rate, in weeks of observation
+FORECAST_PRIOR_INCIDENTS = 2.0  # Weight of the student's overall risk 4+ share, in incidents
+FORECAST_HIGH_RISK = 4
+FORECAST_INTERVAL = 30.0        # Seconds between the worker's checks for new data
+WATCH_LIST_THRESHOLD = 0.05     # Minimum probability of a risk 4+ incident for a slot to be listed
+WATCH_LIST_SIZE = 10
+SCHOOL_DAY_MINUTES = (8 * 60 + 30, 15 * 60)  # Slots starting in this range appear on the watch list
+
+
+class RiskForecast:
+    """One forecast run: per-student (weekday × slot) expected incidents and risk 4+ probabilities."""
+    __slots__ = ('version', 'today', 'computed_at', 'student_index', 'expected', 'p_high_risk')
+
+    def __init__(self, version, today, student_ids, expected, p_high_risk):
+        self.version = version
+        self.today = today
+        self.computed_at = datetime.now()
+        self.student_index = {student_id: n for n, student_id in enumerate(student_ids)}
+        self.expected = expected
+        self.p_high_risk = p_high_risk
+
+
+def compute_risk_forecast(store, student_ids, today):
+    """Forecasts every student at once from the recency-weighted weekday × slot counts of their recent incidents."""
+    version = store.version
+    since = today.toordinal() - FORECAST_WINDOW_DAYS
+    rows, cells, ages, high_risk = [], [], [], []
+    for row, student_id in enumerate(student_ids):
+        for incident in store.student_incidents(student_id, since):
+            cell = heatmap_cell(incident)
+            if cell is None or incident.date_ordinal > today.toordinal():
+                continue
+            rows.append(row)
+            cells.append(cell)
+            ages.append(today.toordinal() - incident.date_ordinal)
+            high_risk.append(incident.risk_level >= FORECAST_HIGH_RISK)
+
+    n_students = len(student_ids)
+    weights = 0.5 ** (np.asarray(ages, dtype=np.float64) / FORECAST_HALF_LIFE_DAYS)
+    flat = np.asarray(rows, dtype=np.int64) * HEATMAP_CELLS + np.asarray(cells, dtype=np.int64)
+    counts = np.bincount(flat, weights, minlength=n_students * HEATMAP_CELLS).reshape(n_students, HEATMAP_CELLS)
+    high = np.bincount(flat, weights * np.asarray(high_risk, dtype=np.float64),
+                       minlength=n_students * HEATMAP_CELLS).reshape(n_students, HEATMAP_CELLS)
+
+    # Weighted number of times each weekday (so each slot) occurred in the window
+    exposure = (0.5 ** (np.arange(FORECAST_WINDOW_DAYS) / FORECAST_HALF_LIFE_DAYS)).sum() / 7
+    school_rate = counts.mean(axis=0) / exposure
+    expected = (counts + FORECAST_PRIOR_WEEKS * school_rate) / (exposure + FORECAST_PRIOR_WEEKS)
+
+    school_share = high.sum() / counts.sum() if counts.sum() else 0.0
+    student_share = (high.sum(axis=1) + FORECAST_PRIOR_INCIDENTS * school_share) / (counts.sum(axis=1) + FORECAST_PRIOR_INCIDENTS)
+    slot_share = (high + FORECAST_PRIOR_INCIDENTS * student_share[:, None]) / (counts + FORECAST_PRIOR_INCIDENTS)
+    p_high_risk = 1 - np.exp(-expected * slot_share)
+
+    shape = (n_students, len(DAYS), HEATMAP_SLOTS)
+    return RiskForecast(version, today, student_ids, expected.reshape(shape), p_high_risk.reshape(shape))
+
+
+class ForecastWorker:
+    """Daemon thread keeping `forecast` current: recomputed whenever the store version or the date changes."""
+
+    def __init__(self, store, student_ids):
+        self.store = store
+        self.student_ids = student_ids
+        self.forecast = None  # Replaced whole, so readers never see a half-built forecast
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='risk-forecast', daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Asks the worker to check for new data now rather than at its next interval."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.store.refresh()
+                today = date.today()
+                forecast = self.forecast
+                if forecast is None or forecast.version != self.store.version or forecast.today != today:
+                    started = perf_counter()
+                    self.forecast = compute_risk_forecast(self.store, self.student_ids, today)
+                    logger.info("Risk forecast for %d students computed in %.3fs", len(self.student_ids), perf_counter() - started)
+            except Exception:
+                logger.exception("Risk forecast failed")
+            self._wake.wait(FORECAST_INTERVAL)
+            self._wake.clear()
+
+
+@process_wide
+def get_forecast_worker():
+    """The process-wide forecast worker (started on first use, e.g. from the staff pages)."""
+    return ForecastWorker(get_incident_store(), [s['id'] for s in MOCK_STUDENTS])
@@ -0,0 +1,215 @@
+"""Validation and conversion of spreadsheet exports for bulk incident import."""
+import uuid
+
+from .util import np, pd
+from .constants import (
+    ANTECEDENTS_NEW,
+    BEHAVIORS_BPP,
+    CONSEQUENCES,
+    FUNCTIONAL_HYPOTHESIS,
+    FUNCTION_PRIMARY,
+    FUNCTION_SECONDARY,
+    HOW_TO_RESPOND_DEFAULT,
+    INTERVENTION_EFFECTIVENESS,
+    MOCK_STUDENTS,
+    OUTCOME_FIELDS,
+    RISK_LEVELS,
+    SETTINGS,
+    SUPPORT_TYPES,
+    WINDOW_OF_TOLERANCE,
+)
+from .records import (
+    CODED_FIELDS,
+    DATE_ORDINAL_EPOCH,
+    INCIDENT_VOCABULARIES,
+    Incident,
+    _intern,
+    get_sessions_from_minutes,
+    pack_text,
+)
+from .store import commit_incidents, get_incident_store
+
+
+# --- Bulk Import of Historical Incidents ---
+
+IMPORT_BATCH_SIZE = 50000
+IMPORT_REQUIRED_COLUMNS = ['student_id', 'date', 'time', 'behaviour', 'setting', 'antecedent', 'risk_level']
+IMPORT_VOCABULARIES = {
+    'behaviour': BEHAVIORS_BPP,
+    'window_of_tolerance': WINDOW_OF_TOLERANCE,
+    'setting': SETTINGS,
+    'support_type': SUPPORT_TYPES,
+    'antecedent': ANTECEDENTS_NEW,
+    'func_hypothesis': FUNCTIONAL_HYPOTHESIS,
+    'func_primary': FUNCTION_PRIMARY,
+    'func_secondary': FUNCTION_SECONDARY,
+    'risk_level': RISK_LEVELS,
+    'consequence': CONSEQUENCES,
+    'effectiveness': INTERVENTION_EFFECTIVENESS,
+}
+TRUE_STRINGS = ['true', 't', 'yes', 'y', '1']
+
+
+def read_incident_file(uploaded_file):
+    """Reads a CSV or Parquet spreadsheet export (an uploaded file or a path) into a DataFrame."""
+    if str(getattr(uploaded_file, 'name', uploaded_file)).lower().endswith('.parquet'):
+        # Parquet support requires pyarrow (see requirements.txt)
+        return pd.read_parquet(uploaded_file)
+    return pd.read_csv(uploaded_file, dtype=str, keep_default_na=False, na_values=[''])
+
+def _parse_uuid_column(column):
+    """16-byte uids of a column of UUID strings: None for blank cells, False for cells that are not UUIDs."""
+    def parse(value):
+        if value is None or pd.isna(value) or str(value).strip() == '':
+            return None
+        try:
+            return uuid.UUID(str(value).strip()).bytes
+        except ValueError:
+            return False
+    return column.astype(object).map(parse)
+
+def _parse_bool_column(column):
+    """Converts a column of spreadsheet booleans ('TRUE', 'yes', 1, ...) to a bool Series."""
+    if column.dtype == bool:
+        return column
+    return column.astype('string').str.strip().str.lower().isin(TRUE_STRINGS).fillna(False).astype(bool)
+
+def validate_incident_frame(df, known_student_ids):
+    """
+    Validates a whole import frame column-by-column against the app vocabularies.
+    
+    Returns (valid_df, rejected_df). The valid frame is normalised (dates, times, risk,
+    derived day/session); the rejected frame keeps the original values plus the source
+    row number and the reason(s) each row was rejected.
+    """
+    df = df.reset_index(drop=True)
+    reasons = pd.Series('', index=df.index, dtype=object)
+
+    def reject(mask, message):
+        nonlocal reasons
+        reasons = reasons.where(~mask, reasons + message + '; ')
+
+    missing_columns = [col for col in IMPORT_REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        rejected = df.copy()
+        rejected['row'] = rejected.index + 2
+        rejected['reason'] = f"Missing required column(s): {', '.join(missing_columns)}"
+        return df.iloc[0:0], rejected
+
+    # 1. Required fields must be present
+    for col in IMPORT_REQUIRED_COLUMNS:
+        reject(df[col].isna() | (df[col].astype('string').str.strip() == ''), f"missing {col}")
+
+    # 2. Student must exist
+    reject(df['student_id'].notna() & ~df['student_id'].isin(known_student_ids), "unknown student_id")
+
+    # 3. Dates and times (vectorized parsing)
+    if pd.api.types.is_datetime64_any_dtype(df['date']):
+        dates = df['date']
+    else:
+        dates = pd.to_datetime(df['date'].astype('string').str.strip(), format='%Y-%m-%d', errors='coerce')
+    reject(df['date'].notna() & dates.isna(), "date not in YYYY-MM-DD format")
+
+    times = pd.to_datetime(df['time'].astype('string').str.strip().str.slice(0, 5), format='%H:%M', errors='coerce')
+    reject(df['time'].notna() & times.isna(), "time not in HH:MM format")
+
+    # 4. Risk level and vocabulary columns
+    risk = pd.to_numeric(df['risk_level'], errors='coerce')
+    for col, vocabulary in IMPORT_VOCABULARIES.items():
+        if col not in df.columns:
+            continue
+        values = risk if col == 'risk_level' else df[col]
+        reject(df[col].notna() & ~values.isin(vocabulary), f"{col} not in vocabulary")
+
+    # 5. Duplicated rows within the file
+    reject(df.duplicated(subset=['student_id', 'date', 'time', 'behaviour'], keep='first'), "duplicate of an earlier row")
+
+    # 6. Incident ids (e.g. re-importing an export) must be new; rows without one get a fresh id
+    uids = _parse_uuid_column(df['id']) if 'id' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    given = uids.map(lambda uid: isinstance(uid, bytes))
+    reject(uids.map(lambda uid: uid is False), "id is not a UUID")
+    reject(given & uids.duplicated(keep='first'), "id repeated in the file")
+    if given.any():
+        stored = get_incident_store().existing_ids(uids[given].tolist())
+        reject(uids.isin(stored) & given, "id already in the store")
+    group_ids = _parse_uuid_column(df['group_id']) if 'group_id' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    reject(group_ids.map(lambda uid: uid is False), "group_id is not a UUID")
+
+    is_rejected = reasons != ''
+    rejected = df[is_rejected].copy()
+    rejected['row'] = rejected.index + 2  # Header is line 1 in the source spreadsheet
+    rejected['reason'] = reasons[is_rejected].str.rstrip('; ')
+
+    valid = df[~is_rejected].copy()
+    valid_dates = dates[~is_rejected]
+    valid_times = times[~is_rejected]
+    valid['date'] = valid_dates.dt.strftime('%Y-%m-%d')
+    valid['time'] = valid_times.dt.strftime('%H:%M')
+    valid['day'] = valid_dates.dt.day_name()
+    valid['session'] = get_sessions_from_minutes((valid_times.dt.hour * 60 + valid_times.dt.minute).to_numpy())
+    valid['risk_level'] = risk[~is_rejected].astype(int)
+    valid['uid'] = uids[~is_rejected]
+    valid['group_uid'] = group_ids[~is_rejected]
+    return valid, rejected
+
+def encode_column(vocabulary, values):
+    """Vectorized Vocabulary.encode for a whole column (missing values map to the None code)."""
+    positions, uniques = pd.factorize(pd.Series(values, dtype=object))
+    # factorize marks missing values with -1, which picks the trailing None code below
+    table = np.array([vocabulary.encode(u) for u in uniques] + [0], dtype=np.int64)
+    return table[positions]
+
+def build_incident_records(valid_df):
+    """Fills defaults for optional columns and converts a validated frame into Incident records."""
+    n = len(valid_df)
+
+    def optional_column(col, default):
+        if col not in valid_df.columns:
+            return [default] * n
+        return valid_df[col].astype(object).where(valid_df[col].notna(), default).tolist()
+
+    dates = pd.to_datetime(valid_df['date'], format='%Y-%m-%d').to_numpy().astype('datetime64[D]')
+    ordinals = (dates.astype(np.int64) + DATE_ORDINAL_EPOCH).tolist()
+    minutes = (valid_df['time'].str.slice(0, 2).astype(int) * 60 + valid_df['time'].str.slice(3, 5).astype(int)).tolist()
+    codes = zip(*[
+        encode_column(INCIDENT_VOCABULARIES[field], valid_df[field]).tolist() if field in valid_df.columns else [0] * n
+        for field in CODED_FIELDS
+    ])
+
+    outcome_masks = np.zeros(n, dtype=np.int64)
+    for bit, col in enumerate(OUTCOME_FIELDS):
+        if col in valid_df.columns:
+            outcome_masks |= _parse_bool_column(valid_df[col]).to_numpy().astype(np.int64) << bit
+
+    if 'other_staff' in valid_df.columns:
+        # Spreadsheet cells hold other staff as 's2;s_trt:Jane Doe'
+        split_staff = valid_df['other_staff'].fillna('').astype(str).str.split(';')
+        other_staff = [tuple(_intern(s.strip()) for s in staff if s.strip()) for staff in split_staff]
+    else:
+        other_staff = [()] * n
+
+    is_abch = _parse_bool_column(valid_df['is_abch_completed']).tolist() if 'is_abch_completed' in valid_df.columns else [False] * n
+
+    return [
+        Incident(
+            uid or uuid.uuid4().bytes, _intern(student_id), ordinal, minute, code_row, risk, outcomes, abch,
+            _intern(logged_by), staff, pack_text(context), pack_text(notes), pack_text(how_to_respond), group_uid
+        )
+        for uid, group_uid, student_id, ordinal, minute, code_row, risk, outcomes, abch, logged_by, staff, context, notes, how_to_respond in zip(
+            optional_column('uid', None), optional_column('group_uid', None),
+            valid_df['student_id'].tolist(), ordinals, minutes, codes, valid_df['risk_level'].tolist(),
+            outcome_masks.tolist(), is_abch, optional_column('logged_by', 'import'), other_staff,
+            optional_column('context', "Basic log captured. No detailed context entered."),
+            optional_column('notes', None), optional_column('how_to_respond', HOW_TO_RESPOND_DEFAULT)
+        )
+    ]
+
+def import_incident_frame(df, known_student_ids=None):
+    """Validates, converts and commits an import frame in large batches. Returns (imported_count, rejected_df)."""
+    if known_student_ids is None:
+        known_student_ids = [s['id'] for s in MOCK_STUDENTS]
+    valid, rejected = validate_incident_frame(df, known_student_ids)
+    records = build_incident_records(valid)
+    for start in range(0, len(records), IMPORT_BATCH_SIZE):
+        commit_incidents(records[start:start + IMPORT_BATCH_SIZE])
+    return len(records), rejected
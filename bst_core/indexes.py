@@ -0,0 +1,189 @@
+"""Per-incident index keys maintained by the store: heatmap cells, count-cube cells and similarity features."""
+import os
+from datetime import date
+
+from .util import np, pq
+from .constants import DAYS, HOW_TO_RESPOND_DEFAULT, MOCK_STUDENTS, SESSIONS
+from .records import INCIDENT_VOCABULARIES, WEEKDAYS
+
+
+# --- Day × Time-Slot Heatmaps ---
+# Each student's heatmap is a fixed weekday × slot integer matrix. The store records the flat
+# cell index of every incident it applies and folds them into the matrix with np.bincount the
+# next time that student's heatmap is read, so commits stay cheap and numpy is only loaded
+# when a heatmap is shown. Area and school heatmaps are sums of student matrices.
+
+HEATMAP_SLOT_MINUTES = int(os.environ.get('BST_HEATMAP_SLOT_MINUTES', 30))  # Must divide 1440
+HEATMAP_SLOTS = 24 * 60 // HEATMAP_SLOT_MINUTES
+HEATMAP_CELLS = len(DAYS) * HEATMAP_SLOTS
+
+
+def heatmap_cell(incident):
+    """Flat weekday × slot cell index of an incident, or None for weekend incidents."""
+    weekday = (incident.date_ordinal - 1) % 7
+    if weekday >= len(DAYS):
+        return None
+    return weekday * HEATMAP_SLOTS + incident.minute // HEATMAP_SLOT_MINUTES
+
+def get_heatmap_slot_labels():
+    """'HH:MM' start time of each heatmap slot column."""
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, 24 * 60, HEATMAP_SLOT_MINUTES)]
+
+
+# --- Incident Count Cube ---
+# Incident counts over the categorical dimensions below, kept per student as a sparse mapping
+# from a cell key (the incident's code on every dimension) to a count. The store adjusts it as
+# records are applied, so a 2-D pivot for a student, an area or the school is one pass over the
+# occupied cells in scope rather than a groupby over the incidents.
+
+CUBE_DIMENSIONS = {
+    'behaviour': 'Behaviour',
+    'setting': 'Setting',
+    'antecedent': 'Antecedent',
+    'session': 'Session',
+    'day': 'Day',
+    'risk_level': 'Risk Level',
+    'func_hypothesis': 'Functional Hypothesis',
+    'func_primary': 'Primary Function',
+    'window_of_tolerance': 'Window of Tolerance',
+    'support_type': 'Support Type',
+    'consequence': 'Consequence',
+    'effectiveness': 'Effectiveness',
+}
+CUBE_AXES = list(CUBE_DIMENSIONS)  # Position of each dimension in a cell key
+CUBE_PIVOT_SCOPES = ['School'] + sorted({student['area'] for student in MOCK_STUDENTS})  # Roll-ups offered besides single students
+
+
+def session_code(minute):
+    """Index into SESSIONS of a minute-of-day (scalar form of get_sessions_from_minutes)."""
+    if 8 * 60 + 30 <= minute <= 11 * 60:
+        return 0
+    if 11 * 60 + 1 <= minute <= 13 * 60:
+        return 1
+    if 13 * 60 + 1 <= minute <= 15 * 60:
+        return 2
+    return 3
+
+def cube_cell(incident):
+    """Cell key of an incident: its code on each CUBE_AXES dimension."""
+    return tuple(
+        session_code(incident.minute) if dimension == 'session'
+        else (incident.date_ordinal - 1) % 7 if dimension == 'day'
+        else incident.risk_level if dimension == 'risk_level'
+        else getattr(incident, f"{dimension}_code")
+        for dimension in CUBE_AXES
+    )
+
+def cube_decode(dimension, code):
+    """Display value of a cube code (None for a blank coded field)."""
+    if dimension == 'session':
+        return SESSIONS[code]
+    if dimension == 'day':
+        return WEEKDAYS[code]
+    if dimension == 'risk_level':
+        return code
+    return INCIDENT_VOCABULARIES[dimension].decode(code)
+
+def cube_encode(dimension, value):
+    """Inverse of cube_decode."""
+    if dimension == 'session':
+        return SESSIONS.index(value)
+    if dimension == 'day':
+        return WEEKDAYS.index(value)
+    if dimension == 'risk_level':
+        return int(value)
+    return INCIDENT_VOCABULARIES[dimension].encode(value)
+
+
+# --- Similar Incident Retrieval ---
+# An incident's feature vector is the one-hot encoding of SIMILARITY_FIELDS plus its risk level.
+# The dot product of two such one-hot vectors is the number of fields they share, so the index
+# keeps one code per field (an n × 6 integer matrix, plus risk, date and plan columns) and
+# scores a query with a vectorized equality count; risk adds 1 - |Δrisk| / 4. Records join the
+# index as the store applies them and are folded into the matrix at query time; archived terms
+# are read in on the first query.
+
+SIMILARITY_FIELDS = ['behaviour', 'antecedent', 'setting', 'session', 'func_hypothesis', 'window_of_tolerance']
+SIMILARITY_MAX_SCORE = len(SIMILARITY_FIELDS) + 1
+SIMILAR_INCIDENTS_K = 5
+_RISK_COLUMN, _ORDINAL_COLUMN, _PLAN_COLUMN = range(len(SIMILARITY_FIELDS), len(SIMILARITY_FIELDS) + 3)
+
+
+def similarity_row(incident):
+    """Index row of an incident: SIMILARITY_FIELDS codes, risk level, date ordinal and whether it has a written plan."""
+    codes = [session_code(incident.minute) if field == 'session' else getattr(incident, f"{field}_code") for field in SIMILARITY_FIELDS]
+    return codes + [incident.risk_level, incident.date_ordinal, has_written_plan(incident.how_to_respond)]
+
+def has_written_plan(how_to_respond):
+    # Also takes a record's packed field: a compressed frame is always long enough to be a written plan
+    return bool(how_to_respond) and how_to_respond != HOW_TO_RESPOND_DEFAULT
+
+def read_archived_similarity_rows(path):
+    """(uids, student_ids, index rows) of an archived term file, read column-wise without building records."""
+    coded = [field for field in SIMILARITY_FIELDS if field != 'session']
+    columns = ['id', 'student_id', 'date', 'time', 'risk_level', 'how_to_respond'] + coded
+    table = pq.read_table(path, columns=columns)
+    values = {column: table.column(column).to_pylist() for column in columns}
+    ordinals = {d: date.fromisoformat(d).toordinal() for d in set(values['date'])}
+    encoded = {field: [INCIDENT_VOCABULARIES[field].encode(v) for v in values[field]] for field in coded}
+    rows = [
+        [session_code(int(t[:2]) * 60 + int(t[3:5])) if field == 'session' else encoded[field][n] for field in SIMILARITY_FIELDS]
+        + [values['risk_level'][n], ordinals[values['date'][n]], has_written_plan(values['how_to_respond'][n])]
+        for n, t in enumerate(values['time'])
+    ]
+    return [bytes(uid) for uid in values['id']], values['student_id'], rows
+
+
+class SimilarIncidentIndex:
+    """Feature matrix over every incident in history for top-k similarity queries (not thread-safe; the store locks)."""
+
+    def __init__(self):
+        self.matrix = None       # n × (fields + 3) int32, built on first query so startup never imports numpy
+        self.uids = []
+        self.student_ids = []
+        self.rows = {}           # uid -> row in matrix
+        self.pending = []        # Records applied since the last query (new or updated)
+        self.archives = set()    # Archive files already read into the index
+
+    def fold_pending(self):
+        """Moves records applied since the last query into the matrix."""
+        pending, self.pending = self.pending, []
+        self.add([i.uid for i in pending], [i.student_id for i in pending], [similarity_row(i) for i in pending])
+
+    def add(self, uids, student_ids, feature_rows):
+        """Appends index rows, overwriting the rows of uids already indexed."""
+        if self.matrix is None:
+            self.matrix = np.zeros((0, len(SIMILARITY_FIELDS) + 3), dtype=np.int32)
+        added, updated_rows, updated = [], [], []
+        for uid, student_id, feature_row in zip(uids, student_ids, feature_rows):
+            row = self.rows.get(uid)
+            if row is None:
+                self.rows[uid] = len(self.uids)
+                self.uids.append(uid)
+                self.student_ids.append(student_id)
+                added.append(feature_row)
+            else:
+                updated_rows.append(row)
+                updated.append(feature_row)
+        if added:
+            self.matrix = np.vstack([self.matrix, np.array(added, dtype=np.int32)])
+        if updated:
+            self.matrix[updated_rows] = np.array(updated, dtype=np.int32)
+
+    def query(self, incident, k, require_plan=False):
+        """(uid, student_id, date ordinal, score) of the k rows most similar to a record, best (then most recent) first."""
+        self.fold_pending()
+        query = similarity_row(incident)
+        matrix = self.matrix
+        scores = (matrix[:, :len(SIMILARITY_FIELDS)] == query[:len(SIMILARITY_FIELDS)]).sum(axis=1) \
+            + 1 - np.abs(matrix[:, _RISK_COLUMN] - incident.risk_level) / 4
+        excluded = np.zeros(len(scores), dtype=bool)
+        if require_plan:
+            excluded |= matrix[:, _PLAN_COLUMN] == 0
+        if incident.uid in self.rows:
+            excluded[self.rows[incident.uid]] = True
+        candidates = np.flatnonzero(~excluded)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = candidates[np.lexsort((-matrix[candidates, _ORDINAL_COLUMN], -scores[candidates]))]
+        return [(self.uids[row], self.student_ids[row], int(matrix[row, _ORDINAL_COLUMN]), float(scores[row])) for row in best]
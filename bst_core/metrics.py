@@ -0,0 +1,210 @@
+"""In-process metrics registry with Prometheus text exposition over HTTP or a periodically written file."""
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from .util import process_wide
+
+logger = logging.getLogger(__name__)
+
+
+# --- Metrics ---
+# Counters and histograms are kept per process; Prometheus sums them across server processes.
+# Values read from elsewhere (cache counters, store size) are sampled by collectors at scrape
+# time. Exposition is enabled by BST_METRICS_PORT (an HTTP endpoint at /metrics on localhost)
+# and/or BST_METRICS_FILE (rewritten every METRICS_FILE_INTERVAL seconds, e.g. for the node
+# exporter's textfile collector; a "{pid}" in the path gives each server process its own file).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FILE_INTERVAL = 15.0
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def exposition(self):
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    """Observations bucketed by upper bound, plus their sum and count, per label combination."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def time(self, *labelvalues):
+        """Decorator observing the wrapped function's run time, including runs that raise (e.g. st.rerun())."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(perf_counter() - started, *labelvalues)
+            return wrapper
+        return decorator
+
+    def exposition(self):
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, entry in values:
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """The process's metrics, plus collectors sampled at exposition time."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Modules re-imported by a script rerun get the already registered metric back
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def collector(self, fn):
+        """
+        Registers fn() returning [(name, type, help, [(labels dict, value)])] sampled on each
+        exposition. Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def exposition(self):
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.exposition()
+        for collect in collectors:
+            try:
+                samples = collect()
+            except Exception:
+                logger.exception("Metrics collector %s failed", getattr(collect, '__name__', collect))
+                continue
+            for name, metric_type, help_text, values in samples:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                lines += [f"{name}{_labels(labels, labels.values())} {value}" for labels, value in values]
+        return '\n'.join(lines) + '\n'
+
+
+@process_wide
+def get_metrics_registry():
+    return MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = get_metrics_registry().exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the server log
+
+
+def write_metrics_file(path):
+    """Writes the exposition to path atomically, so a collector never reads half a file."""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(get_metrics_registry().exposition())
+    os.replace(path + '.tmp', path)
+
+def _write_metrics_file_forever(path):
+    while True:
+        time.sleep(METRICS_FILE_INTERVAL)
+        try:
+            write_metrics_file(path)
+        except Exception:
+            logger.exception("Writing metrics to %s failed", path)
+
+
+@process_wide
+def start_metrics_export():
+    """
+    Starts the exposition configured by BST_METRICS_PORT / BST_METRICS_FILE, once per process.
+    Returns a description of what was started (empty if neither is set).
+    """
+    started = []
+    port = os.environ.get('BST_METRICS_PORT')
+    if port:
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', int(port)), _MetricsHandler)
+        except OSError as e:
+            # Several server processes on one host: the first takes the port, the rest log and skip
+            logger.warning("Metrics endpoint not started on port %s: %s", port, e)
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+            started.append(f"http://127.0.0.1:{port}/metrics")
+    path = os.environ.get('BST_METRICS_FILE')
+    if path:
+        path = path.replace('{pid}', str(os.getpid()))
+        threading.Thread(target=_write_metrics_file_forever, args=(path,), name='metrics-file', daemon=True).start()
+        started.append(path)
+    return started
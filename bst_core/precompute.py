@@ -0,0 +1,189 @@
+"""Off-hours precompute: warms the view caches and materializes BPP reports before the school day."""
+import logging
+import os
+import socket
+import threading
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+from .util import process_wide
+from .constants import MOCK_STUDENTS
+from .indexes import CUBE_PIVOT_SCOPES
+from .rollup import materialize_site_rollup
+from .sites import current_site
+from .store import DEFAULT_HISTORY_WINDOW, get_incident_store, history_start
+from .views import (
+    bpp_report_key,
+    bpp_report_payload,
+    get_area_rollup,
+    get_bpp_report_body,
+    get_materialized_bpp_report,
+    get_cpi_roster,
+    get_incident_pivot,
+    get_school_behaviour_counts,
+    get_staff_weekly_exposure,
+    get_staff_workload,
+    get_student_frame,
+    get_student_summary,
+    get_student_time_series,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# --- Nightly Precompute ---
+# Run once a night, either by a daemon thread in each server process (warming that process's
+# view caches) or from cron as `python -m bst_core precompute` (materializing only). BPP report
+# bodies are written to the store's materialized table, keyed by student and history window and
+# stamped with the student's data version, so every process serves them without rebuilding; the
+# report date is filled in when one is read. Students whose version has not changed since the
+# last run are skipped, on later nights too (a student with no incidents gets an empty body),
+# until a rolling window moves past the oldest incident their body counts.
+# Work on the shared store (compacting closed terms, retraining the text dictionary, writing the
+# reports and the site rollup) is done by whichever process claims the maintenance lease first;
+# with several server processes waking at the same hour, the others only warm their own caches.
+# The lease is released when the work is done; its expiry only frees it after a crashed holder.
+# The scheduler also compacts closed terms when it starts, in its own thread, so a term that
+# closed while no server was running leaves memory before the night without slowing a page.
+
+PRECOMPUTE_HOUR = 2  # Local hour the in-process scheduler runs the job
+PRECOMPUTE_WINDOWS = [DEFAULT_HISTORY_WINDOW]  # History windows warmed; the pages open on the default
+PRECOMPUTE_PIVOT = ('antecedent', 'setting')   # The pivot explorer's default rows × columns
+MAINTENANCE_LEASE = 'maintenance'
+MAINTENANCE_LEASE_SECONDS = 60 * 60  # Outlasts a maintenance run, so only a crashed holder's lease expires
+
+
+def lease_holder():
+    """This process's name in the store's leases table."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def compact_closed_terms(today=None):
+    """Archives closed terms if this process claims the maintenance lease. Returns the partitions archived."""
+    store = get_incident_store()
+    holder = lease_holder()
+    if not store.claim_lease(MAINTENANCE_LEASE, holder, MAINTENANCE_LEASE_SECONDS):
+        return []
+    try:
+        return store.archive_closed_terms(today)
+    finally:
+        store.release_lease(MAINTENANCE_LEASE, holder)
+
+
+def precompute(today=None, warm=True, warmed=None):
+    """
+    Runs the precompute for `today`. If this process claims the maintenance lease, it compacts
+    closed terms, retrains the free-text dictionary once enough text has accumulated and
+    materializes each student's BPP report and the site's rollup. With warm=True it also fills
+    this process's per-student and roll-up view caches.
+
+    warmed maps (student_id, window) to the student version last warmed by this process
+    and is updated in place. Returns a dict of run statistics.
+    """
+    started = perf_counter()
+    today = today or date.today()
+    store = get_incident_store()
+    store.refresh(force=True)
+    holder = lease_holder()
+    leader = store.claim_lease(MAINTENANCE_LEASE, holder, MAINTENANCE_LEASE_SECONDS)
+    try:
+        archived = store.archive_closed_terms(today) if leader else []
+        trained = store.train_text_dictionary() if leader else None
+        warmed = {} if warmed is None else warmed
+        reports, keys, built, skipped = [], [], 0, 0
+        for window in PRECOMPUTE_WINDOWS:
+            since = history_start(window, today)
+            for student in MOCK_STUDENTS:
+                student_id = student['id']
+                version = store.student_version(student_id)
+                key = bpp_report_key(student_id, window, since)
+                keys.append(key)
+                materialized = get_materialized_bpp_report(student_id, window, since) is not None
+                if (materialized or not leader) and (not warm or warmed.get((student_id, window)) == version):
+                    skipped += 1
+                    continue
+                report = get_bpp_report_body(student_id, window, since)
+                if leader and not materialized:
+                    reports.append((key, version, bpp_report_payload(report, get_student_summary(student_id, since))))
+                if warm:
+                    # The analysis page's inputs; its charts are drawn from these cached frames
+                    get_student_frame(student_id, since)
+                    get_student_time_series(student_id, since)
+                    store.student_heatmap(student_id)
+                    warmed[(student_id, window)] = version
+                built += 1
+        if leader:
+            # Bodies of students or windows no longer precomputed (and older keys) are dropped
+            store.put_materialized('bpp_report', reports, today.toordinal(), live_keys=keys)
+            # Read by every site's regional dashboard
+            materialize_site_rollup(store, current_site(), today)
+    finally:
+        if leader:
+            store.release_lease(MAINTENANCE_LEASE, holder)
+
+    if warm:
+        since = history_start(DEFAULT_HISTORY_WINDOW, today)
+        get_cpi_roster(since)
+        get_school_behaviour_counts()
+        get_staff_workload(since)
+        get_staff_weekly_exposure(since)
+        for scope in CUBE_PIVOT_SCOPES:
+            get_incident_pivot(*PRECOMPUTE_PIVOT, scope)
+            if scope != 'School':
+                get_area_rollup(scope)
+
+    return {
+        'date': today.isoformat(),
+        'maintenance': 'done' if leader else 'left to the process holding the lease',
+        'archived_terms': archived,
+        'text_dictionary': dict(zip(('id', 'samples', 'rows_recompressed'), trained)) if trained else None,
+        'students_built': built,
+        'students_skipped': skipped,
+        'reports_materialized': len(reports),
+        'seconds': round(perf_counter() - started, 3),
+    }
+
+
+def seconds_until_precompute(now):
+    """Seconds from now to the next PRECOMPUTE_HOUR:00."""
+    run_at = now.replace(hour=PRECOMPUTE_HOUR, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+class PrecomputeWorker:
+    """Daemon thread running precompute() every night at PRECOMPUTE_HOUR, or sooner on request."""
+
+    def __init__(self):
+        self.warmed = {}
+        self.last_run = None  # Statistics of the latest run, replaced whole
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='precompute', daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Runs the precompute now rather than at the next scheduled hour."""
+        self._wake.set()
+
+    def _run(self):
+        try:
+            archived = compact_closed_terms()
+            if archived:
+                logger.info("Archived closed terms: %s", ', '.join(archived))
+        except Exception:
+            logger.exception("Archiving closed terms failed")
+        while True:
+            self._wake.wait(seconds_until_precompute(datetime.now()))
+            self._wake.clear()
+            try:
+                self.last_run = precompute(warmed=self.warmed)
+                logger.info("Precompute finished: %s", self.last_run)
+            except Exception:
+                logger.exception("Precompute failed")
+
+
+@process_wide
+def get_precompute_worker():
+    """The process-wide precompute scheduler (started on first use, from the staff pages)."""
+    return PrecomputeWorker()
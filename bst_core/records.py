@@ -0,0 +1,524 @@
+"""Compact incident records, their vocabularies, time helpers and mock data."""
+import functools
+import random
+import sys
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from .util import np, pd, process_wide
+from .text import TEXT_FIELDS, get_text_codec
+from .constants import (
+    ANTECEDENTS_NEW,
+    BEHAVIORS_BPP,
+    CONSEQUENCES,
+    DAYS,
+    FUNCTIONAL_HYPOTHESIS,
+    FUNCTION_PRIMARY,
+    FUNCTION_SECONDARY,
+    HOW_TO_RESPOND_DEFAULT,
+    INTERVENTION_EFFECTIVENESS,
+    MOCK_STUDENTS,
+    OUTCOME_FIELDS,
+    RISK_LEVELS,
+    SESSIONS,
+    SETTINGS,
+    SUPPORT_TYPES,
+    WINDOW_OF_TOLERANCE,
+)
+
+
+# --- Utility Functions (Existing) ---
+
+def get_session_from_time(t):
+    """Determines the session based on time of day."""
+    if time(8, 30) <= t <= time(11, 0):
+        return 'Morning (8:30-11:00)'
+    elif time(11, 1) <= t <= time(13, 0):
+        return 'Middle (11:01-1:00)'
+    elif time(13, 1) <= t <= time(15, 0):
+        return 'Afternoon (1:01-3:00)'
+    else:
+        return 'Outside Hours'
+
+def get_sessions_from_minutes(minutes):
+    """Vectorized form of get_session_from_time for an array of minutes-after-midnight."""
+    minutes = np.asarray(minutes)
+    return np.select(
+        [
+            (minutes >= 8 * 60 + 30) & (minutes <= 11 * 60),
+            (minutes >= 11 * 60 + 1) & (minutes <= 13 * 60),
+            (minutes >= 13 * 60 + 1) & (minutes <= 15 * 60),
+        ],
+        SESSIONS[:3],
+        default=SESSIONS[3]
+    )
+
+def get_random_time():
+    """Generates a random time between 8:30 and 15:00."""
+    start = datetime(2000, 1, 1, 8, 30, 0)
+    end = datetime(2000, 1, 1, 15, 0, 0)
+    random_seconds = random.randint(0, int((end - start).total_seconds()))
+    return (start + timedelta(seconds=random_seconds)).time()
+
+def get_time_slot(t):
+    """Converts time to the nearest half-hour slot for heatmap."""
+    # MODIFIED: Ensure time is a datetime.time object
+    if isinstance(t, str):
+        t = datetime.strptime(t, '%H:%M').time()
+        
+    minutes = t.minute
+    hour = t.hour
+    if minutes < 30:
+        return f"{hour:02d}:00"
+    else:
+        # Note: This means 10:30-10:59 falls into 10:30 slot. 
+        # The next hour's 00:00-00:29 falls into the next hour's :00 slot.
+        return f"{hour:02d}:30"
+
+def generate_mock_abch_outcomes():
+    """Generates random outcomes for critical incidents (for mock data)."""
+    outcomes = {
+        'outcome_send_home': random.choice([True, False]),
+        'outcome_leave_area': random.choice([True, False]),
+        'outcome_assault': random.choice([True, False]),
+        'outcome_property_damage': random.choice([True, False]),
+        'outcome_staff_injury': random.choice([True, False]),
+        'outcome_sapol_callout': random.choice([True, False]),
+        'outcome_ambulance': random.choice([True, False]),
+    }
+    if not any(outcomes.values()):
+        outcomes[random.choice(list(outcomes.keys()))] = True
+    
+    return outcomes
+
+# --- Compact Incident Records ---
+# Incidents are held in memory as slotted records rather than dicts: enumerations are stored
+# as small-int codes into shared vocabularies, the seven outcome flags as one bitmask, the id
+# as 16 raw bytes, and the date/time as a day ordinal and minute-of-day. Day and session are
+# derived from date/time on read. Long free text is held compressed (see bst_core.text). Records
+# still support dict-style reads (incident['behaviour']), which decode all of this.
+
+class Vocabulary:
+    """Interns the values of one categorical incident field as small-int codes (0 is reserved for None)."""
+    __slots__ = ('values', '_codes', '_lock')
+
+    def __init__(self, values):
+        self.values = [None]
+        self._codes = {None: 0}
+        self._lock = threading.Lock()
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    # Values outside the app vocabulary (e.g. legacy data) are interned on first sight
+                    code = len(self.values)
+                    self.values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+
+CODED_FIELDS = [
+    'behaviour', 'window_of_tolerance', 'setting', 'support_type', 'antecedent',
+    'func_hypothesis', 'func_primary', 'func_secondary', 'consequence', 'effectiveness',
+]
+
+@process_wide
+def get_incident_vocabularies():
+    """Process-wide vocabularies, so codes stay valid for every session and thread."""
+    return {
+        'behaviour': Vocabulary(BEHAVIORS_BPP),
+        'window_of_tolerance': Vocabulary(WINDOW_OF_TOLERANCE),
+        'setting': Vocabulary(SETTINGS),
+        'support_type': Vocabulary(SUPPORT_TYPES),
+        'antecedent': Vocabulary(ANTECEDENTS_NEW),
+        'func_hypothesis': Vocabulary(FUNCTIONAL_HYPOTHESIS),
+        'func_primary': Vocabulary(FUNCTION_PRIMARY),
+        'func_secondary': Vocabulary(FUNCTION_SECONDARY),
+        'consequence': Vocabulary(CONSEQUENCES),
+        'effectiveness': Vocabulary(INTERVENTION_EFFECTIVENESS),
+    }
+
+INCIDENT_VOCABULARIES = get_incident_vocabularies()
+INCIDENT_FIELDS = [
+    'id', 'student_id', 'date', 'time', 'day', 'session', 'behaviour', 'window_of_tolerance',
+    'setting', 'support_type', 'antecedent', 'func_hypothesis', 'func_primary', 'func_secondary',
+    'risk_level', 'consequence', 'effectiveness', 'logged_by', 'other_staff', 'is_abch_completed',
+    'context', 'notes', 'how_to_respond', 'group_id',
+] + OUTCOME_FIELDS
+WEEKDAYS = DAYS + ['Saturday', 'Sunday']
+DATE_ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+MAX_INTERNED_TEXT = 200  # Short free text (defaults, stock plans) is shared; long narratives are compressed
+
+
+def _intern(value):
+    """Returns a shared copy of a short string so repeated values cost one object."""
+    if isinstance(value, str) and len(value) <= MAX_INTERNED_TEXT:
+        return sys.intern(value)
+    return value
+
+def pack_text(value):
+    """
+    Storage form of a free-text field: short text as a shared string, longer text as a
+    compressed frame (bytes) when that is smaller. Frames read back from the store pass through.
+    """
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value)
+    if value is None or len(value) <= MAX_INTERNED_TEXT:
+        return _intern(value)
+    frame = get_text_codec().compress(value)
+    return frame if len(frame) < len(value) else value
+
+def unpack_text(value):
+    """The text of a pack_text() value."""
+    return get_text_codec().decompress(value) if isinstance(value, bytes) else value
+
+def encode_outcomes(data):
+    """Packs the seven outcome_* booleans into a 7-bit mask."""
+    mask = 0
+    for bit, field in enumerate(OUTCOME_FIELDS):
+        if data.get(field):
+            mask |= 1 << bit
+    return mask
+
+
+class Incident:
+    """Compact in-memory incident record. Use Incident.from_dict() to build one from form data."""
+    __slots__ = (
+        'uid', 'student_id', 'date_ordinal', 'minute',
+        'behaviour_code', 'window_of_tolerance_code', 'setting_code', 'support_type_code', 'antecedent_code',
+        'func_hypothesis_code', 'func_primary_code', 'func_secondary_code', 'consequence_code', 'effectiveness_code',
+        'risk_level', 'outcomes', 'is_abch_completed', 'logged_by', 'other_staff',
+        'context', 'notes', 'how_to_respond', 'group_id',
+    )
+
+    def __init__(self, uid, student_id, date_ordinal, minute, codes, risk_level, outcomes,
+                 is_abch_completed, logged_by, other_staff, context, notes, how_to_respond, group_id=None):
+        self.uid = uid
+        self.student_id = student_id
+        self.date_ordinal = date_ordinal
+        self.minute = minute
+        (self.behaviour_code, self.window_of_tolerance_code, self.setting_code, self.support_type_code,
+         self.antecedent_code, self.func_hypothesis_code, self.func_primary_code, self.func_secondary_code,
+         self.consequence_code, self.effectiveness_code) = codes
+        self.risk_level = risk_level
+        self.outcomes = outcomes
+        self.is_abch_completed = is_abch_completed
+        self.logged_by = logged_by
+        self.other_staff = other_staff
+        self.context = context  # Free-text fields hold pack_text() values; read them as incident['context']
+        self.notes = notes
+        self.how_to_respond = how_to_respond
+        self.group_id = group_id  # Shared by every student's record of one group incident
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a record from an incident dict (as compiled by the log forms or the importer)."""
+        incident_id = data.get('id')
+        group_id = data.get('group_id')
+        incident_time = data['time']
+        return cls(
+            uid=uuid.UUID(incident_id).bytes if incident_id else uuid.uuid4().bytes,
+            student_id=_intern(data['student_id']),
+            date_ordinal=datetime.strptime(data['date'], '%Y-%m-%d').toordinal(),
+            minute=int(incident_time[:2]) * 60 + int(incident_time[3:5]),
+            codes=tuple(INCIDENT_VOCABULARIES[field].encode(data.get(field)) for field in CODED_FIELDS),
+            risk_level=int(data['risk_level']),
+            outcomes=encode_outcomes(data),
+            is_abch_completed=bool(data.get('is_abch_completed', False)),
+            logged_by=_intern(data.get('logged_by')),
+            other_staff=tuple(_intern(s) for s in data.get('other_staff') or ()),
+            context=pack_text(data.get('context')),
+            notes=pack_text(data.get('notes')),
+            how_to_respond=pack_text(data.get('how_to_respond', HOW_TO_RESPOND_DEFAULT)),
+            group_id=uuid.UUID(group_id).bytes if group_id else None,
+        )
+
+    def update_from(self, other):
+        """Overwrites this record's fields with another record's (used for in-place updates by id)."""
+        for slot in Incident.__slots__:
+            setattr(self, slot, getattr(other, slot))
+
+    @property
+    def id(self):
+        return str(uuid.UUID(bytes=self.uid))
+
+    def __getitem__(self, key):
+        try:
+            getter = INCIDENT_GETTERS[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return getter(self)
+
+    def get(self, key, default=None):
+        getter = INCIDENT_GETTERS.get(key)
+        return getter(self) if getter else default
+
+    def keys(self):
+        return list(INCIDENT_FIELDS)
+
+    def to_dict(self):
+        return {field: INCIDENT_GETTERS[field](self) for field in INCIDENT_FIELDS}
+
+    def __repr__(self):
+        return f"Incident(id={self.id!r}, student_id={self.student_id!r}, date={self['date']!r}, behaviour={self['behaviour']!r})"
+
+
+def _coded_getter(field):
+    vocabulary_values = INCIDENT_VOCABULARIES[field].values
+    slot = f"{field}_code"
+    return lambda incident: vocabulary_values[getattr(incident, slot)]
+
+def _outcome_getter(bit):
+    return lambda incident: bool(incident.outcomes >> bit & 1)
+
+INCIDENT_GETTERS = {
+    'id': lambda i: i.id,
+    'student_id': lambda i: i.student_id,
+    'date': lambda i: date.fromordinal(i.date_ordinal).isoformat(),
+    'time': lambda i: f"{i.minute // 60:02d}:{i.minute % 60:02d}",
+    'day': lambda i: WEEKDAYS[(i.date_ordinal - 1) % 7],
+    'session': lambda i: get_session_from_time(time(i.minute // 60, i.minute % 60)),
+    'risk_level': lambda i: i.risk_level,
+    'logged_by': lambda i: i.logged_by,
+    'other_staff': lambda i: list(i.other_staff),
+    'is_abch_completed': lambda i: i.is_abch_completed,
+    'context': lambda i: unpack_text(i.context),
+    'notes': lambda i: unpack_text(i.notes),
+    'how_to_respond': lambda i: unpack_text(i.how_to_respond),
+    'group_id': lambda i: str(uuid.UUID(bytes=i.group_id)) if i.group_id else None,
+}
+INCIDENT_GETTERS.update({field: _coded_getter(field) for field in CODED_FIELDS})
+INCIDENT_GETTERS.update({field: _outcome_getter(bit) for bit, field in enumerate(OUTCOME_FIELDS)})
+
+@functools.lru_cache(maxsize=None)
+def get_time_strings():
+    """'HH:MM' labels indexed by minute-of-day, for vectorized time decoding."""
+    return np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)], dtype=object)
+
+
+def incidents_to_frame(incidents, text=True):
+    """
+    Decodes a list of Incident records into the column-per-field DataFrame used by the analysis
+    views. text=False leaves out the free-text fields, which the charts and tables never show.
+    """
+    fields = INCIDENT_FIELDS if text else [field for field in INCIDENT_FIELDS if field not in TEXT_FIELDS]
+    n = len(incidents)
+    if n == 0:
+        return pd.DataFrame(columns=fields)
+
+    ordinals = np.fromiter((i.date_ordinal for i in incidents), dtype=np.int64, count=n)
+    minutes = np.fromiter((i.minute for i in incidents), dtype=np.int64, count=n)
+    outcomes = np.fromiter((i.outcomes for i in incidents), dtype=np.uint8, count=n)
+
+    unique_ordinals, inverse = np.unique(ordinals, return_inverse=True)
+    date_strings = np.array([date.fromordinal(int(o)).isoformat() for o in unique_ordinals], dtype=object)
+
+    columns = {
+        'id': [str(uuid.UUID(bytes=i.uid)) for i in incidents],
+        'student_id': [i.student_id for i in incidents],
+        'date': date_strings[inverse],
+        'time': get_time_strings()[minutes],
+        'day': np.array(WEEKDAYS, dtype=object)[(ordinals - 1) % 7],
+        'session': get_sessions_from_minutes(minutes).astype(object),
+    }
+    for field in CODED_FIELDS:
+        slot = f"{field}_code"
+        codes = np.fromiter((getattr(i, slot) for i in incidents), dtype=np.int64, count=n)
+        columns[field] = np.array(INCIDENT_VOCABULARIES[field].values, dtype=object)[codes]
+    columns['risk_level'] = np.fromiter((i.risk_level for i in incidents), dtype=np.int64, count=n)
+    columns['logged_by'] = [i.logged_by for i in incidents]
+    columns['other_staff'] = [list(i.other_staff) for i in incidents]
+    columns['is_abch_completed'] = np.fromiter((i.is_abch_completed for i in incidents), dtype=bool, count=n)
+    if text:
+        for field in TEXT_FIELDS:
+            columns[field] = [unpack_text(getattr(i, field)) for i in incidents]
+    columns['group_id'] = [str(uuid.UUID(bytes=i.group_id)) if i.group_id else None for i in incidents]
+    for bit, field in enumerate(OUTCOME_FIELDS):
+        columns[field] = (outcomes >> bit & 1).astype(bool)
+
+    return pd.DataFrame(columns, columns=fields)
+
+
+# --- Mock Data ---
+@process_wide
+def generate_mock_incidents():
+    """Generates a list of mock Incident records with new BPP fields and outcomes."""
+    incidents = []
+    
+    # 1. High Incident Student (Marcus A. - stu_jp_high) - 15 incidents
+    for i in range(1, 16):
+        incident_date = (datetime.now() - timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d')
+        incident_time = get_random_time()
+        
+        is_high_risk = random.choice([True, True, False])
+        
+        behaviour = random.choice(['Verbal Refusal', 'Elopement', 'Physical Aggression (Staff)']) if i % 3 == 0 else random.choice(BEHAVIORS_BPP)
+        risk = random.choice([4, 5]) if is_high_risk else random.choice([1, 2, 3])
+        
+        incident_data = {
+            'id': str(uuid.uuid4()),
+            'student_id': 'stu_jp_high',
+            'date': incident_date,
+            'time': incident_time.strftime('%H:%M'),
+            'day': datetime.strptime(incident_date, '%Y-%m-%d').strftime('%A'),
+            'session': get_session_from_time(incident_time),
+            'behaviour': behaviour,
+            'window_of_tolerance': random.choice(['Hyper-aroused']) if is_high_risk else random.choice(WINDOW_OF_TOLERANCE),
+            'setting': random.choice(['Classroom', 'Yard', 'Gate', 'Admin']), # Added more variety
+            'support_type': random.choice(['1:1', 'Small Group']) if is_high_risk else random.choice(SUPPORT_TYPES),
+            'antecedent': random.choice(['Task Demand', 'Limit Setting', 'Adult Demand', 'Peer Interaction', 'Transition']), # Added more variety
+            'func_hypothesis': random.choice(['Avoid/Escape Something', 'Seek/Get Something']),
+            'func_primary': random.choice(FUNCTION_PRIMARY),
+            'func_secondary': random.choice(FUNCTION_SECONDARY),
+            'risk_level': risk,
+            'consequence': random.choice(CONSEQUENCES), 
+            'effectiveness': random.choice(['Ineffective', 'Worsened Behaviour']) if is_high_risk else random.choice(['Highly Effective', 'Moderately Effective']),
+            'logged_by': 's1',
+            'other_staff': ['s_trt:Jane Doe'] if i % 5 == 0 else [],
+            'is_abch_completed': is_high_risk,
+            'context': f"HIGH-DETAIL LOG: {behaviour} during {incident_time.strftime('%H:%M')}. Requires immediate follow-up." if is_high_risk else "Basic log captured. No detailed context entered.",
+            'notes': f"Staff noted lack of sleep prior to incident {i}.",
+            'how_to_respond': "Use a 5-step break card system." if is_high_risk else HOW_TO_RESPOND_DEFAULT
+        }
+        
+        if is_high_risk:
+            incident_data.update(generate_mock_abch_outcomes())
+        else:
+            incident_data.update({
+                'outcome_send_home': False, 'outcome_leave_area': False, 
+                'outcome_assault': False, 'outcome_property_damage': False, 
+                'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
+                'outcome_ambulance': False,
+            })
+            
+        incidents.append(Incident.from_dict(incident_data))
+    
+    # --- START FIX FOR TYPERROR: 'datetime.time' and 'datetime.timedelta' (Approx. line 255) ---
+    # The original code at this line caused a TypeError because 'datetime.time' cannot be 
+    # subtracted by 'timedelta'. The fix is to use datetime.combine() with a date 
+    # (datetime.now().date()) before performing the subtraction.
+    
+    # This block represents the problematic incident from the traceback, now corrected.
+    incident_time_for_fix = get_random_time()
+    incidents.append(Incident.from_dict({
+        'id': str(uuid.uuid4()),
+        'student_id': 'stu_jp_high', # Example student assignment
+        'date': (datetime.now() - timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d'),
+        # CORRECTED LINE: Use datetime.combine() to allow timedelta subtraction
+        'time': (datetime.combine(datetime.now().date(), incident_time_for_fix) - timedelta(minutes=random.randint(1, 5))).strftime('%H:%M'), 
+        'day': datetime.strptime((datetime.now() - timedelta(days=random.randint(1, 45))).strftime('%Y-%m-%d'), '%Y-%m-%d').strftime('%A'),
+        'session': get_session_from_time(incident_time_for_fix),
+        'behaviour': 'Pacing', 
+        'window_of_tolerance': 'Hypo-aroused',
+        'setting': 'Hallway',
+        'support_type': random.choice(SUPPORT_TYPES),
+        'antecedent': random.choice(ANTECEDENTS_NEW),
+        'func_hypothesis': random.choice(FUNCTIONAL_HYPOTHESIS),
+        'func_primary': random.choice(FUNCTION_PRIMARY),
+        'func_secondary': random.choice(FUNCTION_SECONDARY),
+        'risk_level': random.choice(RISK_LEVELS),
+        'consequence': random.choice(CONSEQUENCES), 
+        'effectiveness': random.choice(INTERVENTION_EFFECTIVENESS),
+        'logged_by': 's1',
+        'other_staff': [],
+        'is_abch_completed': False,
+        'context': "Mock incident created to resolve the TypeError.",
+        'notes': None,
+        'how_to_respond': HOW_TO_RESPOND_DEFAULT,
+        'outcome_send_home': False, 'outcome_leave_area': False, 
+        'outcome_assault': False, 'outcome_property_damage': False, 
+        'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
+        'outcome_ambulance': False,
+    }))
+    # --- END FIX BLOCK ---
+
+    # 2. Other students (3 incidents each)
+    for student in MOCK_STUDENTS:
+        if student['id'] == 'stu_jp_high':
+            continue
+
+        for i in range(1, 4):
+            incident_date = (datetime.now() - timedelta(days=random.randint(1, 60))).strftime('%Y-%m-%d')
+            incident_time = get_random_time()
+            
+            incident_data = {
+                'id': str(uuid.uuid4()),
+                'student_id': student['id'],
+                'date': incident_date,
+                'time': incident_time.strftime('%H:%M'),
+                'day': datetime.strptime(incident_date, '%Y-%m-%d').strftime('%A'),
+                'session': get_session_from_time(incident_time),
+                'behaviour': random.choice(BEHAVIORS_BPP),
+                'window_of_tolerance': random.choice(WINDOW_OF_TOLERANCE),
+                'setting': random.choice(SETTINGS),
+                'support_type': random.choice(SUPPORT_TYPES),
+                'antecedent': random.choice(ANTECEDENTS_NEW),
+                'func_hypothesis': random.choice(FUNCTIONAL_HYPOTHESIS),
+                'func_primary': random.choice(FUNCTION_PRIMARY),
+                'func_secondary': random.choice(FUNCTION_SECONDARY),
+                'risk_level': random.choice(RISK_LEVELS),
+                'consequence': random.choice(CONSEQUENCES), 
+                'effectiveness': random.choice(INTERVENTION_EFFECTIVENESS),
+                'logged_by': random.choice(['s1', 's2', 's3']),
+                'other_staff': [],
+                'is_abch_completed': False,
+                'context': "Basic log captured. No detailed context entered.",
+                'notes': None,
+                'how_to_respond': HOW_TO_RESPOND_DEFAULT
+            }
+            incident_data.update({
+                'outcome_send_home': False, 'outcome_leave_area': False, 
+                'outcome_assault': False, 'outcome_property_damage': False, 
+                'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
+                'outcome_ambulance': False,
+            })
+            incidents.append(Incident.from_dict(incident_data))
+            
+    return incidents
+
+def compile_abch_context(chronology, final_summary):
+    """Compiles the chronology layers and the clinical summary into the final ABCH context text."""
+    final_context = "Chronological Log:\n"
+    for i, entry in enumerate(chronology):
+        # Only include layers with at least one data point
+        if entry['location'] or entry['context'] or entry['behaviour'] or entry['consequence']:
+            final_context += f"Layer {i+1} ({entry['time']}): L: {entry['location'] or 'N/A'}; A: {entry['antecedent'] or 'N/A'}; B: {entry['behaviour'] or 'N/A'}; C: {entry['consequence'] or 'N/A'}\n"
+            if entry['context']:
+                final_context += f"   - Context: {entry['context']}\n"
+    
+    final_context += f"\n---\nFinal Clinical Summary:\n{final_summary}"
+    return final_context
+
+def complete_incident_data(incident_data, student_id, is_abch=False):
+    """Fills in the id, derived fields and default outcomes of an incident compiled by a log form."""
+    
+    # 1. Generate core metadata
+    incident_data.update({
+        'id': str(uuid.uuid4()),
+        'student_id': student_id,
+        'day': datetime.strptime(incident_data['date'], '%Y-%m-%d').strftime('%A'),
+        'session': get_session_from_time(datetime.strptime(incident_data['time'], '%H:%M').time()),
+        'is_abch_completed': is_abch,
+        'notes': incident_data.get('notes') # Management notes from the ABCH step, if any
+    })
+    
+    # 2. Ensure all outcome fields are present (defaulting to False if not an ABCH log)
+    if not is_abch:
+        incident_data.update({
+            'outcome_send_home': False, 'outcome_leave_area': False, 
+            'outcome_assault': False, 'outcome_property_damage': False, 
+            'outcome_staff_injury': False, 'outcome_sapol_callout': False, 
+            'outcome_ambulance': False,
+            'how_to_respond': incident_data.get('how_to_respond', HOW_TO_RESPOND_DEFAULT),
+            'context': incident_data.get('context', "Basic log captured. No detailed context entered.")
+        })
+    return incident_data
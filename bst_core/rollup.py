@@ -0,0 +1,109 @@
+"""Per-site rollups materialized in each site's store, and their merge into regional totals."""
+import json
+import os
+import sqlite3
+from datetime import date, datetime
+
+from .constants import MOCK_STUDENTS
+from .escalation import ESCALATION_RULES
+from .indexes import cube_decode
+from .sites import get_sites, site_store_path
+from .store import DEFAULT_HISTORY_WINDOW, history_start
+from .views import get_cpi_roster
+
+
+# --- Cross-Site Rollups ---
+# Each site's precompute materializes one small rollup of its own aggregates in its store
+# (kind 'site_rollup', keyed by site id): totals, counts by area, behaviour × risk and
+# setting × risk from the incident cube, CPI stages, and how many students are at or over an
+# escalation threshold. A regional dashboard opens every site's store read-only, reads that
+# one row and sums the counts. No incident rows are read and no site's caches are touched, so
+# the cost grows with the number of sites, not their data. A site whose store is missing or
+# has no rollup yet is listed as such instead of failing the dashboard.
+
+ROLLUP_KIND = 'site_rollup'
+
+
+def _pivot_counts(store, rows, columns):
+    """{row value: {column value: count}} over all of a store's students, all history."""
+    counts = {}
+    for (row, column), count in store.pivot(rows, columns, list(store.counts_by_student)).items():
+        cells = counts.setdefault(str(cube_decode(rows, row)), {})
+        cells[str(cube_decode(columns, column))] = count
+    return counts
+
+def build_site_rollup(store, site, today=None):
+    """The rollup payload of one site's store (see the section comment), as a JSON-ready dict."""
+    today = today or date.today()
+    area_of = {student['id']: student['area'] for student in MOCK_STUDENTS}
+    by_area = {}
+    for student_id, count in store.counts_by_student.items():
+        area = area_of.get(student_id, 'Other')
+        by_area[area] = by_area.get(area, 0) + count
+    roster = get_cpi_roster(history_start(DEFAULT_HISTORY_WINDOW, today))
+    escalating = 0
+    for state in list(store.escalation.students.values()):
+        metrics = state.metrics()
+        escalating += any(metrics[rule] >= threshold for rule, (threshold, _) in ESCALATION_RULES.items())
+    return {
+        'site': site['id'],
+        'name': site['name'],
+        'as_of': today.isoformat(),
+        'computed_at': datetime.now().isoformat(timespec='seconds'),
+        'students': len(MOCK_STUDENTS),
+        'incidents': store.total_incidents,
+        'abch': store.abch_count,
+        'escalating_students': escalating,
+        'by_area': by_area,
+        'cpi_stages': {str(stage): int(count) for stage, count in roster['cpi_stage'].value_counts(sort=False).items() if count},
+        'behaviour_risk': _pivot_counts(store, 'behaviour', 'risk_level'),
+        'setting_risk': _pivot_counts(store, 'setting', 'risk_level'),
+    }
+
+def materialize_site_rollup(store, site, today=None):
+    """Builds and stores a site's rollup, replacing its previous one. Returns the payload."""
+    today = today or date.today()
+    rollup = build_site_rollup(store, site, today)
+    store.put_materialized(ROLLUP_KIND, [(site['id'], store.version, json.dumps(rollup))], today.toordinal())
+    return rollup
+
+
+def read_site_rollup(site):
+    """(status, rollup or None) of one site, read from its store's materialized table without opening it for writing."""
+    path = site_store_path(site)
+    if not os.path.exists(path):
+        return 'no store', None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    try:
+        row = conn.execute('SELECT payload FROM materialized WHERE kind = ? AND key = ?', (ROLLUP_KIND, site['id'])).fetchone()
+    except sqlite3.OperationalError as e:
+        return f"unreadable: {e}", None
+    finally:
+        conn.close()
+    if row is None:
+        return 'not yet computed', None
+    return 'ok', json.loads(row[0])
+
+def _add_counts(total, counts):
+    """Adds nested {key: count or {key: count}} counts into total, in place."""
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _add_counts(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+def regional_rollup(sites=None):
+    """
+    Merges the stored rollups of the sites (default: all configured). Returns {'sites': [one row
+    per site with its status and totals], 'totals': summed counts of the sites that have a rollup}.
+    """
+    rows, totals = [], {}
+    for site in sites or get_sites():
+        status, rollup = read_site_rollup(site)
+        rows.append({
+            'site': site['id'], 'name': site['name'], 'status': status,
+            **{key: rollup[key] if rollup else None for key in ('as_of', 'students', 'incidents', 'abch', 'escalating_students')},
+        })
+        if rollup:
+            _add_counts(totals, {key: value for key, value in rollup.items() if isinstance(value, (int, dict))})
+    return {'sites': rows, 'totals': totals}
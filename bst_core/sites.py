@@ -0,0 +1,80 @@
+"""The centres (sites) the toolkit serves, and which one this process belongs to."""
+import json
+import os
+
+from .util import process_wide
+
+
+# --- Sites ---
+# Each centre is a shard with its own incident store file, Parquet archive, student roster and
+# staff list. It is served by its own server processes, whose caches and background workers
+# therefore only ever hold that site's data. BST_SITE selects a process's site (read when
+# bst_core is first imported); without it the process serves the first configured site.
+# Sites are listed in BST_SITES_FILE (default sites.json beside app.py), e.g.
+#
+#   [{"id": "cowandilla", "name": "Cowandilla Learning Centre"},
+#    {"id": "northfield", "name": "Northfield Centre", "students": "northfield_students.json",
+#     "staff": "northfield_staff.json"}]
+#
+# "store", "archive_dir", "students" and "staff" are optional paths, relative to the sites file.
+# A site without its own rosters uses the built-in mock rosters, and only such a site is seeded
+# with mock incidents. Adding a site adds a store file and server processes; nothing it does
+# touches another site's store. Regional dashboards combine the sites through the rollup each
+# one materializes (see bst_core.rollup), never through their incident rows.
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SITES_FILE = os.path.join(APP_DIR, 'sites.json')
+DEFAULT_SITE = {'id': 'cowandilla', 'name': 'Cowandilla Learning Centre'}
+
+
+@process_wide
+def get_sites():
+    """The configured sites, in listed order, with their paths made absolute."""
+    path = os.environ.get('BST_SITES_FILE', DEFAULT_SITES_FILE)
+    if not os.path.exists(path):
+        return [dict(DEFAULT_SITE)]
+    with open(path, encoding='utf-8') as f:
+        sites = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for site in sites:
+        for key in ('store', 'archive_dir', 'students', 'staff'):
+            if site.get(key):
+                site[key] = os.path.join(base, site[key])
+    return sites
+
+def get_site(site_id):
+    """The site with this id, or None."""
+    return next((site for site in get_sites() if site['id'] == site_id), None)
+
+@process_wide
+def current_site():
+    """The site this process serves: BST_SITE, or the first configured site."""
+    site_id = os.environ.get('BST_SITE')
+    if not site_id:
+        return get_sites()[0]
+    site = get_site(site_id)
+    if site is None:
+        raise ValueError(f"BST_SITE={site_id!r} is not one of the configured sites: {', '.join(s['id'] for s in get_sites())}")
+    return site
+
+
+def site_store_path(site):
+    """
+    A site's SQLite store: BST_STORE_PATH for this process's own site if set, else its configured
+    "store", incidents.db for the original site, or incidents_<id>.db.
+    """
+    if site is current_site() and os.environ.get('BST_STORE_PATH'):
+        return os.environ['BST_STORE_PATH']
+    if site.get('store'):
+        return site['store']
+    if site['id'] == DEFAULT_SITE['id']:
+        return os.path.join(APP_DIR, 'incidents.db')
+    return os.path.join(APP_DIR, f"incidents_{site['id']}.db")
+
+def site_roster(site, kind, default):
+    """A site's 'students' or 'staff' list, read from its roster file, or `default` if it has none."""
+    path = site.get(kind)
+    if not path:
+        return default
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,1080 @@
+"""The shared SQLite incident store, school-term partitioning and the Parquet term archive."""
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+from .util import np, pa, pq, process_wide
+from .constants import DAYS, MOCK_STAFF, OUTCOME_FIELDS
+from .escalation import ESCALATION_WINDOW_DAYS, EscalationDetector
+from .metrics import get_metrics_registry
+from .sites import current_site, site_store_path
+from .records import (
+    CODED_FIELDS,
+    INCIDENT_VOCABULARIES,
+    MAX_INTERNED_TEXT,
+    Incident,
+    _intern,
+    generate_mock_incidents,
+    pack_text,
+    unpack_text,
+)
+from .text import (
+    TEXT_DICTIONARY_MAX_SAMPLES,
+    TEXT_DICTIONARY_RETRAIN_GROWTH,
+    TEXT_FIELDS,
+    get_text_codec,
+    train_text_dictionary,
+)
+from .indexes import (
+    CUBE_AXES,
+    HEATMAP_CELLS,
+    HEATMAP_SLOTS,
+    SIMILAR_INCIDENTS_K,
+    SimilarIncidentIndex,
+    cube_cell,
+    cube_decode,
+    cube_encode,
+    heatmap_cell,
+    read_archived_similarity_rows,
+)
+
+
+# --- School Terms ---
+# Incidents are partitioned by school term. Approximate South Australian term starts; the
+# holidays after a term belong to that term's partition.
+
+TERM_STARTS = [(1, 1), (4, 20), (7, 15), (10, 8)]  # (month, day) each term partition begins
+
+HISTORY_WINDOWS = {
+    'Current term': 'term',
+    'Last 12 months': 365,
+    'All history': None,
+}
+DEFAULT_HISTORY_WINDOW = 'Last 12 months'
+
+
+def term_of(day):
+    """(year, term) partition of a date."""
+    return day.year, sum(1 for start in TERM_STARTS if (day.month, day.day) >= start)
+
+def term_bounds(year, term):
+    """First and last date of a term partition."""
+    start = date(year, *TERM_STARTS[term - 1])
+    end = date(year, *TERM_STARTS[term]) - timedelta(days=1) if term < len(TERM_STARTS) else date(year, 12, 31)
+    return start, end
+
+def history_start(window, today=None):
+    """Date ordinal a HISTORY_WINDOWS window starts at, or None for all history."""
+    today = today or date.today()
+    span = HISTORY_WINDOWS[window]
+    if span is None:
+        return None
+    if span == 'term':
+        return term_bounds(*term_of(today))[0].toordinal()
+    return today.toordinal() - span
+
+
+# --- Shared Incident Store ---
+# Incidents live in a SQLite database in WAL mode so that several Streamlit server processes
+# can share them. Every commit bumps the single-row store_version table and stamps its rows
+# with that version (seq). Each process keeps a local list of Incident records plus a few
+# incrementally maintained aggregates, and on each rerun pulls only rows with seq greater
+# than the last version it has seen.
+
+# The store file is this process's site's (see bst_core.sites.site_store_path), resolved when first opened
+STORE_POLL_INTERVAL = 1.0  # Seconds between version checks against the shared database
+ARCHIVE_CACHE_SIZE = 32  # (file, student) slices of archived terms kept loaded
+
+STORE_COLUMNS = [
+    'id', 'student_id', 'date', 'time', 'risk_level', 'outcomes', 'is_abch_completed',
+    'logged_by', 'other_staff', 'context', 'notes', 'how_to_respond', 'group_id',
+] + CODED_FIELDS
+TEXT_COLUMNS = [STORE_COLUMNS.index(field) for field in TEXT_FIELDS]  # Held as pack_text() values (see bst_core.text)
+
+STORE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS incidents (
+    id BLOB PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    student_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    risk_level INTEGER NOT NULL,
+    outcomes INTEGER NOT NULL DEFAULT 0,
+    is_abch_completed INTEGER NOT NULL DEFAULT 0,
+    logged_by TEXT,
+    other_staff TEXT,
+    context TEXT,
+    notes TEXT,
+    how_to_respond TEXT,
+    group_id BLOB,
+    {', '.join(f'{field} TEXT' for field in CODED_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_seq ON incidents (seq);
+CREATE INDEX IF NOT EXISTS idx_incidents_date ON incidents (date);
+CREATE TABLE IF NOT EXISTS archive_files (
+    path TEXT PRIMARY KEY,
+    partition TEXT NOT NULL,
+    first_ordinal INTEGER NOT NULL,
+    last_ordinal INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    aggregates TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS incident_staff (
+    incident_id BLOB NOT NULL,
+    staff_id TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    date_ordinal INTEGER NOT NULL,
+    risk_level INTEGER NOT NULL,
+    staff_injury INTEGER NOT NULL,
+    PRIMARY KEY (incident_id, staff_id, display_name)
+);
+CREATE INDEX IF NOT EXISTS idx_incident_staff_staff ON incident_staff (staff_id, date_ordinal);
+CREATE TABLE IF NOT EXISTS alert_outbox (
+    student_id TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    date_ordinal INTEGER NOT NULL,
+    incident_id BLOB NOT NULL,
+    value REAL NOT NULL,
+    message TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    claimed_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dispatched_at TEXT,
+    PRIMARY KEY (student_id, rule, date_ordinal)
+);
+CREATE INDEX IF NOT EXISTS idx_alert_outbox_pending ON alert_outbox (dispatched_at, created_at);
+CREATE TABLE IF NOT EXISTS materialized (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    computed_on INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE TABLE IF NOT EXISTS text_dictionaries (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    trained_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0);
+"""
+METRICS = get_metrics_registry()
+INCIDENTS_COMMITTED = METRICS.counter('bst_incidents_committed_total', "Incidents committed by this process")
+ABCH_COMPLETIONS = METRICS.counter('bst_abch_completions_total', "ABCH follow-ups completed in this process (new or upgraded logs)")
+STORE_WRITE_SECONDS = METRICS.histogram('bst_store_write_seconds', "Store write transactions, including the wait for the write lock", ['operation'])
+
+# Columns added after the first release, applied to older store files on open
+STORE_MIGRATIONS = [
+    ('group_id', 'BLOB'),
+]
+
+
+def incident_to_row(incident, seq):
+    """Flattens an Incident record into a store row (vocabulary values are stored as text, long free text compressed)."""
+    return (
+        incident.uid, seq, incident.student_id, incident['date'], incident['time'], incident.risk_level,
+        incident.outcomes, int(incident.is_abch_completed), incident.logged_by, json.dumps(list(incident.other_staff)),
+        incident.context, incident.notes, incident.how_to_respond, incident.group_id,
+        *(INCIDENT_VOCABULARIES[field].decode(getattr(incident, f"{field}_code")) for field in CODED_FIELDS)
+    )
+
+def incident_from_row(row):
+    """Rebuilds an Incident record from a store row (columns in STORE_COLUMNS order)."""
+    (uid, student_id, date_text, time_text, risk_level, outcomes, is_abch_completed,
+     logged_by, other_staff, context, notes, how_to_respond, group_id, *coded_values) = row
+    return Incident(
+        uid=bytes(uid),
+        student_id=_intern(student_id),
+        date_ordinal=datetime.strptime(date_text, '%Y-%m-%d').toordinal(),
+        minute=int(time_text[:2]) * 60 + int(time_text[3:5]),
+        codes=tuple(INCIDENT_VOCABULARIES[field].encode(value) for field, value in zip(CODED_FIELDS, coded_values)),
+        risk_level=risk_level,
+        outcomes=outcomes,
+        is_abch_completed=bool(is_abch_completed),
+        logged_by=_intern(logged_by),
+        other_staff=tuple(_intern(s) for s in json.loads(other_staff or '[]')),
+        context=pack_text(context),
+        notes=pack_text(notes),
+        how_to_respond=pack_text(how_to_respond),
+        group_id=bytes(group_id) if group_id else None,
+    )
+
+
+# Staff involvement is normalized into incident_staff, one row per staff member per incident
+# (role 'logged_by' or 'other_staff'), written in the same transaction as the incident. The
+# date, risk level and staff-injury flag are copied onto each row so per-staff analytics are
+# a single indexed query, and the rows are kept when their incidents are archived.
+STAFF_INJURY_BIT = OUTCOME_FIELDS.index('outcome_staff_injury')
+
+
+def parse_staff_ref(ref):
+    """(staff_id, display_name) of a logged_by/other_staff entry: a staff id, or 'id:Name' for special roles."""
+    staff_id, _, name = ref.partition(':')
+    if not name:
+        name = next((s['name'] for s in MOCK_STAFF if s['id'] == staff_id), staff_id)
+    return staff_id, name.strip()
+
+def incident_staff_rows(incident):
+    """incident_staff rows for a record: whoever logged it, then every other staff member involved."""
+    facts = (incident.date_ordinal, incident.risk_level, incident.outcomes >> STAFF_INJURY_BIT & 1)
+    refs = [(incident.logged_by, 'logged_by')] if incident.logged_by else []
+    refs += [(ref, 'other_staff') for ref in incident.other_staff]
+    return [(incident.uid, *parse_staff_ref(ref), role, *facts) for ref, role in refs]
+
+
+def archive_schema():
+    """Arrow schema of an archived term file (the store columns)."""
+    types = {
+        'id': pa.binary(), 'group_id': pa.binary(),
+        'risk_level': pa.int64(), 'outcomes': pa.int64(), 'is_abch_completed': pa.int64(),
+    }
+    return pa.schema([(column, types.get(column, pa.string())) for column in STORE_COLUMNS])
+
+def write_archive_file(path, rows):
+    """Writes store rows (STORE_COLUMNS order, sorted by student) to a zstd Parquet file, atomically."""
+    # Archived text is stored plain: Parquet compresses the column, and the file stays readable without the dictionaries
+    rows = [
+        tuple(unpack_text(value) if n in TEXT_COLUMNS else value for n, value in enumerate(row))
+        for row in rows
+    ]
+    table = pa.Table.from_arrays(
+        [pa.array(list(values), type=field.type) for values, field in zip(zip(*rows), archive_schema())],
+        schema=archive_schema()
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, path + '.tmp', compression='zstd', row_group_size=16384)
+    os.replace(path + '.tmp', path)
+
+def read_archive_file(path, student_id=None, columns=STORE_COLUMNS):
+    """Reads store rows back from an archived term file, optionally only one student's."""
+    filters = [('student_id', '=', student_id)] if student_id else None
+    table = pq.read_table(path, columns=columns, filters=filters)
+    return list(zip(*(table.column(column).to_pylist() for column in columns)))
+
+def summarize_archived(incidents):
+    """Per-student aggregates of an archived term, stored with its file so it never has to be reloaded for totals."""
+    aggregates = {}
+    for incident in incidents:
+        student = aggregates.setdefault(incident.student_id, {
+            'incidents': 0, 'abch': 0, 'peak_risk': 0, 'last_ordinal': 0, 'behaviours': {}, 'heatmap': {}, 'cube': {}
+        })
+        student['incidents'] += 1
+        student['abch'] += incident.is_abch_completed
+        student['peak_risk'] = max(student['peak_risk'], incident.risk_level)
+        student['last_ordinal'] = max(student['last_ordinal'], incident.date_ordinal)
+        behaviour = incident['behaviour']
+        student['behaviours'][behaviour] = student['behaviours'].get(behaviour, 0) + 1
+        cell = heatmap_cell(incident)
+        if cell is not None:
+            student['heatmap'][str(cell)] = student['heatmap'].get(str(cell), 0) + 1
+        cell = cube_cell(incident)
+        student['cube'][cell] = student['cube'].get(cell, 0) + 1
+    for student in aggregates.values():
+        # Cube cells are stored by value, since codes of values interned at runtime differ between processes
+        student['cube'] = [
+            [[cube_decode(dimension, code) for dimension, code in zip(CUBE_AXES, cell)], count]
+            for cell, count in student['cube'].items()
+        ]
+    return aggregates
+
+
+class IncidentNotFound(KeyError):
+    """An edit targets an incident that is no longer in the active store (archived or removed)."""
+
+
+class IncidentStore:
+    """
+    Process-local view of the shared incident database, refreshed incrementally by version.
+    
+    Only the active (not yet archived) terms are held in memory. Archived terms contribute to
+    the aggregates through the totals stored with their files, and their records are loaded
+    per student only when a query's date range reaches back into them.
+    """
+
+    def __init__(self, path, archive_dir=None):
+        self.path = path
+        # Closed terms are compacted here as zstd-compressed Parquet files
+        self.archive_dir = archive_dir or os.environ.get('BST_ARCHIVE_DIR', os.path.splitext(path)[0] + '_archive')
+        self.incidents = []  # Active terms only; shared by every session in this process (sessions hold a reference)
+        self.version = 0     # Last store version applied locally
+        self.student_versions = {}  # Store version of each student's latest change
+        self.counts_by_student = {}
+        self.abch_count = 0
+        self._by_id = {}         # Incident uid -> record, for O(1) lookup and in-place updates
+        self._open_abch = {}     # Per student: uids of risk 3+ records still awaiting ABCH completion
+        self._heatmap_pending = {}  # Per student: heatmap cells of records not yet folded into its matrix
+        self._heatmap_archived = {}  # Per student: {cell: count} from archived terms, not yet folded in
+        self._heatmaps = {}
+        self._cubes = {}  # Per student: {cube cell: count}, see cube_cell()
+        self._similar = SimilarIncidentIndex()
+        self.escalation = EscalationDetector()
+        self.on_alerts = None  # Called after alerts are queued (the dispatcher's wake-up)
+        self.last_commit_at = None  # Unix time of this process's latest write
+        self.archive_files = []  # (path, partition, first_ordinal, last_ordinal, row_count, aggregates) by date
+        self._archive_cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._last_poll = 0.0
+        self.text_codec = get_text_codec()
+        self.text_codec.loader = self._text_dictionary
+        conn = self._connect()
+        conn.executescript(STORE_SCHEMA)
+        self._migrate(conn)
+        self._load_text_dictionaries()
+
+    def _connect(self):
+        """Returns this thread's connection (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn):
+        """Adds any STORE_MIGRATIONS columns missing from a store created by an older release."""
+        existing = {row[1] for row in conn.execute('PRAGMA table_info(incidents)')}
+        for column, declaration in STORE_MIGRATIONS:
+            if column in existing:
+                continue
+            try:
+                conn.execute(f'ALTER TABLE incidents ADD COLUMN {column} {declaration}')
+            except sqlite3.OperationalError as e:
+                # Another worker starting at the same time may have added it first
+                if 'duplicate column' not in str(e):
+                    raise
+        self._backfill_staff(conn)
+
+    def _backfill_staff(self, conn):
+        """Fills incident_staff from the incidents (active and archived) of a store created before it existed."""
+        has_incidents = conn.execute(
+            'SELECT EXISTS (SELECT 1 FROM incidents) OR EXISTS (SELECT 1 FROM archive_files)'
+        ).fetchone()[0]
+        if not has_incidents or conn.execute('SELECT EXISTS (SELECT 1 FROM incident_staff)').fetchone()[0]:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._insert_all_staff(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _insert_all_staff(self, conn):
+        """Writes incident_staff rows for every active and archived incident (caller owns the transaction)."""
+        rows = conn.execute(f"SELECT {', '.join(STORE_COLUMNS)} FROM incidents").fetchall()
+        for (path,) in conn.execute('SELECT path FROM archive_files').fetchall():
+            rows += read_archive_file(path)
+        conn.executemany(
+            'INSERT OR IGNORE INTO incident_staff VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [staff_row for row in rows for staff_row in incident_staff_rows(incident_from_row(row))]
+        )
+
+    def rebuild_derived(self):
+        """
+        Recomputes each archived term's stored aggregates and the incident_staff table from the
+        incident rows themselves. Returns (archive files, staff rows) rewritten.
+
+        An offline repair (see the CLI's rebuild command): processes already running keep the
+        aggregates they loaded until they restart.
+        """
+        conn = self._connect()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                paths = [path for (path,) in conn.execute('SELECT path FROM archive_files').fetchall()]
+                for path in paths:
+                    aggregates = summarize_archived(incident_from_row(row) for row in read_archive_file(path))
+                    conn.execute('UPDATE archive_files SET aggregates = ? WHERE path = ?', (json.dumps(aggregates), path))
+                conn.execute('DELETE FROM incident_staff')
+                self._insert_all_staff(conn)
+                staff_rows = conn.execute('SELECT COUNT(*) FROM incident_staff').fetchone()[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return len(paths), staff_rows
+
+    def _text_dictionary(self, dictionary_id):
+        row = self._connect().execute('SELECT data FROM text_dictionaries WHERE id = ?', (dictionary_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No text dictionary {dictionary_id} in {self.path}")
+        return row[0]
+
+    def _load_text_dictionaries(self):
+        """Adds dictionaries trained (by any process) since the newest one this process has."""
+        for dictionary_id, data in self._connect().execute(
+            'SELECT id, data FROM text_dictionaries WHERE id > ? ORDER BY id', (self.text_codec.current,)
+        ).fetchall():
+            self.text_codec.add_dictionary(dictionary_id, data)
+
+    def train_text_dictionary(self):
+        """
+        Trains a new free-text dictionary on the newest long text (active terms first) once there is
+        TEXT_DICTIONARY_RETRAIN_GROWTH times as much as the last one was trained on, then
+        recompresses the stored text with it. Returns (dictionary id, samples, rows recompressed),
+        or None if no dictionary was trained.
+
+        Rows keep their version: their content is unchanged, and other processes still hold
+        frames of the older dictionaries, which stay readable. The growth check is repeated in the
+        inserting transaction, so if several processes train at once only the first one's
+        dictionary is stored and the text is recompressed once.
+        """
+        conn = self._connect()
+        with self._lock:
+            samples = [
+                unpack_text(value) for incident in reversed(self.incidents)
+                for value in (incident.context, incident.notes, incident.how_to_respond)
+                if isinstance(value, bytes) or (value and len(value) > MAX_INTERNED_TEXT)
+            ]
+            # Topped up from the newest archived terms, whose text is stored plain
+            for path, *_ in reversed(self.archive_files):
+                if len(samples) >= TEXT_DICTIONARY_MAX_SAMPLES:
+                    break
+                samples += [value for row in read_archive_file(path, columns=list(TEXT_FIELDS))
+                            for value in row if value and len(value) > MAX_INTERNED_TEXT]
+            samples = samples[:TEXT_DICTIONARY_MAX_SAMPLES]
+            last = conn.execute('SELECT id, samples FROM text_dictionaries ORDER BY id DESC LIMIT 1').fetchone()
+            if last and len(samples) < last[1] * TEXT_DICTIONARY_RETRAIN_GROWTH:
+                return None
+            data = train_text_dictionary(samples)
+            if data is None:
+                return None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process (or the cron job) may have stored a dictionary while this one trained
+                newest = conn.execute('SELECT id, samples FROM text_dictionaries ORDER BY id DESC LIMIT 1').fetchone()
+                if newest != last:
+                    conn.execute('ROLLBACK')
+                    self._load_text_dictionaries()
+                    return None
+                dictionary_id = conn.execute(
+                    'INSERT INTO text_dictionaries (data, samples, trained_at) VALUES (?, ?, ?)',
+                    (data, len(samples), datetime.now().isoformat(timespec='seconds'))
+                ).lastrowid
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._load_text_dictionaries()
+            return dictionary_id, len(samples), self._recompress_text()
+
+    def _recompress_text(self):
+        """Rewrites the active rows' long text with the current dictionary, in the store and in memory."""
+        conn = self._connect()
+        rows = conn.execute(f"SELECT id, seq, {', '.join(TEXT_FIELDS)} FROM incidents").fetchall()
+        repacked = []
+        for uid, seq, *values in rows:
+            values = [bytes(value) if isinstance(value, bytes) else value for value in values]
+            texts = [unpack_text(value) for value in values]
+            packed = [pack_text(text) for text in texts]
+            if packed != values:
+                repacked.append((bytes(uid), seq, texts, packed))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Rows rewritten by another process since they were read keep their new version's text
+            conn.executemany(
+                f"UPDATE incidents SET {', '.join(f'{field} = ?' for field in TEXT_FIELDS)} WHERE id = ? AND seq = ?",
+                [(*packed, uid, seq) for uid, seq, _, packed in repacked]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        for uid, _, texts, packed in repacked:
+            incident = self._by_id.get(uid)
+            if incident is not None and [incident[field] for field in TEXT_FIELDS] == texts:
+                for field, value in zip(TEXT_FIELDS, packed):
+                    setattr(incident, field, value)
+        return len(repacked)
+
+    def _add_archive_file(self, path, partition, first_ordinal, last_ordinal, row_count, aggregates, version):
+        """Registers an archived term file and adds its stored per-student totals to the aggregates."""
+        aggregates = json.loads(aggregates)
+        self.archive_files.append((path, partition, first_ordinal, last_ordinal, row_count, aggregates))
+        self.archive_files.sort(key=lambda f: (f[2], f[0]))
+        for student_id, totals in aggregates.items():
+            self.counts_by_student[student_id] = self.counts_by_student.get(student_id, 0) + totals['incidents']
+            self.abch_count += totals['abch']
+            self.student_versions[student_id] = max(version, self.student_versions.get(student_id, 0))
+            cells = self._heatmap_archived.setdefault(student_id, {})
+            for cell, count in totals['heatmap'].items():
+                cells[int(cell)] = cells.get(int(cell), 0) + count
+            cube = self._cubes.setdefault(student_id, {})
+            # Merged once, so the cells are not held a second time with the file's aggregates
+            for values, count in totals.pop('cube', ()):
+                cell = tuple(cube_encode(dimension, value) for dimension, value in zip(CUBE_AXES, values))
+                cube[cell] = cube.get(cell, 0) + count
+
+    def _drop_archived(self, path):
+        """Removes records moved into an archive file from the active list (their totals come with the file)."""
+        uids = {bytes(uid) for (uid,) in read_archive_file(path, columns=['id'])}
+        dropped = [self._by_id.pop(uid) for uid in uids if uid in self._by_id]
+        if not dropped:
+            return
+        for incident in dropped:
+            self._count(incident, -1)
+        self.incidents[:] = [i for i in self.incidents if i.uid not in uids]
+
+    def _count(self, incident, sign):
+        """Adds (sign=1) or retracts (sign=-1) one record's contribution to the local aggregates."""
+        student_id = incident.student_id
+        self.counts_by_student[student_id] = self.counts_by_student.get(student_id, 0) + sign
+        if incident.is_abch_completed:
+            self.abch_count += sign
+        elif incident.risk_level >= 3:
+            open_abch = self._open_abch.setdefault(student_id, set())
+            if sign > 0:
+                open_abch.add(incident.uid)
+            else:
+                open_abch.discard(incident.uid)
+        cell = heatmap_cell(incident)
+        if cell is not None:
+            pending = self._heatmap_pending.get(student_id)
+            if pending is None:
+                pending = self._heatmap_pending[student_id] = array('q')
+            # Retractions are recorded in a second block of cells and subtracted when folded in
+            pending.append(cell if sign > 0 else cell + HEATMAP_CELLS)
+        if sign > 0:
+            # Retracted records stay in the similarity index: they were updated (re-added here) or archived
+            self._similar.pending.append(incident)
+        cube = self._cubes.setdefault(student_id, {})
+        cell = cube_cell(incident)
+        count = cube.get(cell, 0) + sign
+        if count:
+            cube[cell] = count
+        else:
+            del cube[cell]
+
+    def _apply(self, incidents, version, seqs=None):
+        """
+        Appends newly seen records (or updates known ones in place) and adjusts the local aggregates.
+
+        seqs are the records' row versions (all `version` for a local commit). A student's version
+        is the newest row or archive file holding their records, so every process agrees on it.
+        """
+        for incident, seq in zip(incidents, seqs or [version] * len(incidents)):
+            existing = self._by_id.get(incident.uid)
+            previous = None
+            if existing is None:
+                self._by_id[incident.uid] = incident
+                self.incidents.append(incident)
+            else:
+                # Updated row: swap its old contribution for the new one and rewrite the record in place
+                self._count(existing, -1)
+                self.student_versions[existing.student_id] = max(seq, self.student_versions.get(existing.student_id, 0))
+                previous = copy.copy(existing)
+                existing.update_from(incident)
+                incident = existing
+            self._count(incident, 1)
+            self.student_versions[incident.student_id] = max(seq, self.student_versions.get(incident.student_id, 0))
+            # Alerts were queued by the writing process, with the record (see _queue_alerts)
+            self.escalation.observe(incident, previous)
+        self.version = version
+
+    def _queue_alerts(self, conn, changes):
+        """
+        Queues the escalation rules that (record, previous record or None) changes trip in the
+        outbox, in the caller's write transaction, so a record is never stored without its alerts.
+        The windows must already hold every earlier record. Returns the number queued.
+        """
+        tripped = self.escalation.preview(changes, date.today().toordinal())
+        created_at = datetime.now().isoformat(timespec='seconds')
+        conn.executemany(
+            'INSERT OR IGNORE INTO alert_outbox (student_id, rule, date_ordinal, incident_id, value, message, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(incident.student_id, rule, incident.date_ordinal, incident.id, value, message, created_at)
+             for incident, rule, value, message in tripped]
+        )
+        return len(tripped)
+
+    def get_incident(self, incident_id):
+        """The record with this id (uuid string), or None."""
+        return self._by_id.get(uuid.UUID(incident_id).bytes)
+
+    def latest_open_abch(self, student_id):
+        """The student's most recent risk 3+ record that has not had its ABCH follow-up completed, or None."""
+        with self._lock:
+            candidates = [self._by_id[uid] for uid in self._open_abch.get(student_id, ())]
+        return max(candidates, key=lambda i: (i.date_ordinal, i.minute), default=None)
+
+    def student_version(self, student_id):
+        return self.student_versions.get(student_id, 0)
+
+    def student_heatmap(self, student_id):
+        """The student's weekday × slot incident counts (read-only), folding in records applied since the last read."""
+        with self._lock:
+            matrix = self._heatmaps.get(student_id)
+            if matrix is None:
+                matrix = np.zeros((len(DAYS), HEATMAP_SLOTS), dtype=np.int64)
+            archived = self._heatmap_archived.pop(student_id, None)
+            if archived:
+                cells = np.fromiter(archived.keys(), dtype=np.int64, count=len(archived))
+                weights = np.fromiter(archived.values(), dtype=np.int64, count=len(archived))
+                matrix = matrix + np.bincount(cells, weights, minlength=HEATMAP_CELLS).astype(np.int64).reshape(matrix.shape)
+            pending = self._heatmap_pending.pop(student_id, None)
+            if pending:
+                counts = np.bincount(np.frombuffer(pending, dtype=np.int64), minlength=2 * HEATMAP_CELLS)
+                delta = counts[:HEATMAP_CELLS] - counts[HEATMAP_CELLS:]
+                # A new array each time, so matrices handed out earlier never change underneath a reader
+                matrix = matrix + delta.reshape(matrix.shape)
+            matrix.flags.writeable = False
+            self._heatmaps[student_id] = matrix
+            return matrix
+
+    def heatmap(self, student_ids):
+        """Summed heatmap of several students (an area or the whole school)."""
+        return sum((self.student_heatmap(student_id) for student_id in student_ids),
+                   np.zeros((len(DAYS), HEATMAP_SLOTS), dtype=np.int64))
+
+    def pivot(self, rows, columns, student_ids, filters=None):
+        """
+        Incident counts by (rows code, columns code) over the students' cubes, all history.
+        
+        filters maps a dimension to the codes to keep, e.g. {'risk_level': {4, 5}}.
+        """
+        row_axis, column_axis = CUBE_AXES.index(rows), CUBE_AXES.index(columns)
+        conditions = [(CUBE_AXES.index(dimension), codes) for dimension, codes in (filters or {}).items()]
+        counts = {}
+        with self._lock:
+            for student_id in student_ids:
+                for cell, count in self._cubes.get(student_id, {}).items():
+                    if all(cell[axis] in codes for axis, codes in conditions):
+                        key = (cell[row_axis], cell[column_axis])
+                        counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def similar_incidents(self, incident, k=SIMILAR_INCIDENTS_K, require_plan=False):
+        """
+        (score, record) of the k past incidents most similar to a record (e.g. a draft), across
+        the whole school's history. require_plan keeps only incidents with a written plan.
+        """
+        with self._lock:
+            for path, *_ in list(self.archive_files):
+                if path not in self._similar.archives:
+                    self._similar.add(*read_archived_similarity_rows(path))
+                    self._similar.archives.add(path)
+            matches = self._similar.query(incident, k, require_plan)
+        return [(score, self._find(uid, student_id, ordinal)) for uid, student_id, ordinal, score in matches]
+
+    def _find(self, uid, student_id, date_ordinal):
+        """A record by uid, active or archived (only the student's slice of the term holding it is loaded)."""
+        incident = self._by_id.get(uid)
+        if incident is not None:
+            return incident
+        for path, _, first_ordinal, last_ordinal, _, aggregates in list(self.archive_files):
+            if first_ordinal <= date_ordinal <= last_ordinal and student_id in aggregates:
+                incident = next((i for i in self._load_archived(path, student_id) if i.uid == uid), None)
+                if incident is not None:
+                    return incident
+        return None
+
+    def student_incidents(self, student_id, since_ordinal=None):
+        """A student's records from since_ordinal on (all history if None), loading archived terms only as needed."""
+        return self.students_incidents([student_id], since_ordinal)
+
+    def students_incidents(self, student_ids, since_ordinal=None):
+        """Several students' records from since_ordinal on, in one pass over the active terms."""
+        wanted = set(student_ids)
+        incidents = [
+            i for i in self.incidents
+            if i.student_id in wanted and (since_ordinal is None or i.date_ordinal >= since_ordinal)
+        ]
+        for path, _, _, last_ordinal, _, aggregates in list(self.archive_files):
+            if since_ordinal is not None and last_ordinal < since_ordinal:
+                continue
+            for student_id in student_ids:
+                if student_id in aggregates:
+                    archived = self._load_archived(path, student_id)
+                    incidents.extend(i for i in archived if since_ordinal is None or i.date_ordinal >= since_ordinal)
+        return incidents
+
+    def existing_ids(self, uids):
+        """Those of these incident uids (16 bytes) already stored, in the active table or an archived term."""
+        uids = list(set(uids))
+        found = set()
+        conn = self._connect()
+        for start in range(0, len(uids), 500):  # Within SQLite's bound-parameter limit
+            batch = uids[start:start + 500]
+            found.update(bytes(uid) for (uid,) in conn.execute(
+                f"SELECT id FROM incidents WHERE id IN ({', '.join('?' * len(batch))})", batch
+            ))
+        wanted = set(uids)
+        for path, *_ in list(self.archive_files):
+            found.update(uid for (uid,) in read_archive_file(path, columns=['id']) if uid in wanted)
+        return found
+
+    def _load_archived(self, path, student_id):
+        """One student's records from an archived term file, via a small LRU of loaded slices."""
+        key = (path, student_id)
+        with self._lock:
+            if key in self._archive_cache:
+                self._archive_cache.move_to_end(key)
+                return self._archive_cache[key]
+        incidents = [incident_from_row(row) for row in read_archive_file(path, student_id)]
+        with self._lock:
+            self._archive_cache[key] = incidents
+            while len(self._archive_cache) > ARCHIVE_CACHE_SIZE:
+                self._archive_cache.popitem(last=False)
+        return incidents
+
+    def archived_totals(self, student_id):
+        """The stored totals of every archived term for a student, oldest first."""
+        return [aggregates[student_id] for *_, aggregates in self.archive_files if student_id in aggregates]
+
+    @property
+    def total_incidents(self):
+        return sum(self.counts_by_student.values())
+
+    def staff_workload(self, since_ordinal=None):
+        """
+        Per staff member (and display name, for special roles): incidents involved in, incidents
+        logged, risk 3+ incidents, staff injuries and last involvement ordinal, from since_ordinal on.
+        """
+        return self._connect().execute(
+            "SELECT staff_id, display_name, COUNT(*), SUM(role = 'logged_by'), SUM(risk_level >= 3), "
+            "SUM(staff_injury), MAX(date_ordinal) FROM incident_staff WHERE date_ordinal >= ? "
+            "GROUP BY staff_id, display_name",
+            (since_ordinal or 0,)
+        ).fetchall()
+
+    def staff_weekly_exposure(self, since_ordinal=None):
+        """Per staff member and week (ordinal of its Monday): incidents, risk 3+ incidents and staff injuries."""
+        return self._connect().execute(
+            "SELECT staff_id, display_name, (date_ordinal - 1) / 7 * 7 + 1 AS week, COUNT(*), "
+            "SUM(risk_level >= 3), SUM(staff_injury) FROM incident_staff WHERE date_ordinal >= ? "
+            "GROUP BY staff_id, display_name, week",
+            (since_ordinal or 0,)
+        ).fetchall()
+
+    def claim_alerts(self, limit, lease_seconds):
+        """
+        Leases up to `limit` undispatched alerts to the caller for lease_seconds, oldest first.
+        An alert whose lease runs out before it is marked dispatched is handed out again.
+        """
+        conn = self._connect()
+        now = datetime.now().timestamp()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT rowid, student_id, rule, date_ordinal, incident_id, value, message, created_at, attempts '
+                'FROM alert_outbox WHERE dispatched_at IS NULL AND (claimed_until IS NULL OR claimed_until < ?) '
+                'ORDER BY created_at LIMIT ?', (now, limit)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE alert_outbox SET claimed_until = ?, attempts = attempts + 1 WHERE rowid = ?',
+                [(now + lease_seconds, row[0]) for row in rows]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def mark_alerts_dispatched(self, rowids):
+        conn = self._connect()
+        conn.executemany(
+            'UPDATE alert_outbox SET dispatched_at = ? WHERE rowid = ?',
+            [(datetime.now().isoformat(timespec='seconds'), rowid) for rowid in rowids]
+        )
+
+    def recent_alerts(self, limit=50):
+        """The newest alerts, dispatched or not: (student_id, rule, date_ordinal, message, created_at, attempts, dispatched_at)."""
+        return self._connect().execute(
+            'SELECT student_id, rule, date_ordinal, message, created_at, attempts, dispatched_at '
+            'FROM alert_outbox ORDER BY created_at DESC, rowid DESC LIMIT ?', (limit,)
+        ).fetchall()
+
+    def claim_lease(self, name, holder, lease_seconds):
+        """
+        Takes the named lease for holder for lease_seconds if it is free, expired or already
+        holder's, so that one of several processes does a job. Returns True if holder now has it.
+        """
+        now = datetime.now().timestamp()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT holder, expires_at FROM leases WHERE name = ?', (name,)).fetchone()
+            claimed = row is None or row[0] == holder or row[1] < now
+            if claimed:
+                conn.execute('INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)',
+                             (name, holder, now + lease_seconds))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return claimed
+
+    def release_lease(self, name, holder):
+        """Gives up the named lease if holder still has it, so the next claim need not wait for it to expire."""
+        self._connect().execute('DELETE FROM leases WHERE name = ? AND holder = ?', (name, holder))
+
+    def get_materialized(self, kind, key, version):
+        """A payload precomputed from data at `version` (see bst_core.precompute), or None if missing or stale."""
+        row = self._connect().execute(
+            'SELECT payload FROM materialized WHERE kind = ? AND key = ? AND version = ?', (kind, key, version)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_materialized(self, kind, entries, computed_on, live_keys=None):
+        """
+        Stores (key, version, payload) entries of a kind computed on the computed_on date
+        ordinal. If live_keys is given, the kind's entries under any other key are dropped.
+        """
+        conn = self._connect()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if live_keys is not None:
+                    live_keys = set(live_keys)
+                    stale = [(kind, key) for (key,) in conn.execute('SELECT key FROM materialized WHERE kind = ?', (kind,))
+                             if key not in live_keys]
+                    conn.executemany('DELETE FROM materialized WHERE kind = ? AND key = ?', stale)
+                conn.executemany(
+                    'INSERT OR REPLACE INTO materialized (kind, key, version, computed_on, payload) VALUES (?, ?, ?, ?, ?)',
+                    [(kind, key, version, computed_on, payload) for key, version, payload in entries]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def remote_version(self):
+        return self._connect().execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+
+    def refresh(self, force=False):
+        """Pulls rows committed by any process since the last version seen here."""
+        now = datetime.now().timestamp()
+        if not force and now - self._last_poll < STORE_POLL_INTERVAL:
+            return
+        self._last_poll = now
+        if self.remote_version() == self.version:
+            return
+        with self._lock:
+            conn = self._connect()
+            # Read the version and the new rows in one read transaction so they are consistent
+            conn.execute('BEGIN')
+            try:
+                self._pull(conn)
+            finally:
+                conn.execute('COMMIT')
+
+    def _pull(self, conn):
+        """Applies the rows and archive files committed since this process's version (caller owns the transaction)."""
+        version = conn.execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+        if version == self.version:
+            return
+        rows = conn.execute(
+            f"SELECT seq, {', '.join(STORE_COLUMNS)} FROM incidents WHERE seq > ? ORDER BY seq",
+            (self.version,)
+        ).fetchall()
+        archive_files = conn.execute(
+            'SELECT path, partition, first_ordinal, last_ordinal, row_count, aggregates, version '
+            'FROM archive_files WHERE version > ? ORDER BY version', (self.version,)
+        ).fetchall()
+        self._load_text_dictionaries()
+        for archive_file in archive_files:
+            path, _, first_ordinal, last_ordinal = archive_file[:4]
+            # Only records this process already holds need dropping (none on a fresh start)
+            if any(first_ordinal <= i.date_ordinal <= last_ordinal for i in self.incidents):
+                self._drop_archived(path)
+            self._add_archive_file(*archive_file)
+        self._apply([incident_from_row(row[1:]) for row in rows], version, [row[0] for row in rows])
+
+    def _insert_version(self, conn, incidents):
+        """Bumps the store version and inserts the records under it (caller owns the transaction)."""
+        conn.execute('UPDATE store_version SET version = version + 1 WHERE id = 1')
+        version = conn.execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+        conn.executemany(
+            f"INSERT INTO incidents ({', '.join(['id', 'seq'] + STORE_COLUMNS[1:])}) "
+            f"VALUES ({', '.join('?' * (len(STORE_COLUMNS) + 1))})",
+            [incident_to_row(incident, version) for incident in incidents]
+        )
+        # A staff member named twice on one incident keeps their first (logged_by) row
+        conn.executemany(
+            'INSERT OR IGNORE INTO incident_staff VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [row for incident in incidents for row in incident_staff_rows(incident)]
+        )
+        return version
+
+    def commit(self, incidents):
+        """Writes a batch of records in one transaction as a single new store version."""
+        conn = self._connect()
+        started = perf_counter()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Catch up under the write lock, so the escalation windows hold every earlier record
+                self._pull(conn)
+                version = self._insert_version(conn, incidents)
+                alerts = self._queue_alerts(conn, [(incident, None) for incident in incidents])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            STORE_WRITE_SECONDS.observe(perf_counter() - started, 'commit')
+            INCIDENTS_COMMITTED.inc(amount=len(incidents))
+            ABCH_COMPLETIONS.inc(amount=sum(i.is_abch_completed for i in incidents))
+            self.last_commit_at = datetime.now().timestamp()
+            self._apply(incidents, version)
+        if alerts and self.on_alerts:
+            self.on_alerts()
+        return version
+
+    def update(self, incident):
+        """Rewrites an existing record (matched by id) as a new store version, in one transaction."""
+        conn = self._connect()
+        started = perf_counter()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._pull(conn)
+                existing = self._by_id.get(incident.uid)
+                completes_abch = incident.is_abch_completed and not (existing and existing.is_abch_completed)
+                conn.execute('UPDATE store_version SET version = version + 1 WHERE id = 1')
+                version = conn.execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+                uid, seq, *values = incident_to_row(incident, version)
+                cursor = conn.execute(
+                    f"UPDATE incidents SET seq = ?, {', '.join(f'{column} = ?' for column in STORE_COLUMNS[1:])} WHERE id = ?",
+                    (seq, *values, uid)
+                )
+                if cursor.rowcount != 1:
+                    raise IncidentNotFound(f"No stored incident with id {incident.id}")
+                conn.execute('DELETE FROM incident_staff WHERE incident_id = ?', (uid,))
+                conn.executemany('INSERT OR IGNORE INTO incident_staff VALUES (?, ?, ?, ?, ?, ?, ?)', incident_staff_rows(incident))
+                alerts = self._queue_alerts(conn, [(incident, existing)])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            STORE_WRITE_SECONDS.observe(perf_counter() - started, 'update')
+            if completes_abch:
+                ABCH_COMPLETIONS.inc()
+            self.last_commit_at = datetime.now().timestamp()
+            self._apply([incident], version)
+        if alerts and self.on_alerts:
+            self.on_alerts()
+        return version
+
+    def archive_closed_terms(self, today=None):
+        """
+        Compacts every term before the current one into a zstd Parquet file with its totals,
+        and removes those rows from the active table. Returns the partitions archived.
+        
+        A term is kept active until it ended ESCALATION_WINDOW_DAYS ago, so the escalation
+        windows, built from active records, still see its last weeks. Rows logged later into an
+        archived term are compacted into a further file next time.
+        """
+        today = today or date.today()
+        current_start = term_bounds(*term_of(today))[0]
+        window_start = today - timedelta(days=ESCALATION_WINDOW_DAYS)
+        conn = self._connect()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                closed_dates = [d for (d,) in conn.execute('SELECT DISTINCT date FROM incidents WHERE date < ?', (current_start.isoformat(),))]
+                partitions = sorted(
+                    partition for partition in {term_of(date.fromisoformat(d)) for d in closed_dates}
+                    if term_bounds(*partition)[1] < window_start
+                )
+                if partitions:
+                    conn.execute('UPDATE store_version SET version = version + 1 WHERE id = 1')
+                    version = conn.execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+                for year, term in partitions:
+                    start, end = term_bounds(year, term)
+                    bounds = (start.isoformat(), end.isoformat())
+                    rows = conn.execute(
+                        f"SELECT {', '.join(STORE_COLUMNS)} FROM incidents WHERE date BETWEEN ? AND ? ORDER BY student_id, date, time",
+                        bounds
+                    ).fetchall()
+                    partition = f"{year}-T{term}"
+                    path = os.path.join(self.archive_dir, f"{partition}-v{version}.parquet")
+                    write_archive_file(path, rows)
+                    conn.execute(
+                        'INSERT INTO archive_files (path, partition, first_ordinal, last_ordinal, row_count, version, aggregates) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (path, partition, start.toordinal(), end.toordinal(), len(rows), version,
+                         json.dumps(summarize_archived(incident_from_row(row) for row in rows)))
+                    )
+                    conn.execute('DELETE FROM incidents WHERE date BETWEEN ? AND ?', bounds)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if partitions:
+                self.refresh(force=True)
+        return [f"{year}-T{term}" for year, term in partitions]
+
+    def seed_if_empty(self, make_incidents):
+        """Seeds an empty store with make_incidents(); the write lock makes this safe when workers start together."""
+        conn = self._connect()
+        with self._lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT EXISTS (SELECT 1 FROM incidents) OR EXISTS (SELECT 1 FROM archive_files)').fetchone()[0] == 0:
+                    self._insert_version(conn, make_incidents())
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+
+def store_metrics(store):
+    """Store size and freshness samples for the metrics registry."""
+    file_bytes = sum(os.path.getsize(path) for path in (store.path, store.path + '-wal') if os.path.exists(path))
+    samples = [
+        ('bst_store_incidents', 'gauge', "Incidents in the store, all terms", [({}, store.total_incidents)]),
+        ('bst_store_active_incidents', 'gauge', "Active-term incidents held in memory", [({}, len(store.incidents))]),
+        ('bst_store_archived_terms', 'gauge', "Terms compacted to Parquet", [({}, len(store.archive_files))]),
+        ('bst_store_file_bytes', 'gauge', "Size of the SQLite store and its WAL", [({}, file_bytes)]),
+        ('bst_store_version', 'gauge', "Store version last applied by this process", [({}, store.version)]),
+    ]
+    if store.last_commit_at:
+        samples.append(('bst_store_last_write_timestamp_seconds', 'gauge', "Unix time of this process's latest write",
+                        [({}, store.last_commit_at)]))
+    return samples
+
+@process_wide
+def get_incident_store():
+    """The incident store of this process's site, seeded with the mock incidents on first use if it has the mock rosters."""
+    site = current_site()
+    store = IncidentStore(site_store_path(site), site.get('archive_dir'))
+    METRICS.collector(functools.partial(store_metrics, store))
+    if not site.get('students'):
+        store.seed_if_empty(generate_mock_incidents)
+    store.refresh(force=True)
+    # Closed terms are compacted off the request path (see bst_core.precompute), so opening the
+    # store never imports pyarrow
+    return store
+
+def commit_incidents(new_incidents):
+    """Commits a batch of Incident records to the shared store in one transaction."""
+    get_incident_store().commit(new_incidents)
+
+def update_incident(incident_data):
+    """Writes an edited incident (same id) back to the shared store in place of the original.
+
+    Raises IncidentNotFound if the record was archived or removed since the form was opened.
+    """
+    get_incident_store().update(Incident.from_dict(incident_data))
@@ -0,0 +1,82 @@
+"""Dictionary-compressed storage of the long free-text incident fields."""
+import struct
+import threading
+
+from .util import LazyModule, process_wide
+
+zstd = LazyModule('zstandard')
+
+
+# --- Compressed Free Text ---
+# The narrative fields (context with the full ABCH chronology, notes, how_to_respond) are most
+# of an incident's size, yet only a BPP report or an opened incident reads them. Text longer
+# than records.MAX_INTERNED_TEXT is kept, in memory and in the store alike, as a zstd frame
+# compressed against a dictionary trained on the store's own narratives (so the stock phrases
+# of the ABCH forms cost a few bytes), prefixed with the dictionary's id (0 before the first
+# one is trained). It is decompressed only when the field is read. Dictionaries are kept in
+# the store so any process can read any frame; a new one is trained by the nightly precompute
+# once enough new text has accumulated, and applies to text compressed from then on.
+
+TEXT_FIELDS = ('context', 'notes', 'how_to_respond')
+TEXT_COMPRESSION_LEVEL = 9
+TEXT_DICTIONARY_SIZE = 16 * 1024
+TEXT_DICTIONARY_MIN_SAMPLES = 100  # Fewer long texts than this and there is too little to train on
+TEXT_DICTIONARY_MAX_SAMPLES = 20000
+TEXT_DICTIONARY_RETRAIN_GROWTH = 2  # Retrain once there are this many times the last dictionary's samples (up to the maximum)
+
+_HEADER = struct.Struct('<H')  # Dictionary id
+
+
+class TextCodec:
+    """Compresses text against the newest dictionary and decompresses frames of any dictionary."""
+
+    def __init__(self):
+        self.dictionaries = {}  # Dictionary id -> zstd.ZstdCompressionDict
+        self.current = 0        # Dictionary new text is compressed with
+        self.loader = None      # Called with an unknown dictionary id, returns its bytes (set by the store)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # zstandard's (de)compressors must not be shared between threads
+
+    def add_dictionary(self, dictionary_id, data):
+        with self._lock:
+            if dictionary_id not in self.dictionaries:
+                self.dictionaries[dictionary_id] = zstd.ZstdCompressionDict(bytes(data))
+            self.current = max(self.current, dictionary_id)
+
+    def _cached(self, kind, dictionary_id):
+        cache = self._local.__dict__.setdefault(kind, {})
+        codec = cache.get(dictionary_id)
+        if codec is None:
+            if dictionary_id and dictionary_id not in self.dictionaries:
+                self.add_dictionary(dictionary_id, self.loader(dictionary_id))
+            options = {'dict_data': self.dictionaries[dictionary_id]} if dictionary_id else {}
+            if kind == 'compressors':
+                codec = zstd.ZstdCompressor(level=TEXT_COMPRESSION_LEVEL, **options)
+            else:
+                codec = zstd.ZstdDecompressor(**options)
+            cache[dictionary_id] = codec
+        return codec
+
+    def compress(self, text):
+        dictionary_id = self.current
+        return _HEADER.pack(dictionary_id) + self._cached('compressors', dictionary_id).compress(text.encode('utf-8'))
+
+    def decompress(self, frame):
+        (dictionary_id,) = _HEADER.unpack_from(frame)
+        return self._cached('decompressors', dictionary_id).decompress(frame[_HEADER.size:]).decode('utf-8')
+
+
+@process_wide
+def get_text_codec():
+    """The process-wide codec, holding the dictionaries of the process's incident store."""
+    return TextCodec()
+
+
+def train_text_dictionary(samples):
+    """A dictionary (bytes) trained on text samples, or None if there is too little to train on."""
+    if len(samples) < TEXT_DICTIONARY_MIN_SAMPLES:
+        return None
+    try:
+        return zstd.train_dictionary(TEXT_DICTIONARY_SIZE, [s.encode('utf-8') for s in samples]).as_bytes()
+    except zstd.ZstdError:
+        return None
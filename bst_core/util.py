@@ -0,0 +1,42 @@
+"""Deferred imports for the heavy optional dependencies, and process-wide singletons."""
+import functools
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stands in for a heavy module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+# pandas and numpy are only needed by the analysis, import and reporting paths. Deferring them
+# (and plotly, which only the Streamlit analysis view imports) keeps the landing page's cold
+# start to streamlit plus the standard library.
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+pa = LazyModule('pyarrow')
+pq = LazyModule('pyarrow.parquet')
+
+
+def process_wide(factory):
+    """
+    Caches a zero-argument factory's result for the life of the process.
+
+    Stands in for st.cache_resource outside Streamlit: modules outlive script reruns, and
+    sessions starting together still build the object only once.
+    """
+    lock = threading.RLock()
+    instance = []
+
+    @functools.wraps(factory)
+    def wrapper():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+    return wrapper
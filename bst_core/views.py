@@ -0,0 +1,638 @@
+"""Derived views over the incident store (frames, rollups, pivots, CPI staging, BPP reports), cached by data version."""
+import functools
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, time, timedelta
+
+from .util import np, pd, process_wide
+from .constants import (
+    DAYS,
+    HOW_TO_RESPOND_DEFAULT,
+    MOCK_STAFF,
+    MOCK_STUDENTS,
+    RISK_LEVELS,
+    SESSIONS,
+    get_student,
+)
+from .records import INCIDENT_VOCABULARIES, WEEKDAYS, get_session_from_time, incidents_to_frame
+from .indexes import (
+    CUBE_DIMENSIONS,
+    HEATMAP_SLOTS,
+    HEATMAP_SLOT_MINUTES,
+    cube_decode,
+    cube_encode,
+    get_heatmap_slot_labels,
+)
+from .store import HISTORY_WINDOWS, get_incident_store, history_start
+from .metrics import get_metrics_registry
+from .forecast import SCHOOL_DAY_MINUTES, WATCH_LIST_SIZE, WATCH_LIST_THRESHOLD, get_forecast_worker
+
+
+# --- Data-Version Keyed Caching ---
+# Derived views (per-student frames, BPP content, CPI staging, area rollups) are cached on
+# (function, arguments, data versions). Versions come from the shared store, so a result is
+# reused until an incident for the relevant student(s) is committed by any process.
+
+CACHE_MAXSIZE = 256
+
+
+class VersionedCache:
+    """Size-bounded LRU cache holding one (versions, value) entry per argument tuple."""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, args, versions):
+        with self._lock:
+            entry = self._entries.get(args)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(args)
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+            return False, None
+
+    def put(self, args, versions, value):
+        with self._lock:
+            self._entries[args] = (versions, value)
+            self._entries.move_to_end(args)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'cache': self.name,
+            'entries': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+@process_wide
+def get_cache_registry():
+    """Process-wide registry of versioned caches (survives script reruns)."""
+    return {}
+
+def versioned_cache(versions, maxsize=CACHE_MAXSIZE):
+    """
+    Caches fn(*args) keyed on (function, args, versions(*args)).
+    
+    `versions` receives the same positional arguments and returns the data versions the
+    result depends on (e.g. the student's version in the incident store).
+    """
+    def decorator(fn):
+        registry = get_cache_registry()
+        cache = registry.setdefault(fn.__qualname__, VersionedCache(fn.__qualname__, maxsize))
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            current_versions = versions(*args)
+            found, value = cache.get(args, current_versions)
+            if not found:
+                value = fn(*args)
+                cache.put(args, current_versions, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def cache_stats():
+    """Hit/miss counters for every versioned cache, for tuning maxsize."""
+    return [cache.stats() for cache in get_cache_registry().values()]
+
+@get_metrics_registry().collector
+def cache_metrics():
+    """Versioned cache counters for the metrics registry."""
+    stats = cache_stats()
+    return [
+        ('bst_cache_hits_total', 'counter', "Versioned cache hits", [({'cache': s['cache']}, s['hits']) for s in stats]),
+        ('bst_cache_misses_total', 'counter', "Versioned cache misses", [({'cache': s['cache']}, s['misses']) for s in stats]),
+        ('bst_cache_evictions_total', 'counter', "Versioned cache LRU evictions", [({'cache': s['cache']}, s['evictions']) for s in stats]),
+        ('bst_cache_entries', 'gauge', "Entries held per versioned cache", [({'cache': s['cache']}, s['entries']) for s in stats]),
+    ]
+
+def student_data_version(student_id, *args):
+    return get_incident_store().student_version(student_id)
+
+def area_data_version(area):
+    store = get_incident_store()
+    return tuple(store.student_version(s['id']) for s in MOCK_STUDENTS if s['area'] == area)
+
+def global_data_version(*args):
+    return get_incident_store().version
+
+@versioned_cache(versions=student_data_version)
+def get_student_frame(student_id, since_ordinal=None):
+    """Returns a student's incidents from since_ordinal on as a DataFrame, most recent first. Cached: treat as read-only."""
+    df = incidents_to_frame(get_incident_store().student_incidents(student_id, since_ordinal), text=False)
+    df = df.sort_values(by=['date', 'time'], ascending=False).reset_index(drop=True)
+    # Derived column used by the analysis charts
+    df['is_abch_completed_label'] = np.where(df['is_abch_completed'], 'Critical Incident (ABCH) - Activated', 'Basic Log')
+    return df
+
+# Time-series buckets for the "Incidents Over Time" chart, finest first, as pandas resample rules
+TIME_SERIES_RESOLUTIONS = {
+    'Day': 'D',
+    'Week': 'W-MON',  # Weeks labelled by their Monday
+    'Month': 'MS',
+}
+MAX_CHART_POINTS = 120  # Upper bound on points sent to the browser per time-series chart
+
+@versioned_cache(versions=student_data_version)
+def get_student_time_series(student_id, since_ordinal=None):
+    """A student's incident counts per day, week and month (zero-filled), precomputed for every resolution."""
+    df = get_student_frame(student_id, since_ordinal)
+    if df.empty:
+        return {}
+    daily = pd.to_datetime(df['date'], format='%Y-%m-%d').value_counts().sort_index()
+    return {
+        resolution: daily.resample(rule, label='left', closed='left').sum().rename('Count')
+        for resolution, rule in TIME_SERIES_RESOLUTIONS.items()
+    }
+
+def select_time_resolution(time_series, max_points=MAX_CHART_POINTS):
+    """The finest resolution whose bucket count fits max_points, falling back to the coarsest."""
+    for resolution in TIME_SERIES_RESOLUTIONS:
+        if len(time_series[resolution]) <= max_points:
+            return resolution
+    return list(TIME_SERIES_RESOLUTIONS)[-1]
+
+@versioned_cache(versions=area_data_version)
+def get_area_rollup(area):
+    """Per-student incident rollup for an area: counts, ABCH logs, peak risk and last incident date."""
+    rollup = {}
+    area_students = {s['id'] for s in MOCK_STUDENTS if s['area'] == area}
+    for incident in get_incident_store().incidents:
+        if incident.student_id not in area_students:
+            continue
+        row = rollup.setdefault(incident.student_id, {'incidents': 0, 'abch': 0, 'peak_risk': 0, 'last_ordinal': 0})
+        row['incidents'] += 1
+        row['abch'] += incident.is_abch_completed
+        row['peak_risk'] = max(row['peak_risk'], incident.risk_level)
+        row['last_ordinal'] = max(row['last_ordinal'], incident.date_ordinal)
+    for student_id in area_students:
+        # Archived terms contribute the totals stored with their files
+        for totals in get_incident_store().archived_totals(student_id):
+            row = rollup.setdefault(student_id, {'incidents': 0, 'abch': 0, 'peak_risk': 0, 'last_ordinal': 0})
+            row['incidents'] += totals['incidents']
+            row['abch'] += totals['abch']
+            row['peak_risk'] = max(row['peak_risk'], totals['peak_risk'])
+            row['last_ordinal'] = max(row['last_ordinal'], totals['last_ordinal'])
+    for row in rollup.values():
+        row['last_incident'] = date.fromordinal(row.pop('last_ordinal')).isoformat()
+    return rollup
+
+@versioned_cache(versions=global_data_version, maxsize=8)
+def get_school_behaviour_counts():
+    """Incident counts per behaviour across all students, most frequent first."""
+    vocabulary = INCIDENT_VOCABULARIES['behaviour']
+    store = get_incident_store()
+    incidents = store.incidents
+    codes = np.fromiter((i.behaviour_code for i in incidents), dtype=np.int64, count=len(incidents))
+    counts = np.bincount(codes, minlength=len(vocabulary.values))
+    for *_, aggregates in store.archive_files:
+        for totals in aggregates.values():
+            for behaviour, count in totals['behaviours'].items():
+                code = vocabulary.encode(behaviour)
+                if code >= len(counts):
+                    counts = np.pad(counts, (0, code + 1 - len(counts)))
+                counts[code] += count
+    present = np.flatnonzero(counts)
+    return pd.Series(counts[present], index=[vocabulary.decode(code) for code in present], name='count').sort_values(ascending=False)
+
+def next_school_day(today):
+    """The next weekday after today."""
+    day = today + timedelta(days=1)
+    while day.weekday() >= len(DAYS):
+        day += timedelta(days=1)
+    return day
+
+def get_watch_list(student_ids):
+    """
+    The next school day's slots most likely to see a risk 4+ incident for these students, as
+    (day, frame) from the latest background forecast, or (day, None) before the first one is ready.
+    """
+    worker = get_forecast_worker()
+    forecast = worker.forecast
+    if forecast is None or forecast.version != get_incident_store().version:
+        worker.request()
+    day = next_school_day(date.today())
+    if forecast is None:
+        return day, None
+    slot_labels = get_heatmap_slot_labels()
+    school_slots = [
+        slot for slot in range(HEATMAP_SLOTS)
+        if SCHOOL_DAY_MINUTES[0] <= slot * HEATMAP_SLOT_MINUTES < SCHOOL_DAY_MINUTES[1]
+    ]
+    student_names = {s['id']: s['name'] for s in MOCK_STUDENTS}
+    rows = []
+    for student_id in student_ids:
+        index = forecast.student_index.get(student_id)
+        if index is None:
+            continue
+        p_high_risk = forecast.p_high_risk[index, day.weekday(), school_slots]
+        expected = forecast.expected[index, day.weekday(), school_slots]
+        for slot, p, rate in zip(school_slots, p_high_risk, expected):
+            if p >= WATCH_LIST_THRESHOLD:
+                rows.append({'Student': student_names.get(student_id, student_id), 'Time': slot_labels[slot],
+                             'Expected Incidents': round(float(rate), 2), 'P(Risk 4+)': round(float(p), 3)})
+    watch_list = pd.DataFrame(rows, columns=['Student', 'Time', 'Expected Incidents', 'P(Risk 4+)'])
+    return day, watch_list.sort_values('P(Risk 4+)', ascending=False, ignore_index=True).head(WATCH_LIST_SIZE)
+
+@versioned_cache(versions=global_data_version, maxsize=8)
+def get_staff_workload(since_ordinal=None):
+    """Per-staff involvement, high-risk exposure and staff injuries from since_ordinal on, busiest first."""
+    staff_roles = {s['id']: s['role'] for s in MOCK_STAFF}
+    rows = get_incident_store().staff_workload(since_ordinal)
+    workload = pd.DataFrame(rows, columns=['staff_id', 'Staff', 'Incidents', 'Logged', 'High Risk (3+)', 'Staff Injuries', 'last_ordinal'])
+    workload.insert(2, 'Role', workload['staff_id'].map(staff_roles).fillna('Other'))
+    workload['Injury Rate'] = (workload['Staff Injuries'] / workload['Incidents']).round(3)
+    workload['Last Involved'] = [date.fromordinal(int(o)).isoformat() for o in workload.pop('last_ordinal')]
+    return workload.sort_values(['Incidents', 'Staff'], ascending=[False, True], ignore_index=True)
+
+@versioned_cache(versions=global_data_version, maxsize=8)
+def get_staff_weekly_exposure(since_ordinal=None):
+    """Weekly incidents, risk 3+ incidents and staff injuries per staff member (one row per staff member and week)."""
+    rows = get_incident_store().staff_weekly_exposure(since_ordinal)
+    exposure = pd.DataFrame(rows, columns=['staff_id', 'Staff', 'week', 'Incidents', 'High Risk (3+)', 'Staff Injuries'])
+    exposure['Week'] = pd.to_datetime([date.fromordinal(int(o)) for o in exposure.pop('week')])
+    return exposure.sort_values(['Week', 'Staff'], ignore_index=True)
+
+def cube_scope_students(scope):
+    """Student ids covered by a pivot scope: 'School', an area code or a single student id."""
+    if scope == 'School':
+        return [s['id'] for s in MOCK_STUDENTS]
+    return [s['id'] for s in MOCK_STUDENTS if s['area'] == scope] or [scope]
+
+def cube_values(dimension):
+    """Every value a cube dimension can take, in display order."""
+    if dimension == 'session':
+        return list(SESSIONS)
+    if dimension == 'day':
+        return list(WEEKDAYS)
+    if dimension == 'risk_level':
+        return list(RISK_LEVELS)
+    return INCIDENT_VOCABULARIES[dimension].values[1:]
+
+def pivot_data_version(rows, columns, scope, filters=()):
+    store = get_incident_store()
+    if scope == 'School':
+        return store.version
+    return tuple(store.student_version(student_id) for student_id in cube_scope_students(scope))
+
+@versioned_cache(versions=pivot_data_version, maxsize=64)
+def get_incident_pivot(rows, columns, scope, filters=()):
+    """
+    Incident counts cross-tabulated rows × columns (CUBE_DIMENSIONS keys) over all history for a
+    scope (see cube_scope_students). filters is a tuple of (dimension, values) pairs. Rows and
+    columns follow vocabulary order; values with no incidents are left out.
+    """
+    counts = get_incident_store().pivot(
+        rows, columns, cube_scope_students(scope),
+        {dimension: {cube_encode(dimension, value) for value in values} for dimension, values in filters}
+    )
+    row_codes = sorted({row for row, _ in counts})
+    column_codes = sorted({column for _, column in counts})
+    row_index = {code: i for i, code in enumerate(row_codes)}
+    column_index = {code: i for i, code in enumerate(column_codes)}
+    matrix = np.zeros((len(row_codes), len(column_codes)), dtype=np.int64)
+    for (row, column), count in counts.items():
+        matrix[row_index[row], column_index[column]] = count
+
+    def labels(dimension, codes):
+        return pd.Index([str(cube_decode(dimension, code) or 'Not recorded') for code in codes], name=CUBE_DIMENSIONS[dimension])
+    return pd.DataFrame(matrix, index=labels(rows, row_codes), columns=labels(columns, column_codes))
+
+# Distributions compared side by side, each with one column per value shared by every student
+COMPARISON_DIMENSIONS = {'behaviour': 'Behaviour', 'setting': 'Setting', 'risk_level': 'Risk Level', 'time_slot': 'Time of Day'}
+
+def comparison_data_version(student_ids, *args):
+    store = get_incident_store()
+    return tuple(store.student_version(student_id) for student_id in student_ids)
+
+@versioned_cache(versions=comparison_data_version, maxsize=32)
+def get_student_comparison(student_ids, since_ordinal=None):
+    """
+    Incident distributions of several students (a tuple of ids) from since_ordinal on, as
+    {COMPARISON_DIMENSIONS key: DataFrame of counts, one row per student and one column per
+    value}. Every student has the same columns, so their charts can share axes: behaviours and
+    settings by overall frequency, all risk levels, and time slots over the span any incident
+    falls in. Built from one pass over the students' records and one grouped count per dimension.
+    """
+    incidents = get_incident_store().students_incidents(student_ids, since_ordinal)
+    count = len(incidents)
+    student_index = {student_id: n for n, student_id in enumerate(student_ids)}
+    owners = np.fromiter((student_index[i.student_id] for i in incidents), dtype=np.int64, count=count)
+    codes = {
+        'behaviour': np.fromiter((i.behaviour_code for i in incidents), dtype=np.int64, count=count),
+        'setting': np.fromiter((i.setting_code for i in incidents), dtype=np.int64, count=count),
+        'risk_level': np.fromiter((i.risk_level for i in incidents), dtype=np.int64, count=count),
+        'time_slot': np.fromiter((i.minute // HEATMAP_SLOT_MINUTES for i in incidents), dtype=np.int64, count=count),
+    }
+    # Labels are read after the codes, so a value interned meanwhile still has one
+    labels = {
+        'behaviour': [value or 'Not recorded' for value in INCIDENT_VOCABULARIES['behaviour'].values],
+        'setting': [value or 'Not recorded' for value in INCIDENT_VOCABULARIES['setting'].values],
+        'risk_level': list(range(max(RISK_LEVELS) + 1)),
+        'time_slot': get_heatmap_slot_labels(),
+    }
+    comparison = {}
+    for dimension, values in codes.items():
+        width = len(labels[dimension])
+        counts = np.bincount(owners * width + values, minlength=len(student_ids) * width).reshape(len(student_ids), width)
+        totals = counts.sum(axis=0)
+        if dimension == 'risk_level':
+            columns = np.array(RISK_LEVELS)
+        elif dimension == 'time_slot':
+            present = np.flatnonzero(totals)
+            columns = np.arange(present[0], present[-1] + 1) if present.size else present
+        else:
+            present = np.flatnonzero(totals)
+            columns = present[np.argsort(-totals[present], kind='stable')]
+        comparison[dimension] = pd.DataFrame(
+            counts[:, columns],
+            index=pd.Index(student_ids, name='student_id'),
+            columns=pd.Index([labels[dimension][code] for code in columns], name=COMPARISON_DIMENSIONS[dimension]),
+        )
+    return comparison
+
+
+# --- Behaviour Profile Plan Content Generation and Download ---
+
+# CPI Verbal Escalation Continuum staging rules, most severe first. A student is placed in the
+# first stage whose behaviours include their most frequent behaviour or whose min_peak_risk
+# their peak risk reaches; the last stage (no conditions) is the default.
+CPI_RULES = [
+    {
+        'stage': "High-Risk: Acting Out (Danger)",
+        'behaviours': ['Physical Aggression (Staff)', 'Self-Injurious Behaviour', 'Property Destruction'],
+        'min_peak_risk': 4,
+        'response': "Nonviolent Physical Crisis Intervention (where appropriate) followed by Therapeutic Rapport to restore the relationship immediately after the crisis.",
+    },
+    {
+        'stage': "Peak Risk: Defensive",
+        'behaviours': ['Aggression (Peer)', 'Elopement', 'Verbal Refusal'],
+        'min_peak_risk': 3,
+        'response': "Use Supportive language and Directive strategies (offering choices, clear limits) to guide the student toward an appropriate choice.",
+    },
+    {
+        'stage': "Low-Risk: Questioning / Refusal",
+        'behaviours': [],
+        'min_peak_risk': None,
+        'response': "Use Information Seeking and Challenging questions as opportunities for connection and teaching appropriate ways to communicate needs.",
+    },
+]
+CPI_STAGES = [rule['stage'] for rule in CPI_RULES]
+
+
+def determine_cpi_stage(behaviour, peak_risk):
+    """Maps a behaviour and peak risk level to a CPI Verbal Escalation Continuum stage and staff response."""
+    for rule in CPI_RULES:
+        if behaviour in rule['behaviours'] or (rule['min_peak_risk'] is not None and peak_risk >= rule['min_peak_risk']):
+            return rule['stage'], rule['response']
+    return CPI_RULES[-1]['stage'], CPI_RULES[-1]['response']
+
+def determine_cpi_stages(behaviours, peak_risks):
+    """Vectorized determine_cpi_stage: CPI_RULES indexes for arrays of most frequent behaviours and peak risks."""
+    conditions = [
+        np.isin(behaviours, rule['behaviours']) | (peak_risks >= rule['min_peak_risk'])
+        for rule in CPI_RULES[:-1]
+    ]
+    return np.select(conditions, np.arange(len(conditions)), default=len(CPI_RULES) - 1)
+
+def _mode(counts, decode=None):
+    """Most frequent key of a {key: count} dict; ties go to the smallest value, as with pandas mode()."""
+    if not counts:
+        return None
+    top = max(counts.values())
+    values = [decode(key) if decode else key for key, count in counts.items() if count == top]
+    return min(values)
+
+
+class StudentSummary:
+    """Summary statistics of one student's incidents, read by both the BPP report and the clinical interpretation."""
+    __slots__ = (
+        'total_incidents', 'abch_count', 'peak_risk', 'most_freq_behaviour', 'peak_day', 'peak_session',
+        'high_risk_setting', 'latest_plan_incident', 'cpi_stage', 'cpi_response', 'first_ordinal',
+    )
+
+    @classmethod
+    def from_incidents(cls, incidents):
+        """Computes every statistic in a single pass over a student's Incident records (at least one)."""
+        summary = cls()
+        summary.total_incidents = 0
+        summary.abch_count = 0
+        summary.peak_risk = 0
+        summary.first_ordinal = None  # Date of the oldest incident
+        behaviour_counts, day_counts, minute_counts, high_risk_setting_counts = {}, {}, {}, {}
+        latest, latest_abch = None, None
+        for incident in incidents:
+            summary.total_incidents += 1
+            summary.peak_risk = max(summary.peak_risk, incident.risk_level)
+            if summary.first_ordinal is None or incident.date_ordinal < summary.first_ordinal:
+                summary.first_ordinal = incident.date_ordinal
+            behaviour_counts[incident.behaviour_code] = behaviour_counts.get(incident.behaviour_code, 0) + 1
+            weekday = (incident.date_ordinal - 1) % 7
+            day_counts[weekday] = day_counts.get(weekday, 0) + 1
+            minute_counts[incident.minute] = minute_counts.get(incident.minute, 0) + 1
+            if incident.risk_level >= 4:
+                high_risk_setting_counts[incident.setting_code] = high_risk_setting_counts.get(incident.setting_code, 0) + 1
+            when = (incident.date_ordinal, incident.minute)
+            if latest is None or when > (latest.date_ordinal, latest.minute):
+                latest = incident
+            if incident.is_abch_completed:
+                summary.abch_count += 1
+                if latest_abch is None or when > (latest_abch.date_ordinal, latest_abch.minute):
+                    latest_abch = incident
+
+        session_counts = {}
+        for minute, count in minute_counts.items():
+            session = get_session_from_time(time(minute // 60, minute % 60))
+            session_counts[session] = session_counts.get(session, 0) + count
+
+        summary.most_freq_behaviour = _mode(behaviour_counts, INCIDENT_VOCABULARIES['behaviour'].decode)
+        summary.peak_day = _mode(day_counts, WEEKDAYS.__getitem__)
+        summary.peak_session = _mode(session_counts)
+        summary.high_risk_setting = _mode(high_risk_setting_counts, INCIDENT_VOCABULARIES['setting'].decode)
+        # The plan is driven by the latest ABCH-completed incident, else the latest incident
+        summary.latest_plan_incident = (latest_abch or latest).to_dict()
+        # Staged on the overall pattern (most frequent behaviour and peak risk) for both the report and the view
+        summary.cpi_stage, summary.cpi_response = determine_cpi_stage(summary.most_freq_behaviour, summary.peak_risk)
+        return summary
+
+
+@versioned_cache(versions=student_data_version)
+def get_student_summary(student_id, since_ordinal=None):
+    """Cached StudentSummary for a student's incidents from since_ordinal on, or None without incidents."""
+    incidents = get_incident_store().student_incidents(student_id, since_ordinal)
+    if not incidents:
+        return None
+    return StudentSummary.from_incidents(incidents)
+
+@versioned_cache(versions=global_data_version, maxsize=8)
+def get_cpi_roster(since_ordinal=None):
+    """
+    CPI stage of every student with incidents, most severe first, as a DataFrame.
+    
+    Rebuilt whenever any incident commits, but per-student summaries are reused from their
+    own cache, so only the students who changed are re-summarized before the batch staging.
+    """
+    rows = []
+    for student in MOCK_STUDENTS:
+        summary = get_student_summary(student['id'], since_ordinal)
+        if summary is not None:
+            rows.append((student['id'], student['name'], student['area'], summary.most_freq_behaviour,
+                         summary.peak_risk, summary.total_incidents, summary.abch_count))
+    roster = pd.DataFrame(rows, columns=['student_id', 'name', 'area', 'most_freq_behaviour', 'peak_risk', 'incidents', 'abch'])
+    stage_index = determine_cpi_stages(roster['most_freq_behaviour'].to_numpy(dtype=object), roster['peak_risk'].to_numpy())
+    roster.insert(3, 'cpi_stage', pd.Categorical.from_codes(stage_index, categories=CPI_STAGES, ordered=True))
+    return roster.sort_values(['cpi_stage', 'peak_risk', 'incidents'], ascending=[True, False, False]).reset_index(drop=True)
+
+# The report body is dated only when read, so one body serves every day until its content changes
+REPORT_DATE_FIELD = '{{report_date}}'
+REVIEW_DATE_FIELD = '{{review_date}}'
+REPORT_REVIEW_DAYS = 30
+
+def bpp_report_key(student_id, window, since_ordinal=None):
+    """
+    Key of a student's BPP report body for a HISTORY_WINDOWS window in the store's materialized
+    table. A rolling window's body is kept until the student's data changes or the window moves
+    past its oldest incident; a term window's key includes the term's start, so a new term starts
+    a new report.
+    """
+    if HISTORY_WINDOWS[window] == 'term':
+        return f"{student_id}|{window}|{since_ordinal}"
+    return f"{student_id}|{window}"
+
+def bpp_report_payload(body, summary):
+    """Materialized form of a report body: the body and the date of the oldest incident it counts."""
+    return json.dumps({'body': body or '', 'first_ordinal': summary.first_ordinal if summary else None})
+
+def get_materialized_bpp_report(student_id, window, since_ordinal=None):
+    """
+    A student's materialized report body over a window starting at since_ordinal, or None if
+    there is none, the student's data changed since, or it counts incidents now before the window.
+    """
+    store = get_incident_store()
+    payload = store.get_materialized('bpp_report', bpp_report_key(student_id, window, since_ordinal),
+                                     store.student_version(student_id))
+    if payload is None:
+        return None
+    try:
+        stored = json.loads(payload)
+    except ValueError:
+        return None  # Stored by an older release, without its oldest incident
+    if since_ordinal is not None and stored['first_ordinal'] is not None and stored['first_ordinal'] < since_ordinal:
+        return None
+    return stored['body']
+
+@versioned_cache(versions=student_data_version)
+def get_bpp_report_body(student_id, window, since_ordinal=None):
+    """
+    Cached, undated BPP report text over a window starting at since_ordinal (empty or None if
+    the student has no incidents in it). Bodies materialized by the nightly precompute are read
+    back rather than rebuilt while still current.
+    """
+    report = get_materialized_bpp_report(student_id, window, since_ordinal)
+    if report is not None:
+        return report
+    summary = get_student_summary(student_id, since_ordinal)
+    if summary is None:
+        return None
+    return generate_bpp_report_content(get_student(student_id), summary)
+
+def get_bpp_report(student_id, report_date, window):
+    """The student's BPP report over a HISTORY_WINDOWS window as of report_date, dated report_date."""
+    body = get_bpp_report_body(student_id, window, history_start(window, report_date))
+    if not body:
+        return None
+    review_date = report_date + timedelta(days=REPORT_REVIEW_DAYS)
+    return body.replace(REPORT_DATE_FIELD, report_date.isoformat()).replace(REVIEW_DATE_FIELD, review_date.isoformat())
+
+def generate_bpp_report_content(student, summary):
+    """
+    Generates the structured text content for the full BPP report, incorporating 
+    Trauma-Informed (Berry Street) and CPI models.
+    """
+    # 1. Key data insights and CPI stage come from the shared student summary
+    latest_plan_incident = summary.latest_plan_incident
+            
+    # 2. Format 'How to Respond'
+    how_to_respond_content = latest_plan_incident['how_to_respond'] if latest_plan_incident else HOW_TO_RESPOND_DEFAULT
+    if how_to_respond_content and how_to_respond_content != HOW_TO_RESPOND_DEFAULT:
+        # Format the text area content into a list if possible (assuming line breaks)
+        action_steps = "\n".join([f"* {line.strip()}" for line in how_to_respond_content.split('\n') if line.strip()])
+    else:
+        action_steps = f"*{HOW_TO_RESPOND_DEFAULT}*"
+        
+    # --- Report Content Template ---
+    content = f'''
+# BEHAVIOUR PROFILE PLAN (BPP)
+## Student: {student['name']} (EDID: {student['edid']})
+**Date Generated:** {REPORT_DATE_FIELD}
+**Review Date:** {REVIEW_DATE_FIELD}
+
+---
+
+## 1. Summary of Clinical Findings and Data Analysis
+
+| Metric | Detail |
+| :--- | :--- |
+| **Total Incidents Logged** | {summary.total_incidents} |
+| **Critical Incidents (ABCH)** | {summary.abch_count} |
+| **Most Frequent Behaviour** | {summary.most_freq_behaviour} |
+| **Peak Risk Level Observed** | {summary.peak_risk} |
+| **Primary Hypothesized Function** | {latest_plan_incident['func_hypothesis'] if latest_plan_incident else 'N/A'} |
+| **Primary Antecedent (Trigger)** | {latest_plan_incident['antecedent'] if latest_plan_incident else 'N/A'} |
+| **Window of Tolerance State** | {latest_plan_incident['window_of_tolerance'] if latest_plan_incident else 'N/A'} |
+
+---
+
+## 2. Comprehensive Action Plan (How to Respond)
+
+This section outlines the immediate and strategic responses derived from the last critical incident analysis.
+
+### Primary De-escalation Strategy (The 'H' in ABCH)
+**Last Updated:** {latest_plan_incident['date'] if latest_plan_incident else 'N/A'}
+{action_steps}
+
+### Crisis Prevention Institute (CPI) Protocol
+The student is currently demonstrating behaviours aligning with the **{summary.cpi_stage}** stage of the CPI Verbal Escalation Continuum.
+* **Recommended Staff Response:** {summary.cpi_response}
+* **Goal:** Maintain safety and use *Supportive* and *Directive* nonverbal strategies to prevent escalation.
+
+---
+
+## 3. Trauma-Informed (Berry Street) Strategy
+The core strategy focuses on **De-escalation and Rhythms** (calming the nervous system) and **Relationships** (re-establishing safety).
+* **Focus during escalation:** Ensure a calm, predictable presence. Use neutral body language and provide choices to restore a sense of control.
+* **Focus post-incident:** Prioritize therapeutic rapport. This involves a planned, brief check-in to repair the relationship and process the event, reinforcing that the student is safe and valued.
+* **Focus for Proactive Teaching:** Identify and create an area of contribution within the classroom to shift the student's sense of self from 'problem' to 'valued member'.
+
+---
+
+## 4. Chronological Incident Context (Last Detailed Log)
+
+### Incident Date: {latest_plan_incident['date'] if latest_plan_incident else 'N/A'}
+### Final Summary: {latest_plan_incident['context'] if latest_plan_incident else 'N/A'}
+
+*This Behaviour Profile Plan is a dynamic document and must be reviewed after any further critical incident or after 30 calendar days.*
+'''
+    return content
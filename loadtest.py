@@ -0,0 +1,278 @@
+"""
+Local load-test harness simulating recess/lunch incident bursts.
+
+Runs many simulated staff sessions against app.py in parallel (threads inside each of several
+processes, each process standing in for one Streamlit server worker) using Streamlit's
+AppTest runner, all pointed at one shared SQLite incident store. Two session scripts are mixed:
+
+* Logger:     landing -> Quick Log -> incident log form submit -> ABCH follow-up (risk >= 3)
+* Leadership: landing -> staff area home -> student analysis (a few reruns)
+
+Streamlit's AppTest swaps a process-global runtime in and out around each run, so reruns within
+one process are serialized by a lock (much as CPU-bound reruns contend for the GIL in a real
+server); sessions in that process still interleave between steps, and the measured latency
+includes the wait, as a user would experience it. Processes run fully in parallel.
+
+Every incident written carries a unique marker in its context, so after the run the store is
+checked for lost and duplicated writes. Reported: p50/p95/p99 rerun latency (overall and per
+step), committed incidents per second, and errors.
+
+Usage:
+    python loadtest.py --processes 4 --threads 10 --sessions 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, defaultdict
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+AREA_BUTTONS = {'JP': "Junior Primary (JP)", 'PY': "Primary Years (PY)", 'SY': "Senior Years (SY)"}
+SPECIAL_STAFF_NAMES = {'TRT', 'External SSO'}
+APPTEST_LOCK = threading.Lock()
+
+
+class Session:
+    """One simulated browser session: an AppTest instance plus latency bookkeeping."""
+
+    def __init__(self, timeout, think_time, rng):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.think_time = think_time
+        self.rng = rng
+        self.latencies = defaultdict(list)
+        self.errors = []
+
+    def rerun(self, step):
+        started = time.perf_counter()
+        with APPTEST_LOCK:
+            self.at.run()
+        self.latencies[step].append(time.perf_counter() - started)
+        if self.at.exception:
+            self.errors.append(f"{step}: {self.at.exception[0].message}")
+            return False
+        return True
+
+    def click(self, label_fragment, step):
+        button = next((b for b in self.at.button if label_fragment in str(b.label)), None)
+        if button is None:
+            self.errors.append(f"{step}: no button matching '{label_fragment}'")
+            return False
+        # Staff take a moment to read the page and fill in the form before clicking
+        time.sleep(self.rng.uniform(0, self.think_time))
+        button.click()
+        return self.rerun(step)
+
+
+def run_logger_session(session, rng, marker):
+    """landing -> quick log -> log form submit -> ABCH follow-up when risk >= 3. Returns markers written."""
+    at = session.at
+    if not session.rerun('landing'):
+        return []
+
+    student_select = at.selectbox(key='direct_log_student_select')
+    student_select.set_value(rng.choice([o for o in student_select.options if not o.startswith('--')]))
+    if not session.click("Start Quick Log", 'quick_log_open'):
+        return []
+
+    risk = rng.choice([1, 2, 2, 3, 3, 4, 5])
+    for key in ('inc_behaviour', 'inc_antecedent', 'inc_setting', 'inc_support_type', 'inc_consequence',
+                'inc_func_hypothesis', 'inc_wot', 'inc_effectiveness'):
+        widget = at.selectbox(key=key)
+        widget.set_value(rng.choice(widget.options))
+    logged_by = at.selectbox(key='logged_by_name')
+    logged_by.set_value(rng.choice([o for o in logged_by.options if o not in SPECIAL_STAFF_NAMES]))
+    at.selectbox(key='inc_risk_level').set_value(risk)
+    at.text_area(key='inc_context').input(marker)
+
+    if not session.click("Save", 'log_form_submit'):
+        return []
+    if at.session_state.current_page == 'quick_log':
+        # The submit button is relabelled once risk >= 3 is selected, so staff click it a second time
+        if not session.click("Save", 'log_form_submit'):
+            return []
+
+    if risk < 3:
+        return [marker] if at.session_state.current_page == 'landing' else []
+
+    if at.session_state.current_page != 'abch_follow_up':
+        session.errors.append(f"log_form_submit: expected ABCH follow-up, got {at.session_state.current_page}")
+        return []
+
+    if rng.random() < 0.5:
+        at.text_area(key='chrono_context').input("Student left the room after a task demand.")
+        if not session.click("Add Layer to Chronology", 'abch_add_layer'):
+            return []
+    at.text_area(key='abch_how_to_respond').input("1. Offer two choices\n2. Use the break card")
+    at.text_area(key='abch_final_notes').input(f"Root cause: task avoidance. {marker}")
+    if not session.click("Finalize and Save ABCH Log", 'abch_submit'):
+        return []
+    return [marker] if at.session_state.current_page == 'landing' else []
+
+
+def run_leadership_session(session, rng):
+    """landing -> staff area home -> student analysis, with a couple of follow-up reruns."""
+    at = session.at
+    if not session.rerun('landing'):
+        return
+    area = rng.choice(list(AREA_BUTTONS))
+    if not session.click(AREA_BUTTONS[area], 'staff_home'):
+        return
+    analysis_buttons = [b for b in at.button if str(b.key).startswith('view_analysis_')]
+    if not analysis_buttons:
+        session.errors.append("staff_home: no students listed")
+        return
+    rng.choice(analysis_buttons).click()
+    if not session.rerun('analysis'):
+        return
+    for _ in range(2):
+        if not session.rerun('analysis_rerun'):
+            return
+
+
+def run_thread(worker_id, thread_id, args, results, lock):
+    rng = random.Random(f"{args.seed}:{worker_id}:{thread_id}")
+    for session_number in range(args.sessions):
+        session = Session(args.timeout, args.think_time, rng)
+        written = []
+        try:
+            if rng.random() < args.leadership_ratio:
+                run_leadership_session(session, rng)
+            else:
+                marker = f"loadtest:{args.run_id}:{worker_id}:{thread_id}:{session_number}"
+                written = run_logger_session(session, rng, marker)
+        except Exception:
+            session.errors.append(traceback.format_exc(limit=3))
+        with lock:
+            for step, values in session.latencies.items():
+                results['latencies'].setdefault(step, []).extend(values)
+            results['errors'].extend(session.errors)
+            results['written'].extend(written)
+
+
+def run_worker(worker_id, args):
+    """One simulated server process: runs args.threads concurrent session threads."""
+    os.environ['BST_STORE_PATH'] = args.store
+    results = {'latencies': {}, 'errors': [], 'written': []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_thread, args=(worker_id, thread_id, args, results, lock))
+        for thread_id in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize_latencies(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 1),
+        'p95_ms': round(percentile(values, 95) * 1000, 1),
+        'p99_ms': round(percentile(values, 99) * 1000, 1),
+    }
+
+
+def check_writes(store_path, run_id, written):
+    """Compares the markers sessions believe they committed with what the store actually holds."""
+    from bst_core.records import unpack_text
+    from bst_core.store import IncidentStore
+    # Long contexts are stored compressed, so every row is read back through the store's text codec
+    IncidentStore(store_path)  # Loads the store's text dictionaries
+    prefix = f"loadtest:{run_id}:"
+    conn = sqlite3.connect(store_path)
+    rows = conn.execute("SELECT context FROM incidents").fetchall()
+    conn.close()
+    stored = Counter()
+    for (context,) in rows:
+        context = unpack_text(context)
+        if context and prefix in context:
+            stored[context[context.index(prefix):].split()[0]] += 1
+    expected = set(written)
+    return {
+        'reported_committed': len(written),
+        'stored_rows': sum(stored.values()),
+        'lost': sorted(expected - set(stored)),
+        'duplicated': sorted(marker for marker, count in stored.items() if count > 1),
+        'unexpected': sorted(set(stored) - expected),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=2, help="Simulated server processes")
+    parser.add_argument('--threads', type=int, default=10, help="Concurrent sessions per process")
+    parser.add_argument('--sessions', type=int, default=2, help="Sessions run back-to-back by each thread")
+    parser.add_argument('--leadership-ratio', type=float, default=0.25, help="Share of sessions that open analysis pages")
+    parser.add_argument('--store', help="SQLite store to use (default: a fresh temporary file)")
+    parser.add_argument('--think-time', type=float, default=0.5, help="Max seconds of staff think time before each click")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-rerun timeout in seconds")
+    parser.add_argument('--seed', default='recess')
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+    args.run_id = uuid.uuid4().hex[:8]
+    if not args.store:
+        args.store = os.path.join(tempfile.mkdtemp(prefix='bst_loadtest_'), 'incidents.db')
+
+    started = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        worker_results = pool.starmap(run_worker, [(worker_id, args) for worker_id in range(args.processes)])
+    elapsed = time.perf_counter() - started
+
+    latencies, errors, written = defaultdict(list), [], []
+    for results in worker_results:
+        for step, values in results['latencies'].items():
+            latencies[step].extend(values)
+        errors.extend(results['errors'])
+        written.extend(results['written'])
+
+    writes = check_writes(args.store, args.run_id, written)
+    report = {
+        'run_id': args.run_id,
+        'store': args.store,
+        'sessions': args.processes * args.threads * args.sessions,
+        'elapsed_s': round(elapsed, 2),
+        'rerun_latency': summarize_latencies([v for values in latencies.values() for v in values]),
+        'rerun_latency_by_step': {step: summarize_latencies(values) for step, values in sorted(latencies.items())},
+        'committed_incidents_per_s': round(writes['stored_rows'] / elapsed, 2),
+        'writes': {key: (len(value) if isinstance(value, list) else value) for key, value in writes.items()},
+        'errors': len(errors),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Run {report['run_id']}: {report['sessions']} sessions in {report['elapsed_s']}s (store: {args.store})")
+        overall = report['rerun_latency']
+        print(f"Rerun latency: p50 {overall['p50_ms']} ms | p95 {overall['p95_ms']} ms | p99 {overall['p99_ms']} ms over {overall['count']} reruns")
+        for step, stats in report['rerun_latency_by_step'].items():
+            print(f"  {step:<18} n={stats['count']:<5} p50 {stats['p50_ms']:>8} ms  p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms")
+        print(f"Committed incidents: {writes['stored_rows']} ({report['committed_incidents_per_s']}/s)")
+        print(f"Lost writes: {len(writes['lost'])} | Duplicated writes: {len(writes['duplicated'])} | Unexpected rows: {len(writes['unexpected'])}")
+        print(f"Session errors: {len(errors)}")
+        for error in errors[:10]:
+            print(f"  - {error.strip()}")
+
+    return 1 if errors or writes['lost'] or writes['duplicated'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
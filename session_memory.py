@@ -0,0 +1,187 @@
+"""
+Per-session memory accounting and trimming of idle sessions for the Streamlit app.
+
+Every session registers its session state here on each rerun. The ADM view estimates what each
+one holds, and sessions left idle have their unsaved drafts and any large temporary values
+dropped, so an abandoned browser tab keeps little more than its navigation state. Objects shared
+by the whole process (the store's incident list, the student and staff rosters) count as
+references only.
+
+Imported by app.py at startup, so it must not import pandas or numpy.
+"""
+import sys
+import threading
+import time
+from collections import deque
+
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from bst_core.metrics import get_metrics_registry
+from bst_core.util import process_wide
+
+SESSION_DRAFT_TTL = 60 * 60            # Seconds idle before a session's unsaved drafts are dropped
+SESSION_FORGET_AFTER = 24 * 60 * 60    # Seconds idle before a session is no longer tracked at all
+SESSION_SWEEP_INTERVAL = 60            # Minimum seconds between sweeps of idle sessions
+LARGE_VALUE_BYTES = 256 * 1024         # Other values this large are dropped from idle sessions too
+
+# Draft state reset to its initial value, and the form widget keys cleared, on eviction
+DRAFT_DEFAULTS = {
+    'temp_incident_data': None,
+    'abch_chronology': (),
+    'temp_group_incidents': None,
+}
+DRAFT_WIDGET_PREFIXES = ('inc_', 'abch_', 'chrono_', 'outcome_', 'group_', 'edit_incident_select_')
+DRAFT_WIDGET_MARKERS = ('logged_by_name', 'other_staff_')
+DRAFT_KEYS = ('safety_risk_plan', 'cowandilla_management_outcomes', 'bulk_import_file')
+# Navigation state is never dropped, whatever its size
+PROTECTED_KEYS = (
+    'current_page', 'current_role', 'mode', 'selected_student_id', 'temp_log_area', 'students', 'incidents', 'staff',
+)
+# Pages that cannot be shown once their draft is gone
+DRAFT_PAGES = ('abch_follow_up', 'group_abch_follow_up')
+
+SESSIONS_EVICTED = get_metrics_registry().counter(
+    'bst_session_drafts_evicted_total', "Idle sessions whose unsaved drafts were dropped."
+)
+
+
+def is_draft_key(key):
+    return (key in DRAFT_DEFAULTS or key in DRAFT_KEYS or key.startswith(DRAFT_WIDGET_PREFIXES)
+            or any(marker in key for marker in DRAFT_WIDGET_MARKERS))
+
+
+def estimate_size(obj, seen):
+    """
+    Approximate bytes held by obj and everything it references, skipping objects whose id is
+    in `seen` (already counted, or shared by the whole process). Adds what it visits to seen.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    module = type(obj).__module__
+    if module.startswith('pandas'):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if module == 'numpy':
+        return sys.getsizeof(obj) + getattr(obj, 'nbytes', 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(estimate_size(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += estimate_size(vars(obj), seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, slot):
+            size += estimate_size(getattr(obj, slot), seen)
+    return size
+
+
+class SessionRecord:
+    __slots__ = ('state', 'last_active', 'reruns', 'evicted', 'lost_draft')
+
+    def __init__(self, state):
+        self.state = state  # The session's thread-safe SafeSessionState
+        self.last_active = time.time()
+        self.reruns = 0
+        self.evicted = False  # Swept since the session's last rerun
+        self.lost_draft = False  # ... and an unsaved draft was dropped
+
+
+class SessionRegistry:
+    """The sessions of this server process, by session id."""
+
+    def __init__(self):
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def touch(self, shared):
+        """
+        Records a rerun of the calling session, then sweeps idle sessions if one is due.
+        Returns True if an unsaved draft of this session was dropped since its previous rerun.
+        """
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is None:
+            return False
+        now = time.time()
+        with self._lock:
+            record = self.sessions.get(ctx.session_id)
+            if record is None:
+                record = self.sessions[ctx.session_id] = SessionRecord(ctx.session_state)
+            record.state = ctx.session_state
+            lost_draft = record.lost_draft
+            record.evicted = record.lost_draft = False
+            record.last_active = now
+            record.reruns += 1
+            sweep_due = now - self._last_sweep >= SESSION_SWEEP_INTERVAL
+            if sweep_due:
+                self._last_sweep = now
+        if sweep_due:
+            self.sweep(now, shared)
+        return lost_draft
+
+    def _is_connected(self, session_id):
+        if not runtime.exists():
+            return True
+        return runtime.get_instance().is_active_session(session_id)
+
+    def sweep(self, now, shared):
+        """Forgets closed and long-idle sessions and drops the drafts of those idle past SESSION_DRAFT_TTL."""
+        with self._lock:
+            records = list(self.sessions.items())
+        for session_id, record in records:
+            idle = now - record.last_active
+            if idle > SESSION_FORGET_AFTER or not self._is_connected(session_id):
+                with self._lock:
+                    self.sessions.pop(session_id, None)
+            elif idle > SESSION_DRAFT_TTL and not record.evicted:
+                record.lost_draft = evict_drafts(record.state, shared)
+                record.evicted = True
+                SESSIONS_EVICTED.inc()
+
+    def usage(self, shared):
+        """Per-session estimate: (session id, record, total bytes, {key: bytes}), largest first."""
+        with self._lock:
+            records = list(self.sessions.items())
+        rows = []
+        for session_id, record in records:
+            seen = set(shared)
+            by_key = {key: estimate_size(value, seen) for key, value in record.state.filtered_state.items()}
+            rows.append((session_id, record, sum(by_key.values()), by_key))
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def evict_drafts(state, shared):
+    """
+    Drops an idle session's drafts, form widget values and large temporary values. An open
+    browser tab sends its widget values back on its next rerun, so only the drafts kept in
+    session state are lost. Returns True if one of those held anything.
+    """
+    lost_draft = False
+    for key, value in list(state.filtered_state.items()):
+        if key in PROTECTED_KEYS:
+            continue
+        if key in DRAFT_DEFAULTS:
+            lost_draft = lost_draft or bool(value)
+            state[key] = list(DRAFT_DEFAULTS[key]) if isinstance(DRAFT_DEFAULTS[key], tuple) else DRAFT_DEFAULTS[key]
+        elif is_draft_key(key) or estimate_size(value, set(shared)) >= LARGE_VALUE_BYTES:
+            del state[key]
+    if state['current_page'] in DRAFT_PAGES:
+        state['current_page'] = 'landing'
+    return lost_draft
+
+
+@process_wide
+def get_session_registry():
+    registry = SessionRegistry()
+
+    @get_metrics_registry().collector
+    def session_metrics():
+        return [('bst_sessions_tracked', 'gauge', "Browser sessions of this process seen within the last day.",
+                 [({}, len(registry.sessions))])]
+
+    return registry